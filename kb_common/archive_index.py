@@ -0,0 +1,120 @@
+"""Compact on-disk index of `url_locations.txt`, shared by kb_pdf and kb_help
+
+The index maps a knowledge base url (without the trailing '/') to the location of its page,
+relative to `kb_archive/html`. It is rebuilt whenever the modification time or size of
+`url_locations.txt` changes, and is memory mapped so that opening it does not read any entries.
+
+Layout (little endian):
+    header:  magic, source mtime_ns, source size, entry count
+    offsets: entry count + 1 uint32 offsets into the data block
+    data:    b"url\\tlocation" entries, sorted by url
+"""
+from pathlib import Path
+from typing import Iterator
+import mmap
+import os
+import struct
+
+INDEX_SUFFIX = ".idx"
+RAW_PREFIX = "../html/"
+
+_MAGIC = b"KBIDX1"
+_HEADER = struct.Struct("<6sqqI")
+_OFFSET = struct.Struct("<I")
+
+class ArchiveIndex:
+    """Read only view over an index file, lookups are a binary search over the mapped entries"""
+    _data: mmap.mmap
+    _count: int
+    _offsets_start: int
+    _entries_start: int
+
+    def __init__(self, data: mmap.mmap):
+        magic, _, _, count = _HEADER.unpack_from(data, 0)
+        assert magic == _MAGIC
+        self._data = data
+        self._count = count
+        self._offsets_start = _HEADER.size
+        self._entries_start = _HEADER.size + _OFFSET.size * (count + 1)
+
+    @classmethod
+    def load(cls, source: Path | str, index_path: Path | str | None = None) -> "ArchiveIndex":
+        """Opens the index for `source`, (re)building it first if it is missing or out of date"""
+        source = Path(source)
+        index_path = Path(index_path) if index_path is not None else source.with_suffix(INDEX_SUFFIX)
+        stat = source.stat()
+        if not _is_current(index_path, stat):
+            build_index(source, index_path)
+        with open(index_path, "rb") as infile:
+            return cls(mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def get(self, url: str) -> str | None:
+        """Returns the location of `url` relative to `kb_archive/html`"""
+        key = clean_url(url).encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            entry_url, location = self._entry(mid)
+            if entry_url < key:
+                low = mid + 1
+            elif entry_url > key:
+                high = mid
+            else:
+                return location.decode("utf-8")
+        return None
+
+    def __contains__(self, url: str) -> bool:
+        return self.get(url) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def items(self) -> Iterator[tuple[str, str]]:
+        for index in range(self._count):
+            url, location = self._entry(index)
+            yield url.decode("utf-8"), location.decode("utf-8")
+
+    def _entry(self, index: int) -> tuple[bytes, bytes]:
+        start, = _OFFSET.unpack_from(self._data, self._offsets_start + _OFFSET.size * index)
+        end, = _OFFSET.unpack_from(self._data, self._offsets_start + _OFFSET.size * (index + 1))
+        entry = self._data[self._entries_start + start:self._entries_start + end]
+        url, _, location = entry.partition(b"\t")
+        return url, location
+
+def clean_url(url: str) -> str:
+    return url.strip().removesuffix('/')
+
+def read_url_locations(source: Path) -> dict[str, str]:
+    """Parses `url_locations.txt`, later lines replace earlier ones for the same url"""
+    locations = {}
+    for line in source.read_text(encoding="utf-8").splitlines():
+        url, raw_path = line.split(' ', maxsplit=1)
+        locations[clean_url(url)] = raw_path.strip().removeprefix(RAW_PREFIX)
+    return locations
+
+def build_index(source: Path, index_path: Path):
+    stat = source.stat()
+    locations = read_url_locations(source)
+    entries = [f"{url}\t{locations[url]}".encode("utf-8") for url in sorted(locations, key=str.encode)]
+
+    offsets = [0]
+    for entry in entries:
+        offsets.append(offsets[-1] + len(entry))
+    header = _HEADER.pack(_MAGIC, stat.st_mtime_ns, stat.st_size, len(entries))
+    offset_table = struct.pack(f"<{len(offsets)}I", *offsets)
+
+    # written to a temporary file first, so concurrent builds never read a partial index
+    tmp_path = index_path.with_suffix(f"{INDEX_SUFFIX}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(header + offset_table + b"".join(entries))
+    tmp_path.replace(index_path)
+
+def _is_current(index_path: Path, source_stat: os.stat_result) -> bool:
+    try:
+        with open(index_path, "rb") as infile:
+            header = infile.read(_HEADER.size)
+    except OSError:
+        return False
+    if len(header) != _HEADER.size:
+        return False
+    magic, mtime_ns, size, _ = _HEADER.unpack(header)
+    return magic == _MAGIC and mtime_ns == source_stat.st_mtime_ns and size == source_stat.st_size
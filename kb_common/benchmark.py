@@ -0,0 +1,126 @@
+"""Micro-benchmark harness shared by the `benchmark.py` scripts of kb_pdf and kb_help
+
+Each case is timed on its own, repeating it until a round takes at least `MIN_ROUND_TIME`
+and keeping the fastest round. Memory is measured in a separate traced call, so tracing
+does not slow down the timed rounds. Results are compared against a baseline JSON file,
+which `--save` replaces with the current results. Timings are only comparable with a baseline
+saved on the same machine, so baselines are not checked in: save one before making a change.
+"""
+from pathlib import Path
+from typing import Any, Callable, NamedTuple
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+MIN_ROUND_TIME = 0.2
+DEFAULT_ROUNDS = 3
+# Slower or larger than the baseline by more than this ratio is reported as a regression
+REGRESSION_RATIO = 1.25
+
+# Representative pages, by the url they are archived under
+BENCHMARK_PAGES = {
+    "small": "https://mariadb.com/kb/en/buffer",
+    "function": "https://mariadb.com/kb/en/concat",
+    "release_notes": "https://mariadb.com/kb/en/changes-improvements-in-mariadb-100",
+    "huge_table": "https://mariadb.com/kb/en/mariadb-error-codes",
+    "long": "https://mariadb.com/kb/en/server-system-variables",
+}
+
+class Case(NamedTuple):
+    name: str
+    function: Callable[[], Any]
+
+class Result(NamedTuple):
+    name: str
+    calls: int
+    seconds_per_call: float
+    # Peak of the memory allocated during a call, and how much of it the call kept (its result)
+    peak_bytes: int
+    retained_bytes: int
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "seconds_per_call": self.seconds_per_call,
+            "peak_bytes": self.peak_bytes,
+            "retained_bytes": self.retained_bytes,
+        }
+
+def read_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("filters", nargs="*", help="Only run cases whose name contains one of these")
+    parser.add_argument("--rounds", type=int, default=DEFAULT_ROUNDS, help="Timed rounds per case")
+    parser.add_argument("--save", action="store_true", help="Replace the baseline with these results")
+    parser.add_argument("--baseline", type=str, help="Baseline file to compare against and save to")
+    return parser.parse_args()
+
+def run_case(case: Case, rounds: int) -> Result:
+    case.function() # warm up caches and lazy imports
+    calls = 1
+    while True:
+        taken = _time_calls(case.function, calls)
+        if taken >= MIN_ROUND_TIME:
+            break
+        calls *= 2
+    best = min([taken, *(_time_calls(case.function, calls) for _ in range(rounds - 1))])
+
+    gc.collect()
+    tracemalloc.start()
+    result = case.function()
+    _, peak = tracemalloc.get_traced_memory()
+    gc.collect() # parse trees are reference cycles, only the result should count as kept
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return Result(case.name, calls, best / calls, peak, retained)
+
+def _time_calls(function: Callable[[], Any], calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        function()
+    return time.perf_counter() - start
+
+def read_baseline(path: Path) -> dict[str, dict[str, Any]]:
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def save_baseline(path: Path, results: list[Result], baseline: dict[str, dict[str, Any]]):
+    """Results replace their baseline entries, entries of cases which were not run are kept"""
+    baseline = baseline | {result.name: result.to_json() for result in results}
+    path.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+def format_result(result: Result, previous: dict[str, Any] | None) -> str:
+    line = (
+        f"{result.name:<48} {result.seconds_per_call * 1_000_000:>12.1f} us"
+        f" {result.peak_bytes / 1024:>10.1f} KiB peak {result.retained_bytes / 1024:>10.1f} KiB kept"
+    )
+    if previous is None:
+        return line + "  (no baseline)"
+    time_ratio = result.seconds_per_call / previous["seconds_per_call"]
+    memory_ratio = result.peak_bytes / max(1, previous["peak_bytes"])
+    line += f"  time x{time_ratio:.2f} memory x{memory_ratio:.2f}"
+    if time_ratio > REGRESSION_RATIO or memory_ratio > REGRESSION_RATIO:
+        line += "  REGRESSION"
+    return line
+
+def run_benchmarks(cases: list[Case], default_baseline: Path | str):
+    """Runs the cases selected on the command line, prints them next to the baseline"""
+    args = read_args()
+    baseline_path = Path(args.baseline if args.baseline is not None else default_baseline)
+    baseline = read_baseline(baseline_path)
+    if not baseline and not args.save:
+        print(f"No baseline at {baseline_path}, run with --save before making a change to create one")
+    selected = [
+        case for case in cases
+        if not args.filters or any(name in case.name for name in args.filters)
+    ]
+    results = []
+    for case in selected:
+        result = run_case(case, max(1, args.rounds))
+        print(format_result(result, baseline.get(result.name)), flush=True)
+        results.append(result)
+    if args.save:
+        save_baseline(baseline_path, results, baseline)
+        print(f"Saved baseline to {baseline_path}")
@@ -0,0 +1,160 @@
+"""Typed loader of `kb_urls.csv`, shared by kb_pdf and kb_help
+
+The csv is parsed and validated once, then cached next to it as JSON columns along with its invalid
+values. The cache is used while the csv keeps its size and modification time, or otherwise while its
+content hash matches. Repeated values such as categories and keywords are interned.
+
+Each tool only fails on the columns it reads, `PDF_COLUMNS` or `HELP_COLUMNS`, so a typo in a
+column of one tool doesn't stop the other. Invalid values of the other columns are read as empty.
+"""
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple
+import csv
+import hashlib
+import io
+import json
+import os
+import sys
+
+CACHE_SUFFIX = ".cache.json"
+# Bump when the parsed columns change
+CACHE_VERSION = 2
+REQUIRED_COLUMNS = ("URL", "HELP Include", "HELP Cat", "HELP Keywords", "Include", "Header", "Depth", "Duplicate slugs")
+# Columns read by each tool
+PDF_COLUMNS = ("URL", "Include", "Header", "Depth", "Duplicate slugs")
+HELP_COLUMNS = ("URL", "HELP Include", "HELP Cat", "HELP Keywords")
+
+class KbUrlsError(ValueError):
+    """The csv has a missing column or an invalid value"""
+
+class KbUrlRow(NamedTuple):
+    url: str
+    # '0', '1', a version such as '106' or empty
+    help_include: str
+    help_category: str
+    help_keywords: tuple[str, ...]
+    # 0 when the page is not part of the pdf, empty fields are 0 as well
+    include: int
+    header: str
+    depth: int
+    # Other slugs of the same page, as written in the csv
+    slugs: tuple[str, ...]
+
+
+def load_kb_urls(
+    source: Path | str, cache_path: Path | str | None = None, columns: Iterable[str] = REQUIRED_COLUMNS
+) -> list[KbUrlRow]:
+    """Reads every row of the csv, from the cache when it is current
+
+    Raises KbUrlsError for the first missing column or invalid value among `columns`.
+    """
+    source = Path(source)
+    cache_path = Path(cache_path) if cache_path is not None else source.with_name(source.name + CACHE_SUFFIX)
+    stat = source.stat()
+    cache = _read_cache(cache_path)
+    if cache is not None and (cache["size"], cache["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+        _check_columns(cache["errors"], columns)
+        return _rows_from_columns(cache["columns"])
+
+    content = source.read_bytes()
+    digest = hashlib.sha256(content).hexdigest()
+    if cache is not None and cache["digest"] == digest:
+        table, errors = cache["columns"], cache["errors"]
+        rows = _rows_from_columns(table)
+    else:
+        rows, errors = _parse_csv(content.decode("utf-8"))
+        table = [list(column) for column in zip(*rows)] if rows else [[] for _ in KbUrlRow._fields]
+    _write_cache(cache_path, {
+        "version": CACHE_VERSION, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+        "digest": digest, "columns": table, "errors": errors,
+    })
+    _check_columns(errors, columns)
+    return rows
+
+def parse_kb_urls(text: str, columns: Iterable[str] = REQUIRED_COLUMNS) -> list[KbUrlRow]:
+    """Parses and validates the csv, raises KbUrlsError naming the first invalid line of `columns`"""
+    rows, errors = _parse_csv(text)
+    _check_columns(errors, columns)
+    return rows
+
+def _parse_csv(text: str) -> tuple[list[KbUrlRow], list[list[str]]]:
+    """Every row, invalid values read as empty, and the [column, message] of each missing column and invalid value"""
+    reader = csv.DictReader(io.StringIO(text), strict=True)
+    errors = [
+        [column, f"kb_urls.csv is missing the column {column}"]
+        for column in REQUIRED_COLUMNS if column not in (reader.fieldnames or [])
+    ]
+    rows = []
+    for row in reader:
+        fields = {column: row.get(column) or "" for column in REQUIRED_COLUMNS}
+        for column, error in _invalid_values(fields):
+            errors.append([column, f"kb_urls.csv line {reader.line_num}, {fields['URL'] or 'no url'}: {error}"])
+            fields[column] = ""
+        rows.append(_parse_row(fields))
+    return _intern_rows(rows), errors
+
+def _invalid_values(row: dict[str, str]) -> Iterator[tuple[str, str]]:
+    help_include = row["HELP Include"]
+    if help_include and not help_include.isdigit():
+        yield "HELP Include", f"Invalid 'HELP Include' field: {help_include}"
+    include = row["Include"]
+    if include and not include.lstrip("-").isdigit():
+        yield "Include", f"Could not convert 'Include' field to integer: {include}"
+    depth = row["Depth"]
+    if depth and not depth.isnumeric():
+        yield "Depth", f"Invalid Depth Argument: {depth}"
+
+def _parse_row(row: dict[str, str]) -> KbUrlRow:
+    return KbUrlRow(
+        url=row["URL"],
+        help_include=row["HELP Include"],
+        help_category=row["HELP Cat"],
+        help_keywords=tuple(filter(bool, row["HELP Keywords"].split(";"))),
+        include=int(row["Include"]) if row["Include"] else 0,
+        header=row["Header"],
+        depth=int(row["Depth"]) if row["Depth"] else 0,
+        slugs=tuple(slug for slug in row["Duplicate slugs"].split(";") if slug.strip()),
+    )
+
+def _check_columns(errors: list[list[str]], columns: Iterable[str]):
+    columns = set(columns)
+    for column, message in errors:
+        if column in columns:
+            raise KbUrlsError(message)
+
+def _rows_from_columns(columns: list[list]) -> list[KbUrlRow]:
+    fields = dict(zip(KbUrlRow._fields, columns))
+    fields["help_include"] = list(map(sys.intern, fields["help_include"]))
+    fields["help_category"] = list(map(sys.intern, fields["help_category"]))
+    fields["help_keywords"] = [tuple(map(sys.intern, keywords)) for keywords in fields["help_keywords"]]
+    fields["slugs"] = list(map(tuple, fields["slugs"]))
+    return list(map(KbUrlRow._make, zip(*fields.values())))
+
+def _intern_rows(rows: list[KbUrlRow]) -> list[KbUrlRow]:
+    """Shares the strings of the columns whose values repeat between rows"""
+    return [
+        row._replace(
+            help_include=sys.intern(row.help_include),
+            help_category=sys.intern(row.help_category),
+            help_keywords=tuple(map(sys.intern, row.help_keywords)),
+        )
+        for row in rows
+    ]
+
+def _read_cache(cache_path: Path) -> dict | None:
+    try:
+        cache = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+    if cache.get("version") != CACHE_VERSION or len(cache.get("columns", [])) != len(KbUrlRow._fields):
+        return None
+    return cache
+
+def _write_cache(cache_path: Path, cache: dict):
+    # written to a temporary file first, so concurrent runs never read a partial cache
+    tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        tmp_path.write_text(json.dumps(cache), encoding="utf-8")
+        tmp_path.replace(cache_path)
+    except OSError:
+        pass # a read only checkout still works, it only parses the csv every time
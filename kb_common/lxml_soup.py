@@ -0,0 +1,157 @@
+"""Helpers giving lxml trees the same semantics as the BeautifulSoup calls they replace
+
+Used by the lxml parser backends of kb_pdf and kb_help, whose output is compared against
+the BeautifulSoup backends.
+"""
+from lxml import etree
+import re
+
+Element = etree._Element
+
+# Strings inside these tags are not part of `get_text`, matching BeautifulSoup's special string types
+SKIPPED_TEXT_TAGS = {"script", "style", "template", "rt", "rp"}
+# Whitespace only strings outside of these tags are collapsed
+PRESERVE_WHITESPACE_TAGS = {"pre", "textarea"}
+_ASCII_SPACES = str.maketrans("", "", "\x20\x0a\x09\x0c\x0d")
+# Whitespace between two tags, segments of the source start and end next to a tag
+_WHITESPACE_RUN_PATTERN = re.compile(r"(?:\A|(?<=>))[\x20\x0a\x09\x0c\x0d]+(?=<|\Z)")
+# Regions whose whitespace is kept as is, matched up to their first closing tag
+_RAW_REGION_PATTERN = re.compile(r"<(pre|textarea|script|style)\b.*?</\1\s*>", re.DOTALL | re.IGNORECASE)
+# Attributes BeautifulSoup splits on whitespace, they are written back joined by single spaces
+CDATA_LIST_ATTRIBUTES = {
+    "*": {"accesskey", "class", "dropzone"},
+    "a": {"rel", "rev"},
+    "link": {"rel", "rev"},
+    "td": {"headers"},
+    "th": {"headers"},
+    "form": {"accept-charset"},
+    "object": {"archive"},
+    "area": {"rel"},
+    "icon": {"sizes"},
+    "iframe": {"sandbox"},
+    "output": {"for"},
+}
+VOID_TAGS = {
+    "area", "base", "basefont", "bgsound", "br", "col", "command", "embed", "frame", "hr", "image", "img",
+    "input", "isindex", "keygen", "link", "menuitem", "meta", "nextid", "param", "source", "spacer", "track", "wbr",
+}
+# Strings inside these tags are written without escaping
+CDATA_TAGS = {"script", "style"}
+
+
+def collapse(string: str, preserve: bool) -> str:
+    """BeautifulSoup turns whitespace only strings into a single newline or space"""
+    if preserve or string.translate(_ASCII_SPACES):
+        return string
+    return "\n" if "\n" in string else " "
+
+def collapse_source_whitespace(html: str) -> str:
+    """Collapses whitespace only strings before parsing
+
+    BeautifulSoup collapses each run of text between two tags, even around end tags the parser
+    ignores, whereas lxml merges the text around those first. Collapsing the source keeps both
+    trees the same.
+    """
+    parts = []
+    position = 0
+    for region in _RAW_REGION_PATTERN.finditer(html):
+        parts.append(_WHITESPACE_RUN_PATTERN.sub(_collapse_run, html[position:region.start()]))
+        parts.append(region.group())
+        position = region.end()
+    parts.append(_WHITESPACE_RUN_PATTERN.sub(_collapse_run, html[position:]))
+    return "".join(parts)
+
+def _collapse_run(match: re.Match) -> str:
+    return "\n" if "\n" in match.group() else " "
+
+def has_class(element: Element, classes: set[str]) -> bool:
+    """Matches like `find_all(attrs={"class": ...})`, on any single class or on the whole attribute"""
+    return class_matches(element.get("class"), classes)
+
+def class_matches(value: str | None, classes: set[str]) -> bool:
+    """`has_class` for the value of a class attribute"""
+    if value is None:
+        return False
+    return value in classes or any(name in classes for name in value.split())
+
+def tag_string(element: Element) -> str | None:
+    """Equivalent of `Tag.string`, the text of an element's only child"""
+    children: list[str | Element] = [element.text] if element.text else []
+    for child in element:
+        children.append(child)
+        if child.tail:
+            children.append(child.tail)
+    if len(children) != 1:
+        return None
+    child = children[0]
+    if isinstance(child, str):
+        return child
+    if not isinstance(child.tag, str):
+        return child.text # comments are strings in BeautifulSoup
+    return tag_string(child)
+
+def tag_text(element: Element, skipped: bool = False) -> str:
+    """Equivalent of `Tag.text`, all strings below the element except comments and script like tags"""
+    parts: list[str] = []
+    _collect_text(element, parts, skipped)
+    return "".join(parts)
+
+def _collect_text(element: Element, parts: list[str], skipped: bool):
+    skipped = skipped or element.tag in SKIPPED_TEXT_TAGS
+    if element.text and not skipped:
+        parts.append(element.text)
+    for child in element:
+        if isinstance(child.tag, str):
+            _collect_text(child, parts, skipped)
+        if child.tail and not skipped:
+            parts.append(child.tail)
+
+def set_string(element: Element, string: str):
+    """Equivalent of setting `Tag.string`, replaces the contents of the element"""
+    for child in list(element):
+        element.remove(child) # tails are removed with their element
+    element.text = string
+
+def normalize_list_attributes(root: Element):
+    """Rewrites the attributes BeautifulSoup treats as lists the way it would write them"""
+    for element in root.iter(tag=etree.Element):
+        list_attributes = CDATA_LIST_ATTRIBUTES["*"] | CDATA_LIST_ATTRIBUTES.get(element.tag, set())
+        for key in list_attributes.intersection(element.attrib):
+            element.set(key, " ".join(element.get(key).split()))
+
+def decode_contents(element: Element) -> str:
+    """Equivalent of `str()` on a BeautifulSoup object, for everything inside `element`"""
+    parts: list[str] = []
+    cdata = element.tag in CDATA_TAGS
+    if element.text:
+        parts.append(element.text if cdata else escape(element.text))
+    for child in element:
+        _decode(child, parts)
+        if child.tail:
+            parts.append(child.tail if cdata else escape(child.tail))
+    return "".join(parts)
+
+def _decode(element: Element, parts: list[str]):
+    if not isinstance(element.tag, str):
+        if element.tag is etree.Comment:
+            parts.append(f"<!--{element.text or ''}-->")
+        return
+    parts.append("<" + element.tag)
+    for key, value in sorted(element.attrib.items()):
+        parts.append(f" {key}={quoted_attribute_value(escape(value))}")
+    if element.tag in VOID_TAGS and not element.text and len(element) == 0:
+        parts.append("/>")
+        return
+    parts.append(">")
+    parts.append(decode_contents(element))
+    parts.append(f"</{element.tag}>")
+
+def escape(string: str) -> str:
+    return string.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+def quoted_attribute_value(value: str) -> str:
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    return '"' + value.replace('"', "&quot;") + '"'
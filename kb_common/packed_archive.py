@@ -0,0 +1,233 @@
+"""Single file packed copy of `kb_archive/html`, shared by kb_pdf and kb_help
+
+Every file of the archive is stored compressed on its own, with whichever codec of `CODECS` it was
+packed with, so any page is read with one lookup and one decompression. The records are memory
+mapped and sorted by location, a lookup is a binary search which reads no other page.
+
+`ArchivePages` reads pages from `kb_archive/html.kbpack` when it exists. Pages which are not in
+it, or whose loose file no longer has the size and modification time it was packed with, are read
+from the loose files, so a stale pack never hides a re-scraped page. The loose files are compared
+with the pack once, when it is opened, reading a page doesn't touch them. Packed pages keep the size and
+modification time of their loose file, so caches keyed on them stay valid when switching between
+the two. Urls are mapped to locations by `url_locations.idx`.
+
+Run as `python -m kb_common.packed_archive [archive_dir] [pack_path]` from the repository root to
+pack the archive, again whenever it is updated.
+
+Layout (little endian):
+    header:  magic, entry count, size of the names block
+    records: entry count records of the name offset and length, codec, data offset and length,
+             size and mtime_ns of the page, sorted by name
+    names:   locations relative to `kb_archive/html`
+    data:    the compressed pages
+"""
+from pathlib import Path
+from typing import Callable, Iterator, NamedTuple
+import argparse
+import bz2
+import lzma
+import mmap
+import os
+import struct
+import zlib
+
+PACK_SUFFIX = ".kbpack"
+DEFAULT_CODEC = "zlib"
+
+_MAGIC = b"KBPAK1"
+_HEADER = struct.Struct("<6sIQ")
+_RECORD = struct.Struct("<IHBQIQq")
+
+class Codec(NamedTuple):
+    id: int
+    compress: Callable[[bytes], bytes]
+    decompress: Callable[[bytes], bytes]
+
+CODECS = {
+    "none": Codec(0, bytes, bytes),
+    "zlib": Codec(1, lambda data: zlib.compress(data, 9), zlib.decompress),
+    "bz2": Codec(2, bz2.compress, bz2.decompress),
+    "lzma": Codec(3, lzma.compress, lzma.decompress),
+}
+_DECOMPRESS = {codec.id: codec.decompress for codec in CODECS.values()}
+
+class PageState(NamedTuple):
+    size: int
+    mtime_ns: int
+
+class PackedArchive:
+    """Read only view over a packed archive"""
+    _data: mmap.mmap
+    _count: int
+    _names_start: int
+    _data_start: int
+
+    def __init__(self, data: mmap.mmap):
+        magic, count, names_size = _HEADER.unpack_from(data, 0)
+        assert magic == _MAGIC
+        self._data = data
+        self._count = count
+        self._names_start = _HEADER.size + _RECORD.size * count
+        self._data_start = self._names_start + names_size
+
+    @classmethod
+    def open(cls, path: Path | str) -> "PackedArchive":
+        with open(path, "rb") as infile:
+            return cls(mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def read(self, location: str) -> bytes:
+        content = self.get(location)
+        if content is None:
+            raise FileNotFoundError(f"'{location}' is not in the packed archive")
+        return content
+
+    def get(self, location: str) -> bytes | None:
+        record = self._find(location)
+        if record is None:
+            return None
+        _, _, codec, data_offset, data_length, _, _ = record
+        start = self._data_start + data_offset
+        return _DECOMPRESS[codec](self._data[start:start + data_length])
+
+    def state(self, location: str) -> PageState | None:
+        record = self._find(location)
+        return None if record is None else PageState(record[5], record[6])
+
+    def __contains__(self, location: str) -> bool:
+        return self._find(location) is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def locations(self) -> Iterator[str]:
+        for index in range(self._count):
+            yield self._name(self._record(index)).decode("utf-8")
+
+    def _find(self, location: str) -> tuple | None:
+        key = location.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            mid = (low + high) // 2
+            record = self._record(mid)
+            name = self._name(record)
+            if name < key:
+                low = mid + 1
+            elif name > key:
+                high = mid
+            else:
+                return record
+        return None
+
+    def _record(self, index: int) -> tuple:
+        return _RECORD.unpack_from(self._data, _HEADER.size + _RECORD.size * index)
+
+    def _name(self, record: tuple) -> bytes:
+        start = self._names_start + record[0]
+        return self._data[start:start + record[1]]
+
+class ArchivePages:
+    """Files of an archive directory by location, from its packed archive when it has them"""
+    html_root: Path
+    packed: PackedArchive | None
+    # Packed locations whose loose file changed since packing
+    stale: set[str]
+
+    def __init__(self, html_root: Path | str):
+        self.html_root = Path(html_root)
+        pack_path = packed_path(self.html_root)
+        self.packed = PackedArchive.open(pack_path) if pack_path.is_file() else None
+        self.stale = set() if self.packed is None else stale_locations(self.html_root, self.packed)
+
+    def read_bytes(self, location: str) -> bytes:
+        if self.packed is not None and location not in self.stale:
+            content = self.packed.get(location)
+            if content is not None:
+                return content
+        return (self.html_root / location).read_bytes()
+
+    def read_text(self, location: str) -> str:
+        return self.read_bytes(location).decode("utf-8")
+
+    def state(self, location: str) -> PageState | None:
+        """Size and modification time of the page, None when there is no such page"""
+        if self.packed is not None and location not in self.stale:
+            state = self.packed.state(location)
+            if state is not None:
+                return state
+        return file_state(self.html_root / location)
+
+    def locations(self) -> Iterator[str]:
+        if self.packed is not None:
+            return self.packed.locations()
+        return iter(archive_locations(self.html_root))
+
+def file_state(path: Path) -> PageState | None:
+    if not path.is_file():
+        return None
+    stat = path.stat()
+    return PageState(stat.st_size, stat.st_mtime_ns)
+
+def stale_locations(html_root: Path, packed: PackedArchive) -> set[str]:
+    """Packed locations whose loose file has another size or modification time, in one scan of the directory"""
+    stale = set()
+    for directory, _, filenames in os.walk(html_root):
+        for filename in filenames:
+            location = Path(directory, filename).relative_to(html_root).as_posix()
+            state = packed.state(location)
+            if state is not None and file_state(html_root / location) != state:
+                stale.add(location)
+    return stale
+
+def packed_path(html_root: Path) -> Path:
+    return html_root.with_name(html_root.name + PACK_SUFFIX)
+
+def archive_locations(html_root: Path) -> list[str]:
+    """Location of every file of the loose archive, in the order of the packed records"""
+    locations = (path.relative_to(html_root).as_posix() for path in html_root.rglob("*") if path.is_file())
+    return sorted(locations, key=str.encode)
+
+def pack_archive(html_root: Path, pack_path: Path, codec: str = DEFAULT_CODEC) -> int:
+    """Packs every file of `html_root`, returns the size of the packed archive"""
+    compress = CODECS[codec]
+    records = []
+    names = []
+    chunks = []
+    names_size = data_size = 0
+    for location in archive_locations(html_root):
+        path = html_root / location
+        stat = path.stat()
+        content = path.read_bytes()
+        used, data = compress, compress.compress(content)
+        if len(data) >= len(content):
+            used, data = CODECS["none"], content # stored as is when compressing doesn't help
+        name = location.encode("utf-8")
+        records.append(_RECORD.pack(
+            names_size, len(name), used.id, data_size, len(data), stat.st_size, stat.st_mtime_ns
+        ))
+        names.append(name)
+        chunks.append(data)
+        names_size += len(name)
+        data_size += len(data)
+
+    # written to a temporary file first, so concurrent builds never read a partial archive
+    tmp_path = pack_path.with_suffix(f"{PACK_SUFFIX}.{os.getpid()}.tmp")
+    with open(tmp_path, "wb") as outfile:
+        outfile.write(_HEADER.pack(_MAGIC, len(records), names_size))
+        outfile.writelines(records)
+        outfile.writelines(names)
+        outfile.writelines(chunks)
+    tmp_path.replace(pack_path)
+    return pack_path.stat().st_size
+
+def read_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Packs the loose html archive into a single file")
+    parser.add_argument("archive_dir", nargs="?", default="kb_archive/html", type=Path)
+    parser.add_argument("pack_path", nargs="?", type=Path, help="Defaults to the archive directory with a .kbpack suffix")
+    parser.add_argument("--codec", choices=CODECS, default=DEFAULT_CODEC, help="Codec each page is compressed with")
+    return parser.parse_args()
+
+if __name__ == "__main__":
+    args = read_args()
+    pack_path = args.pack_path if args.pack_path is not None else packed_path(args.archive_dir)
+    size = pack_archive(args.archive_dir, pack_path, args.codec)
+    print(f"Packed {args.archive_dir} into {pack_path}, {size / 2**20:.1f} MiB")
@@ -0,0 +1,205 @@
+"""SQLite index of per page metadata from `kb_archive/html`, shared by kb_pdf and kb_help
+
+Pages are keyed by their location relative to `kb_archive/html`. Each page records its title,
+first h1, localized versions, anchor ids and the byte offsets of its content section.
+`PageIndex.refresh` only re-reads pages whose modification time or size changed, and only
+re-parses those whose content hash changed. Pages are read through `ArchivePages`, from the
+packed archive when there is one.
+
+Run as `python -m kb_common.page_index [archive_dir] [db_path]` from the repository root to
+index the whole archive up front.
+"""
+from .packed_archive import ArchivePages
+
+from bs4 import BeautifulSoup, Tag
+
+from html import unescape
+from pathlib import Path
+from typing import Iterable, NamedTuple
+import hashlib
+import sqlite3
+import sys
+
+# Bump whenever the extracted fields change, older databases are rebuilt
+INDEX_VERSION = 1
+TITLE_SUFFIX = " - MariaDB Knowledge Base"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS pages (
+    location TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    title TEXT,
+    h1 TEXT,
+    section_start INTEGER,
+    section_end INTEGER
+);
+CREATE TABLE IF NOT EXISTS localized_versions (
+    location TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    lang TEXT NOT NULL,
+    url TEXT NOT NULL,
+    PRIMARY KEY (location, lang)
+);
+CREATE TABLE IF NOT EXISTS anchors (
+    location TEXT NOT NULL,
+    anchor TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS anchors_location ON anchors (location);
+"""
+
+class PageInfo(NamedTuple):
+    title: str | None
+    h1: str | None
+    section_start: int | None
+    section_end: int | None
+    localized_versions: dict[str, str]
+    anchors: list[str]
+
+class PageIndex:
+    pages: ArchivePages
+    connection: sqlite3.Connection
+
+    def __init__(self, html_root: Path | str, db_path: Path | str):
+        self.pages = ArchivePages(html_root)
+        self.connection = sqlite3.connect(db_path)
+        self._create_schema()
+
+    def refresh(self, locations: Iterable[str]) -> int:
+        """Re-indexes the pages which changed since they were last indexed, returns how many were parsed"""
+        known = {
+            location: (mtime_ns, size, sha1)
+            for location, mtime_ns, size, sha1
+            in self.connection.execute("SELECT location, mtime_ns, size, sha1 FROM pages")
+        }
+        parsed = 0
+        with self.connection:
+            for location in dict.fromkeys(locations):
+                state = self.pages.state(location)
+                if state is None:
+                    raise FileNotFoundError(f"'{location}' is not in {self.pages.html_root}")
+                previous = known.get(location)
+                if previous is not None and previous[:2] == (state.mtime_ns, state.size):
+                    continue
+                content = self.pages.read_bytes(location)
+                sha1 = hashlib.sha1(content).hexdigest()
+                if previous is not None and previous[2] == sha1:
+                    self.connection.execute(
+                        "UPDATE pages SET mtime_ns = ?, size = ? WHERE location = ?",
+                        (state.mtime_ns, state.size, location)
+                    )
+                    continue
+                self._store(location, state.mtime_ns, state.size, sha1, read_page_info(content))
+                parsed += 1
+        return parsed
+
+    def page(self, location: str) -> PageInfo | None:
+        row = self.connection.execute(
+            "SELECT title, h1, section_start, section_end FROM pages WHERE location = ?", (location,)
+        ).fetchone()
+        if row is None:
+            return None
+        return PageInfo(*row, self.localized_versions(location), self.anchors(location))
+
+    def title(self, location: str) -> str | None:
+        row = self.connection.execute("SELECT title FROM pages WHERE location = ?", (location,)).fetchone()
+        return None if row is None else row[0]
+
+    def localized_versions(self, location: str) -> dict[str, str]:
+        """Maps each language listed under 'Localized Versions' to the (relative) url of that version"""
+        rows = self.connection.execute(
+            "SELECT lang, url FROM localized_versions WHERE location = ? ORDER BY position", (location,)
+        )
+        return dict(rows.fetchall())
+
+    def anchors(self, location: str) -> list[str]:
+        rows = self.connection.execute("SELECT anchor FROM anchors WHERE location = ? ORDER BY rowid", (location,))
+        return [anchor for anchor, in rows]
+
+    def _create_schema(self):
+        with self.connection:
+            self.connection.executescript(_SCHEMA)
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+            if row is not None and row[0] == str(INDEX_VERSION):
+                return
+            for table in ("pages", "localized_versions", "anchors"):
+                self.connection.execute(f"DELETE FROM {table}")
+            self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(INDEX_VERSION),))
+
+    def _store(self, location: str, mtime_ns: int, size: int, sha1: str, info: PageInfo):
+        self.connection.execute("DELETE FROM localized_versions WHERE location = ?", (location,))
+        self.connection.execute("DELETE FROM anchors WHERE location = ?", (location,))
+        self.connection.execute(
+            "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (location, mtime_ns, size, sha1, info.title, info.h1, info.section_start, info.section_end)
+        )
+        self.connection.executemany(
+            "INSERT INTO localized_versions VALUES (?, ?, ?, ?)",
+            [(location, position, lang, url) for position, (lang, url) in enumerate(info.localized_versions.items())]
+        )
+        self.connection.executemany(
+            "INSERT INTO anchors VALUES (?, ?)", [(location, anchor) for anchor in info.anchors]
+        )
+
+def read_page_info(content: bytes) -> PageInfo:
+    html = content.decode("utf-8")
+    section_start = content.find(b"<section")
+    section_end = content.find(b"</section>")
+    has_section = -1 not in (section_start, section_end)
+
+    soup = BeautifulSoup(html, features="html.parser")
+    h1 = soup.find("h1")
+    section = soup.find("section")
+    anchors = []
+    if isinstance(section, Tag):
+        anchors = [tag.attrs["id"] for tag in section.find_all(attrs={"id": True})]
+    return PageInfo(
+        title=read_title(html),
+        h1=h1.get_text().strip() if isinstance(h1, Tag) else None,
+        section_start=section_start if has_section else None,
+        section_end=section_end if has_section else None,
+        localized_versions=read_localized_versions(soup),
+        anchors=anchors,
+    )
+
+def read_title(html: str) -> str | None:
+    if not ("<title>" in html and "</title>" in html):
+        return None
+    index = html.index("<title>")
+    end_index = html.index("</title>", index+1)
+    title = html[index:end_index]\
+        .removeprefix("<title>")\
+        .removesuffix(TITLE_SUFFIX)
+    # Converts html escape sequences like '&amp'; to their text representations: '&'
+    return unescape(title)
+
+def read_localized_versions(soup: BeautifulSoup) -> dict[str, str]:
+    header = soup.find(["h3","h4","h5","h6"], string="Localized Versions")
+    if header is None:
+        return {}
+    assert isinstance(header, Tag)
+    versions_div = header.parent.find_next_sibling() # type: ignore
+    if versions_div is None:
+        return {}
+    assert isinstance(versions_div, Tag)
+    languages = {}
+    for li in versions_div.select("li"):
+        if isinstance(li.a, Tag) and "href" in li.a.attrs:
+            lang_url = li.a.attrs["href"]
+            li.a.decompose()
+            lang = li.text.strip().removeprefix("[").removesuffix("]")
+            languages[lang] = lang_url
+    return languages
+
+def index_archive(html_root: Path, db_path: Path) -> int:
+    index = PageIndex(html_root, db_path)
+    locations = [location for location in index.pages.locations() if location.endswith(".html")]
+    return index.refresh(locations)
+
+if __name__ == "__main__":
+    html_root = Path(sys.argv[1] if len(sys.argv) > 1 else "kb_archive/html")
+    db_path = Path(sys.argv[2] if len(sys.argv) > 2 else "kb_archive/page_index.sqlite")
+    parsed = index_archive(html_root, db_path)
+    print(f"Indexed {parsed} changed pages")
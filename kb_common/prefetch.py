@@ -0,0 +1,74 @@
+"""Bounded read-ahead for the per-page loops of kb_pdf and kb_help
+
+`prefetch` reads upcoming pages on a few threads while the caller processes the current one, so
+reading the archive overlaps with parsing instead of stalling it. At most `window` pages are read
+ahead, which bounds memory, and whichever side is slower sets the pace. `bounded_map` submits work
+to an executor with the same bound, so worker processes can be fed from a prefetched iterator.
+`chunked_process_map` does so in chunks of pages, the way both tools hand pages to their workers.
+"""
+from collections import deque
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import partial
+from itertools import chain, islice
+from typing import Callable, Iterable, Iterator, TypeVar
+import contextvars
+
+# Number of pages read ahead of the one being processed
+DEFAULT_WINDOW = 16
+# Threads reading pages, reads mostly wait on the disk so a few are enough to keep ahead
+DEFAULT_READERS = 4
+# Number of chunks handed to each worker at a time, keeps workers busy without holding every page
+CHUNKS_PER_JOB = 4
+# Pages sent to a worker at once, with their html
+PAGES_PER_CHUNK = 8
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def prefetch(
+    items: Iterable[T], read: Callable[[T], R], window: int = DEFAULT_WINDOW, readers: int = DEFAULT_READERS
+) -> Iterator[tuple[T, R]]:
+    """Yields (item, read(item)) in order, reading up to `window` items ahead on `readers` threads
+
+    A `window` of 0 reads each item only when it is yielded. Exceptions raised by `read` are
+    raised when their item is reached. `read` runs in a copy of the caller's context, so it sees
+    the same context variables, such as the language kb_pdf is logging for.
+    """
+    if window <= 0:
+        yield from ((item, read(item)) for item in items)
+        return
+    context = contextvars.copy_context()
+    with ThreadPoolExecutor(max_workers=min(readers, window), thread_name_prefix="prefetch") as executor:
+        # a context can only be entered by one thread at a time, each read gets its own copy
+        yield from bounded_map(executor, lambda item: (item, context.copy().run(read, item)), items, window)
+
+def bounded_map(executor: Executor, fn: Callable[[T], R], items: Iterable[T], window: int) -> Iterator[R]:
+    """`executor.map` which submits at most `window` items ahead of the result being yielded
+
+    Unlike `Executor.map`, which submits every item up front, `items` may be a lazy iterator.
+    """
+    pending = deque()
+    for item in items:
+        pending.append(executor.submit(fn, item))
+        if len(pending) > window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+def chunked_process_map(executor: Executor, fn: Callable[[T], R], sources: Iterable[T], jobs: int) -> Iterator[R]:
+    """`bounded_map` sending `PAGES_PER_CHUNK` sources to a worker at once, `CHUNKS_PER_JOB` chunks per job ahead
+
+    `fn` has to be picklable for process pools, a module level function or a partial of one.
+    """
+    chunks = bounded_map(executor, partial(_map_chunk, fn), chunked(sources, PAGES_PER_CHUNK), jobs * CHUNKS_PER_JOB)
+    return chain.from_iterable(chunks)
+
+def _map_chunk(fn: Callable[[T], R], chunk: list[T]) -> list[R]:
+    return [fn(item) for item in chunk]
+
+def chunked(items: Iterable[T], size: int) -> Iterator[list[T]]:
+    """Splits items into lists of `size`, the last one may be shorter"""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
@@ -0,0 +1,144 @@
+"""Lightweight build instrumentation shared by kb_pdf and kb_help
+
+`profiler.stage(name)` records the wall time and peak memory of a stage, nested stages are
+named after their parents like "build[en]/process_pages". `profiler.record_page` records the
+time spent on a single page. Recording only appends to lists, nothing is written unless a
+report is requested with `profiled`, which both CLIs enable with `--profile`.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from threading import Lock
+from typing import Any, Callable, Iterator, NamedTuple
+import cProfile
+import json
+import sys
+import time
+
+try:
+    import resource
+except ImportError: # not available on Windows, memory is then left out of the report
+    resource = None
+
+DEFAULT_REPORT_PATH = "profile.json"
+SLOWEST_PAGES = 20
+PROGRESS_INTERVAL = 0.5
+
+# Name of the innermost running stage, per thread
+_STAGE: ContextVar[str] = ContextVar("profiling_stage", default="")
+
+class StageTiming(NamedTuple):
+    name: str
+    seconds: float
+    peak_rss: int | None
+    rss_growth: int | None
+
+class PageTiming(NamedTuple):
+    stage: str
+    name: str
+    seconds: float
+
+class Profiler:
+    stages: list[StageTiming]
+    pages: list[PageTiming]
+
+    def __init__(self):
+        self.stages = []
+        self.pages = []
+        self.started = time.perf_counter()
+        self._lock = Lock()
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        parent = _STAGE.get()
+        full_name = f"{parent}/{name}" if parent else name
+        token = _STAGE.set(full_name)
+        start_rss = peak_rss()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            _STAGE.reset(token)
+            end_rss = peak_rss()
+            growth = None if end_rss is None or start_rss is None else end_rss - start_rss
+            with self._lock:
+                self.stages.append(StageTiming(full_name, seconds, end_rss, growth))
+
+    def record_page(self, name: str, seconds: float):
+        with self._lock:
+            self.pages.append(PageTiming(_STAGE.get(), name, seconds))
+
+    def report(self, slowest: int = SLOWEST_PAGES) -> dict[str, Any]:
+        with self._lock:
+            stages = list(self.stages)
+            pages = list(self.pages)
+        stage_totals: dict[str, float] = {}
+        for stage in stages:
+            stage_totals[stage.name] = stage_totals.get(stage.name, 0.0) + stage.seconds
+        page_seconds = sum(page.seconds for page in pages)
+        return {
+            "total_seconds": time.perf_counter() - self.started,
+            "peak_rss_bytes": peak_rss(),
+            "children_peak_rss_bytes": peak_rss(children=True),
+            "stages": [stage._asdict() for stage in stages],
+            "stage_totals": stage_totals,
+            "pages": {
+                "count": len(pages),
+                "total_seconds": page_seconds,
+                "mean_seconds": page_seconds / len(pages) if pages else 0.0,
+            },
+            "slowest_pages": [
+                page._asdict() for page in sorted(pages, key=lambda page: page.seconds, reverse=True)[:slowest]
+            ],
+        }
+
+    def write_report(self, path: Path, slowest: int = SLOWEST_PAGES):
+        path.write_text(json.dumps(self.report(slowest), indent=2) + "\n", encoding="utf-8")
+
+def peak_rss(children: bool = False) -> int | None:
+    """Peak resident memory of this process, or of its finished child processes, in bytes"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF)
+    # kilobytes on Linux, bytes on macOS
+    return usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+
+profiler = Profiler()
+
+@contextmanager
+def profiled(report_path: Path | None, use_cprofile: bool = False) -> Iterator[None]:
+    """Writes the report to `report_path` when the block ends, with a cProfile dump next to it
+
+    cProfile only sees the calling thread, work in other threads or worker processes is only
+    visible through the stage and page timings.
+    """
+    cprofile = cProfile.Profile() if report_path is not None and use_cprofile else None
+    if cprofile is not None:
+        cprofile.enable()
+    try:
+        yield
+    finally:
+        if cprofile is not None:
+            cprofile.disable()
+            cprofile.dump_stats(report_path.with_suffix(".prof")) # type: ignore
+        if report_path is not None:
+            profiler.write_report(report_path)
+
+class Progress:
+    """Prints progress at most every `interval` seconds instead of on every item, and always the last one"""
+    def __init__(self, total: int, format: Callable[[int, int], str], interval: float = PROGRESS_INTERVAL):
+        self.total = total
+        self.format = format
+        self.interval = interval
+        self._last = 0.0
+
+    def update(self, done: int):
+        now = time.perf_counter()
+        if done < self.total and now - self._last < self.interval:
+            return
+        self._last = now
+        print("\r" + self.format(done, self.total), end="", flush=True)
+
+    def finish(self):
+        print("\r" + self.format(self.total, self.total))
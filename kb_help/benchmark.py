@@ -0,0 +1,54 @@
+"""Micro-benchmarks of the per-page hot paths, run against the checked in archive
+
+Usage: python benchmark.py [filters...] [--rounds N] [--save] [--baseline PATH]
+"""
+import bootstrap
+
+from bs4 import BeautifulSoup as Soup
+
+from kb_common.archive_index import ArchiveIndex
+from kb_common.packed_archive import ArchivePages
+from kb_common.benchmark import BENCHMARK_PAGES, Case, run_benchmarks
+from src.html2text import clean_html
+from src.html_tag_rules import create_table, format_table
+from src.kb_archive import ARCHIVE_PATH, HTML_PATH
+from src.parsers import TEXT_PARSERS
+from src.sql_insert import split_escaped
+
+BASELINE_PATH = "benchmark_baseline.json"
+
+
+def read_pages() -> dict[str, tuple[str, str]]:
+    """Maps each benchmark page to its (url, html)"""
+    index = ArchiveIndex.load(ARCHIVE_PATH)
+    archive = ArchivePages(HTML_PATH)
+    pages = {}
+    for name, url in BENCHMARK_PAGES.items():
+        location = index.get(url)
+        assert location is not None, url
+        pages[name] = (url, archive.read_text(location))
+    return pages
+
+def largest_table(url: str, html: str) -> list:
+    soup = Soup(clean_html(html, url), features="lxml")
+    return max((create_table(table) for table in soup.find_all("table")), key=len)
+
+def create_cases() -> list[Case]:
+    pages = read_pages()
+    cases = []
+    for parser, html_to_text in TEXT_PARSERS.items():
+        for name, (url, html) in pages.items():
+            cases.append(Case(
+                f"html_to_text[{parser}:{name}]",
+                lambda html_to_text=html_to_text, html=html, url=url: html_to_text(html, url)
+            ))
+    table = largest_table(*pages["huge_table"])
+    cases.append(Case("format_table[huge_table]", lambda: format_table([row.copy() for row in table])))
+
+    # the longest description, split into parts of the size the old concat statements had
+    description = TEXT_PARSERS["soup"](*reversed(pages["long"]))
+    cases.append(Case("split_escaped[long]", lambda: split_escaped(description, 15000)))
+    return cases
+
+if __name__ == "__main__":
+    run_benchmarks(create_cases(), BASELINE_PATH)
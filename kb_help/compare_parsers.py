@@ -0,0 +1,76 @@
+"""Runs every html to text backend over the whole archive and diffs their output against 'soup'
+
+Usage: python compare_parsers.py [--parsers lxml] [--limit N]
+Unified diffs are written to output/parser_diffs/<parser>/, one file per differing page.
+"""
+import argparse
+import difflib
+import time
+from pathlib import Path
+import bootstrap
+from kb_common.archive_index import ArchiveIndex
+from kb_common.packed_archive import ArchivePages
+from src.kb_archive import ARCHIVE_PATH, HTML_PATH
+from src.html2text import CONTENT_SECTION
+from src.parsers import DEFAULT_PARSER, TEXT_PARSERS
+import src.debug as debug
+
+DIFF_PATH = Path("output/parser_diffs")
+
+def read_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    others = [name for name in TEXT_PARSERS if name != DEFAULT_PARSER]
+    parser.add_argument("--parsers", nargs="+", choices=others, default=others)
+    parser.add_argument("--limit", type=int, default=None)
+    return parser.parse_args()
+
+def archive_pages(archive: ArchivePages, limit: int | None) -> list[tuple[str, str]]:
+    """Every page of the archive once, with one of the urls pointing to it"""
+    pages = {}
+    for url, location in ArchiveIndex.load(ARCHIVE_PATH).items():
+        if location not in pages and archive.state(location) is not None:
+            pages[location] = (url, location)
+    return list(pages.values())[:limit]
+
+def diff_file_name(location: str) -> str:
+    return location.replace("/", "_") + ".diff"
+
+def main():
+    args = read_args()
+    archive = ArchivePages(HTML_PATH)
+    pages = archive_pages(archive, args.limit)
+    timings = dict.fromkeys([DEFAULT_PARSER, *args.parsers], 0.0)
+    differing = dict.fromkeys(args.parsers, 0)
+    for parser in args.parsers:
+        (DIFF_PATH / parser).mkdir(parents=True, exist_ok=True)
+
+    skipped = 0
+    for url, location in pages:
+        html = archive.read_text(location)
+        if CONTENT_SECTION not in html:
+            skipped += 1 # not a knowledge base article
+            continue
+        outputs = {}
+        for parser in timings:
+            start = time.perf_counter()
+            outputs[parser] = TEXT_PARSERS[parser](html, url)
+            timings[parser] += time.perf_counter() - start
+        for parser in args.parsers:
+            if outputs[parser] == outputs[DEFAULT_PARSER]:
+                continue
+            differing[parser] += 1
+            diff = difflib.unified_diff(
+                outputs[DEFAULT_PARSER].splitlines(keepends=True), outputs[parser].splitlines(keepends=True),
+                fromfile=f"{DEFAULT_PARSER}:{url}", tofile=f"{parser}:{url}"
+            )
+            (DIFF_PATH / parser / diff_file_name(location)).write_text("".join(diff), encoding="utf-8")
+
+    debug.success(f"Compared {len(pages) - skipped} pages, skipped {skipped} without a content section")
+    for parser, taken in timings.items():
+        summary = f"{parser}: {taken:.2f}s"
+        if parser in differing:
+            summary += f", {differing[parser]} differing pages"
+        debug.time_info(summary)
+
+if __name__ == "__main__":
+    main()
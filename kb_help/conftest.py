@@ -0,0 +1,21 @@
+import bootstrap
+from src.kb_archive import ARCHIVE_PATH
+
+from pathlib import Path
+import os
+import pytest
+
+
+@pytest.fixture(scope="session")
+def benchmark_pages() -> dict[str, tuple[str, str]]:
+    """(url, html) of the benchmark pages, read from the kb_help directory its archive paths are relative to"""
+    kb_help = Path(__file__).parent
+    if not (kb_help / ARCHIVE_PATH).is_file():
+        pytest.skip("the page archive is not available")
+    from benchmark import read_pages
+    cwd = os.getcwd()
+    os.chdir(kb_help)
+    try:
+        return read_pages()
+    finally:
+        os.chdir(cwd)
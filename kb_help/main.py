@@ -2,25 +2,61 @@
 import time
 import os
 from pathlib import Path
-from src.generate_sql import generate_sql
+import bootstrap
+from src.generate_sql import HELP_TABLE_COLUMNS, generate_versions_tables, read_boilerplate, tables_sql
 from src.version import Version
+from src.parsers import DEFAULT_PARSER, TEXT_PARSERS
+from src.sql_insert import DEFAULT_PACKET_SIZE
+from src.tsv_export import write_tables
+from src.delta_sql import HelpManifest, count_changes, create_manifest, delta_sql
+from kb_common.profiling import DEFAULT_REPORT_PATH, profiled
 import src.debug as debug
+from typing import NamedTuple
 import argparse
 
 # Preparing system for colored text
 os.system('')
 
 SQL_FILENAME: str = "fill_help_tables.sql"
-DEFAULT_CONCAT_SIZE = 15000
 
-def read_args() -> tuple[list[Version], int]:
+class Args(NamedTuple):
+    versions: list[Version]
+    packet_size: int
+    parser: str
+    jobs: int
+    tsv: bool
+    delta_from: Path | None
+    profile_path: Path | None
+    cprofile: bool
+
+def read_args() -> Args:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--length", "-l", type=int, default=DEFAULT_CONCAT_SIZE)
+    parser.add_argument("--packet-size", type=int, default=DEFAULT_PACKET_SIZE,
+                        help="Maximum size of a statement and of each of its lines in bytes, "
+                        "long descriptions are continued by updates")
     parser.add_argument("--versions", "--version", "-v", nargs="+", required=True)
+    parser.add_argument("--parser", choices=TEXT_PARSERS, default=DEFAULT_PARSER)
+    parser.add_argument("--jobs", "-j", type=int, default=1, help="Number of worker processes converting pages to text")
+    parser.add_argument("--tsv", action="store_true",
+                        help="Also writes the tables as tab separated files with a LOAD DATA loader script")
+    parser.add_argument("--delta-from", metavar="MANIFEST",
+                        help="Also writes the statements updating the tables of the build which wrote MANIFEST, keeping its keyword ids")
+    parser.add_argument("--profile", nargs="?", const=DEFAULT_REPORT_PATH,
+                        help="Writes stage timings, memory and the slowest pages to a JSON report")
+    parser.add_argument("--cprofile", action="store_true",
+                        help="With --profile, also dumps cProfile stats next to the report")
     args = parser.parse_args()
 
-    versions = read_versions(args.versions)
-    return versions, args.length
+    return Args(
+        versions=read_versions(args.versions),
+        packet_size=args.packet_size,
+        parser=args.parser,
+        jobs=max(1, args.jobs),
+        tsv=args.tsv,
+        delta_from=None if args.delta_from is None else Path(args.delta_from),
+        profile_path=None if args.profile is None else Path(args.profile),
+        cprofile=args.cprofile,
+    )
 
 # Functions
 def read_versions(args: list[str]) -> list[Version]:
@@ -37,15 +73,42 @@ def read_versions(args: list[str]) -> list[Version]:
 def version_filepath(version: Version) -> Path:
     return Path("output") / f"fill_help_tables-{version.major}{version.minor}.sql"
 
+def manifest_filepath(version: Version) -> Path:
+    return version_filepath(version).with_suffix(".json")
+
+def delta_filepath(version: Version) -> Path:
+    return version_filepath(version).with_name(f"{version_filepath(version).stem}-delta.sql")
+
+def tsv_dirpath(version: Version) -> Path:
+    return Path("output") / f"help_tables-{version.major}{version.minor}"
+
 def main():
-    versions, concat_size = read_args()
-    debug.success(f"Selected Versions: {versions}")
+    args = read_args()
+    debug.success(f"Selected Versions: {args.versions}")
 
     Path("output").mkdir(exist_ok=True)
-    for version in versions:
-        debug.success(f"Generating Version: {version}")
-        new_sql = generate_sql(version, concat_size-400) #makes room for line info around description
-        version_filepath(version).write_text(new_sql)
+    previous = None if args.delta_from is None else HelpManifest.load(args.delta_from)
+    with profiled(args.profile_path, args.cprofile):
+        debug.success(f"Generating Versions: {args.versions}")
+        boilerplate = read_boilerplate()
+        keyword_ids = None if previous is None else previous.keyword_ids
+        version_tables = generate_versions_tables(args.versions, args.parser, args.jobs, keyword_ids)
+        for version, tables in zip(args.versions, version_tables, strict=True):
+            version_filepath(version).write_text(tables_sql(boilerplate, tables, args.packet_size))
+            manifest = create_manifest(tables)
+            manifest.save(manifest_filepath(version))
+            if previous is not None:
+                delta_filepath(version).write_text(delta_sql(boilerplate, previous, tables, args.packet_size))
+                changes = ", ".join(
+                    f"{table} +{added} ~{changed} -{removed}"
+                    for table, (added, changed, removed) in count_changes(previous, manifest).items()
+                )
+                debug.info(f"Wrote {delta_filepath(version)}: {changes}")
+            if args.tsv:
+                loader_path = write_tables(tsv_dirpath(version), tables._asdict(), HELP_TABLE_COLUMNS, boilerplate)
+                debug.info(f"Wrote tab separated tables and {loader_path}")
+    if args.profile_path is not None:
+        debug.time_info(f"Wrote profile to {args.profile_path}")
 
 if __name__ == "__main__":
     start = time.perf_counter()
@@ -0,0 +1,92 @@
+"""Statements turning the help tables of a previous build into those of the current one
+
+Every build writes a manifest with the digest of each row by its primary key. Given the manifest
+of the build a server was loaded from, only the rows which were removed or changed are deleted,
+and the changed and new rows inserted again. The manifest also keeps the id of every keyword, a
+build given it numbers new keywords after them instead of renumbering the rest.
+"""
+from .generate_sql import HELP_TABLE_COLUMNS, HelpTables, generate_descriptions, table_columns
+from .sql_insert import Row, delete_statements, insert_statements
+
+from pathlib import Path
+from typing import NamedTuple
+import hashlib
+import json
+
+# Bump when the manifest layout or row digests change
+MANIFEST_VERSION = 2
+# Number of leading columns forming the primary key of each table
+PRIMARY_KEY_LENGTHS = {"help_category": 1, "help_topic": 1, "help_keyword": 1, "help_relation": 2}
+
+
+class HelpManifest(NamedTuple):
+    # Digest of every row by its primary key, a JSON list, by table
+    tables: dict[str, dict[str, str]]
+    # Id of every keyword by its name
+    keyword_ids: dict[str, int]
+
+    @classmethod
+    def load(cls, path: Path) -> "HelpManifest":
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if data.get("version") != MANIFEST_VERSION:
+            raise ValueError(f"'{path}' is not a version {MANIFEST_VERSION} help table manifest")
+        return cls(tables=data["tables"], keyword_ids=data["keyword_ids"])
+
+    def save(self, path: Path):
+        data = {"version": MANIFEST_VERSION} | self._asdict()
+        path.write_text(json.dumps(data), encoding="utf-8")
+
+def create_manifest(tables: HelpTables) -> HelpManifest:
+    return HelpManifest(
+        tables={
+            table: {row_key(table, row): row_digest(row) for row in rows}
+            for table, rows in tables._asdict().items()
+        },
+        keyword_ids={name: keyword_id for keyword_id, name in tables.help_keyword},
+    )
+
+def row_key(table: str, row: Row) -> str:
+    return json.dumps(row[:PRIMARY_KEY_LENGTHS[table]])
+
+def row_digest(row: Row) -> str:
+    return hashlib.sha256(json.dumps(row).encode("utf-8")).hexdigest()
+
+def key_columns(table: str) -> str:
+    return ",".join(HELP_TABLE_COLUMNS[table].split(",")[:PRIMARY_KEY_LENGTHS[table]])
+
+def delta_sql(boilerplate: str, previous: HelpManifest, tables: HelpTables, packet_size: int) -> str:
+    """Same header as the full output, without its deletes of every row"""
+    header = "\n".join(line for line in boilerplate.splitlines() if not line.startswith("delete from "))
+    statements = delta_statements(previous, tables, packet_size)
+    return header + "\n" + "\n".join(statements)
+
+def delta_statements(previous: HelpManifest, tables: HelpTables, packet_size: int) -> list[str]:
+    """Deletes the rows which are gone or changed, children before parents, then inserts the changed and new ones"""
+    current = create_manifest(tables)
+    deletes = []
+    inserts = []
+    for table, rows in tables._asdict().items():
+        previous_rows = previous.tables.get(table, {})
+        current_rows = current.tables[table]
+        removed = [
+            tuple(json.loads(key)) for key, digest in previous_rows.items()
+            if current_rows.get(key) != digest
+        ]
+        deletes[:0] = delete_statements(table, key_columns(table), removed, packet_size)
+        changed = [row for row in rows if previous_rows.get(row_key(table, row)) != current_rows[row_key(table, row)]]
+        if table == "help_topic":
+            inserts += generate_descriptions(changed, packet_size)
+        else:
+            inserts += insert_statements(table_columns(table), changed, packet_size)
+    return deletes + inserts
+
+def count_changes(previous: HelpManifest, current: HelpManifest) -> dict[str, tuple[int, int, int]]:
+    """Number of (added, changed, removed) rows of each table"""
+    counts = {}
+    for table, current_rows in current.tables.items():
+        previous_rows = previous.tables.get(table, {})
+        added = sum(1 for key in current_rows if key not in previous_rows)
+        changed = sum(1 for key, digest in current_rows.items() if previous_rows.get(key, digest) != digest)
+        removed = sum(1 for key in previous_rows if key not in current_rows)
+        counts[table] = (added, changed, removed)
+    return counts
@@ -2,25 +2,111 @@ from .version import Version
 from .kb_item import KbItem
 from .kb_archive import KbArchive
 from . import debug
-from .html2text import html_to_text
-
-from typing import Iterator
-from html import unescape
+from .parsers import DEFAULT_PARSER, TEXT_PARSERS
+from .sql_insert import DEFAULT_PACKET_SIZE, Row, byte_length, insert_statements, split_escaped, sql_value
+from kb_common.kb_urls import HELP_COLUMNS, KbUrlRow, KbUrlsError, load_kb_urls
+from kb_common.prefetch import DEFAULT_WINDOW, chunked_process_map, prefetch
+from kb_common.page_index import read_title
+from kb_common.profiling import Progress, profiler
+
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Iterable, Iterator, NamedTuple
 from pathlib import Path
 import csv
+import time
 from itertools import chain
 
 CATEGORY_CSV = Path("input/help_cats.csv")
 KB_URLS_PATH = Path("../kb_urls.csv")
+# Columns of each help table, in the order of its rows
+HELP_TABLE_COLUMNS = {
+    "help_category": "help_category_id,name,parent_category_id,url",
+    "help_topic": "help_topic_id,help_category_id,name,description,example,url",
+    "help_keyword": "help_keyword_id,name",
+    "help_relation": "help_topic_id,help_keyword_id",
+}
+
+class HelpInputs(NamedTuple):
+    category_rows: list[dict[str, str]]
+    url_rows: list[KbUrlRow]
+
+class HelpPage(NamedTuple):
+    description: str
+    name: str
+
+class HelpTables(NamedTuple):
+    """Rows of every help table of a version, with whole descriptions"""
+    help_category: list[Row]
+    help_topic: list[Row]
+    help_keyword: list[Row]
+    help_relation: list[Row]
+
+def generate_sql(
+    version: Version, packet_size: int = DEFAULT_PACKET_SIZE, parser: str = DEFAULT_PARSER, jobs: int = 1
+) -> str:
+    return generate_versions_sql([version], packet_size, parser, jobs)[0]
 
-def generate_sql(version: Version, concat_size: int) -> str:
+def generate_versions_sql(
+    versions: list[Version], packet_size: int = DEFAULT_PACKET_SIZE, parser: str = DEFAULT_PARSER, jobs: int = 1
+) -> list[str]:
     boilerplate = read_boilerplate()
-    help_categories, category_info = read_category_info(version)
-    kb_urls = read_kb_urls(category_info, version)
-    help_relations, help_keywords = generate_keyword_sql(kb_urls)
-    descriptions = generate_descriptions(kb_urls, version, concat_size)
+    return [
+        tables_sql(boilerplate, tables, packet_size)
+        for tables in generate_versions_tables(versions, parser, jobs)
+    ]
 
-    return merge_sql(boilerplate, help_categories, descriptions, help_relations, help_keywords)
+def generate_versions_tables(
+    versions: list[Version], parser: str = DEFAULT_PARSER, jobs: int = 1, keyword_ids: dict[str, int] | None = None
+) -> list[HelpTables]:
+    """Returns the tables of each version, the inputs are read and each page converted only once for all of them
+
+    Keywords of `keyword_ids`, those of a previous build, keep their ids.
+    """
+    with profiler.stage("read_csv"):
+        inputs = read_inputs()
+        version_categories = [read_category_info(version, inputs.category_rows) for version in versions]
+        version_urls = [
+            read_kb_urls(category_ids, version, inputs.url_rows)
+            for version, (_, category_ids) in zip(versions, version_categories)
+        ]
+    with profiler.stage("descriptions"):
+        # Topics are shared between versions, pages are converted in the order they first appear in
+        urls = list(dict.fromkeys(row.url for kb_urls in version_urls for row in kb_urls))
+        pages = read_pages(urls, parser, jobs)
+
+    tables = []
+    for version, (help_categories, _), kb_urls in zip(versions, version_categories, version_urls):
+        with profiler.stage(f"version[{version}]"):
+            tables.append(generate_version_tables(help_categories, kb_urls, pages, keyword_ids))
+    return tables
+
+def generate_version_tables(
+    help_categories: list[Row], kb_urls: list[KbItem], pages: dict[str, HelpPage], keyword_ids: dict[str, int] | None = None
+) -> HelpTables:
+    with profiler.stage("keywords"):
+        help_keywords, help_relations = generate_keyword_rows(kb_urls, keyword_ids)
+    with profiler.stage("topics"):
+        help_topics = generate_topic_rows(kb_urls, pages)
+    return HelpTables(help_categories, help_topics, help_keywords, help_relations)
+
+def tables_sql(boilerplate: str, tables: HelpTables, packet_size: int) -> str:
+    with profiler.stage("merge_sql"):
+        categories = insert_statements(table_columns("help_category"), tables.help_category, packet_size)
+        descriptions = generate_descriptions(tables.help_topic, packet_size)
+        help_keywords = insert_statements(table_columns("help_keyword"), tables.help_keyword, packet_size)
+        help_relations = insert_statements(table_columns("help_relation"), tables.help_relation, packet_size)
+        return merge_sql(boilerplate, categories, descriptions, help_keywords, help_relations)
+
+def table_columns(table: str) -> str:
+    return f"{table} ({HELP_TABLE_COLUMNS[table]})"
+
+def read_inputs() -> HelpInputs:
+    try:
+        url_rows = load_kb_urls(KB_URLS_PATH, columns=HELP_COLUMNS)
+    except KbUrlsError as error:
+        debug.error(str(error))
+    return HelpInputs(read_category_csv(), url_rows)
 
 def merge_sql(
     boilerplate: str, help_categories: list[str], descriptions: list[str],
@@ -32,58 +118,53 @@ def merge_sql(
 def read_boilerplate() -> str:
     return Path("input/starting_sql.sql").read_text(encoding="utf-8")
 
-def read_category_info(version: Version) -> tuple[list[str], dict[str, int]]:
-    """ Returns (raw sql string, mapping between category name and it's id) """
-    csv_rows = read_category_csv_raw(version)
+def read_category_info(
+    version: Version, category_rows: list[dict[str, str]]
+) -> tuple[list[Row], dict[str, int]]:
+    """ Returns (help_category rows, mapping between category name and it's id) """
+    csv_rows = filter_category_rows(category_rows, version)
     # generates a unique ID for each category, with the category name '0' being first
     category_ids =  { '0': 0 } | {
         row["Name"]: cat_id
         for (cat_id, row) in enumerate(csv_rows, 1)
     }
-    categories_str = [
-        format_category_definition(row["Name"], cat_id, category_ids[row["Parent"]])
+    categories = [
+        (cat_id, row["Name"], category_ids[row["Parent"]], "")
         for (cat_id, row) in enumerate(csv_rows, 1)
     ]
 
-    return categories_str, category_ids
+    return categories, category_ids
 
-def read_category_csv_raw(version: Version) -> list[dict]:
-    """Reads category_csv and filters categories added after the given version"""
+def read_category_csv() -> list[dict[str, str]]:
     infile = CATEGORY_CSV.read_text(encoding="utf-8")
-    unfiltered_csv = csv.DictReader(infile.splitlines())
+    return list(csv.DictReader(infile.splitlines()))
 
+def filter_category_rows(category_rows: list[dict[str, str]], version: Version) -> list[dict[str, str]]:
+    """Filters categories added after the given version"""
     is_valid_version = lambda row: row["Include"] == "1" or (Version.from_str(row["Include"]) <= version)
-    return list(filter(is_valid_version, unfiltered_csv))
-
-def format_category_definition(name, cat_id: int, parent_id: int) -> str:
-    return "insert into help_category (help_category_id,name,parent_category_id,url)" \
-           f" values ({cat_id},'{name}',{parent_id},'');"
-
-
-def read_kb_urls(category_ids: dict[str, int], version: Version):
-    with open(KB_URLS_PATH, 'r', encoding="utf-8") as infile:
-        reader = csv.DictReader(infile, strict=True)
-        urls = set()
-        rows = [KbItem(
-            row["URL"],
-            category_ids[row["HELP Cat"]],
-            keywords_str=row["HELP Keywords"])
-            for row in reader if is_valid_row(row, urls, version)
-        ]
+    return list(filter(is_valid_version, category_rows))
+
+
+def read_kb_urls(category_ids: dict[str, int], version: Version, url_rows: list[KbUrlRow]) -> list[KbItem]:
+    urls = set()
+    rows = [
+        KbItem(row.url, category_ids[row.help_category], row.help_keywords)
+        for row in url_rows if is_valid_row(row, urls, version)
+    ]
     return rows
 
-def is_valid_row(row: dict[str, str], urls: set[str], version: Version) -> bool:
-    if not row["URL"]:
+def is_valid_row(row: KbUrlRow, urls: set[str], version: Version) -> bool:
+    if not row.url:
         return False
-    if not row["HELP Include"]:
-        debug.warn("No Help Include for " + row["URL"])
+    if not row.help_include:
+        debug.warn("No Help Include for " + row.url)
         return False
 
-    if row["HELP Include"] == '0' \
-        or row["HELP Include"] != '1' and Version.from_str(row["HELP Include"]) > version:
+    if row.help_include == '0' \
+        or row.help_include != '1' and Version.from_str(row.help_include) > version:
         return False
     
-    url = row["URL"]
+    url = row.url
     if url in urls:
         debug.warn(f"Duplicate url: '{url}'")
         return False
@@ -95,8 +176,12 @@ def row_help_topics(kb_urls: list[KbItem]) -> Iterator[tuple[int, KbItem]]:
     # Starting at 3 to make room for HELP DATE AND HELP_VERSION
     return enumerate(kb_urls, 3)
 
-def generate_keyword_sql(kb_urls: list[KbItem]) -> tuple[list[str], list[str]]:
-    unique_keywords = set(chain(*[row.keywords for row in kb_urls]))
+def generate_keyword_rows(
+    kb_urls: list[KbItem], previous_ids: dict[str, int] | None = None
+) -> tuple[list[Row], list[Row]]:
+    """Keywords of `previous_ids` keep their id, new ones are numbered after the largest of them"""
+    # sorted, so ids don't depend on hash randomisation and stay put when rows are reordered
+    unique_keywords = sorted(set(chain(*[row.keywords for row in kb_urls])))
     
     topic_keywords_2d = [(topic_id, row.keywords) for (topic_id, row) in row_help_topics(kb_urls)]
     topic_keywords = []
@@ -104,83 +189,94 @@ def generate_keyword_sql(kb_urls: list[KbItem]) -> tuple[list[str], list[str]]:
         for keyword in keywords:
             topic_keywords.append((topic_id, keyword))
 
+    previous_ids = previous_ids or {}
+    new_keywords = [keyword for keyword in unique_keywords if keyword not in previous_ids]
     keyword_ids: dict[str, int] = {
         keyword: keyword_id for (keyword_id, keyword)
-        in enumerate(unique_keywords, 1)
+        in enumerate(new_keywords, max(previous_ids.values(), default=0) + 1)
     }
-    help_keywords: list[str] = [
-        insert_help_keyword(keyword_id, keyword)
-        for (keyword, keyword_id) in keyword_ids.items()
+    keyword_ids |= {keyword: previous_ids[keyword] for keyword in unique_keywords if keyword in previous_ids}
+    help_keywords: list[Row] = [
+        (keyword_ids[keyword], keyword)
+        for keyword in unique_keywords
     ]
-    help_relations: list[str] = [
-        insert_help_relations(topic_id, keyword_ids[keyword])
+    help_relations: list[Row] = [
+        (topic_id, keyword_ids[keyword])
         for (topic_id, keyword) in topic_keywords
     ]
 
     return help_keywords, help_relations
 
-def generate_descriptions(kb_urls: list[KbItem], version: Version, concat_size: int):
-    topic_keywords = []
-    help_topics = []
-    archive = init_archive(kb_urls)
-    for index, (help_topic_id, row) in enumerate(row_help_topics(kb_urls)):
-        html = archive.read_html(row.url)
-
-        topic_keywords.append((help_topic_id, row.keywords))
-        description = html_to_text(html, row.url)
-        page_name = read_page_name(html, row.url)
-        help_topics.append(
-            insert_help_topic(help_topic_id, row, page_name, description, concat_size)
-        )
-        progress = round(index / len(kb_urls) * 100)
-        print(f"\r{progress}%", end="")
-
-    return help_topics
-
-def insert_help_keyword(keyword_id: int, keyword: str) -> str:
-    return f"insert into help_keyword values ({keyword_id}, '{keyword}');"
-
-def insert_help_relations(topic_id: int, keyword_id: int) -> str:
-    return f"insert into help_relation values ({topic_id}, {keyword_id});"
-
-def insert_help_topic(help_topic_id: int, row: KbItem, page_name: str, description: str, concat_size: int) -> str:
-    """Creates a help topic row in sql"""
-    parts = split_description_by_length(description, concat_size)
-    description = parts.pop(0)
-    output = "insert into help_topic (help_topic_id,help_category_id,name,description,example,url) values "
-    output += f"({help_topic_id},{row.category},'{page_name}','{description}','','{row.url}');"
-
-    concats = "".join([get_update_help_topic(desc, help_topic_id) for desc in parts])
-    return output + concats
-
-def split_description_by_length(description: str, line_length: int) -> list[str]:
-    parts = []
-    start = 0
-    while len(description) >= line_length:
-        index = description.rindex("\\n", 0, line_length)
-        parts.append(description[start:index])
-        start = index
-    parts.append(description[start:])
-        
-    assert "".join(parts) == description
-    return parts
-
-def get_update_help_topic(description: str, help_topic_id: int) -> str:
-    return "\nupdate help_topic set description = "\
-        f"CONCAT(description, '{description}') WHERE help_topic_id = {help_topic_id};"
-
-def read_page_name(html: str, url: str) -> str:
-    if not ("<title>" in html and "</title>" in html):
-        debug.error(f"Did not find title tag for '{url}'")
-
-    index = html.index("<title>")
-    end_index = html.index("</title>", index+1)
+def generate_topic_rows(kb_urls: list[KbItem], pages: dict[str, HelpPage]) -> list[Row]:
+    return [
+        help_topic_row(help_topic_id, row, pages[row.url].name, pages[row.url].description)
+        for help_topic_id, row in row_help_topics(kb_urls)
+    ]
 
-    title: str = html[index:end_index]\
-        .removeprefix("<title>")\
-        .removesuffix(" - MariaDB Knowledge Base")
-    # Converts html escape sequences like '&amp'; to their text representations: '&'
-    return unescape(title)
+def generate_descriptions(help_topics: list[Row], packet_size: int) -> list[str]:
+    """Inserts every help topic, descriptions too long for a packet are completed by updates after them"""
+    rows = []
+    updates = []
+    for topic in help_topics:
+        first, *rest = split_description(topic, packet_size)
+        rows.append(with_description(topic, first))
+        updates += [get_update_help_topic(part, topic[0]) for part in rest]
+    return insert_statements(table_columns("help_topic"), rows, packet_size) + updates
+
+def read_pages(
+    urls: list[str], parser: str = DEFAULT_PARSER, jobs: int = 1, window: int = DEFAULT_WINDOW
+) -> dict[str, HelpPage]:
+    """Converts every page to text, by url, reading up to `window` pages ahead of the conversion"""
+    pages = {}
+    archive = KbArchive(urls)
+    sources = prefetch(urls, archive.read_html, window)
+    progress = Progress(len(urls), lambda done, total: f"{round(done / total * 100)}%")
+    for index, (url, (page, seconds)) in enumerate(zip(urls, convert_pages(sources, len(urls), parser, jobs))):
+        if page.name is None:
+            debug.error(f"Did not find title tag for '{url}'")
+        pages[url] = page
+        profiler.record_page(url, seconds)
+        progress.update(index + 1)
+    progress.finish()
+    return pages
+
+def convert_pages(
+    sources: Iterable[tuple[str, str]], count: int, parser: str, jobs: int
+) -> Iterator[tuple[HelpPage, float]]:
+    """Yields the text and title of each (url, html) page and the seconds it took, in the same order as `sources`"""
+    convert = partial(convert_page, parser=parser)
+    if jobs <= 1 or count <= 1:
+        yield from map(convert, sources)
+        return
+    debug.time_info(f"Converting {count} pages with {jobs} jobs")
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from chunked_process_map(executor, convert, sources, jobs)
+
+def convert_page(source: tuple[str, str], parser: str) -> tuple[HelpPage, float]:
+    """Times converting the already read html, reading it is not part of the page's time"""
+    start = time.perf_counter()
+    url, html = source
+    page = HelpPage(TEXT_PARSERS[parser](html, url), read_title(html)) # type: ignore
+    return page, time.perf_counter() - start
+
+def help_topic_row(help_topic_id: int, row: KbItem, page_name: str, description: str) -> Row:
+    return (help_topic_id, row.category, page_name, description, "", row.url)
+
+def with_description(topic: Row, description: str) -> Row:
+    return (*topic[:3], description, *topic[4:])
+
+def split_description(topic: Row, packet_size: int) -> list[str]:
+    """Splits the description into parts which fit into the insert of its row, or an update, on their own"""
+    help_topic_id, _, _, description, _, url = topic
+    insert_size = byte_length(insert_statements(
+        table_columns("help_topic"), [with_description(topic, "")], packet_size
+    )[0])
+    update_size = byte_length(get_update_help_topic("", help_topic_id))
+    max_length = packet_size - max(insert_size, update_size)
+    if max_length <= 0:
+        debug.error(f"Packet size {packet_size} is too small for the help topic of '{url}'")
+    return split_escaped(description, max_length)
 
-def init_archive(kb_urls: list[KbItem]):
-    return KbArchive(map(lambda row: row.url, kb_urls))
\ No newline at end of file
+def get_update_help_topic(description: str, help_topic_id: int) -> str:
+    return "update help_topic set description = "\
+        f"CONCAT(description, {sql_value(description)}) WHERE help_topic_id = {help_topic_id};"
@@ -1,4 +1,5 @@
 LINE_LIMIT = 79
+CONTENT_SECTION = '<section id="content" class="limited_width col-md-8 clearfix">'
 
 from . import debug
 from bs4 import Tag, BeautifulSoup as Soup
@@ -18,10 +19,10 @@ def html_to_text(html: str, url: str) -> str:
     return text
 
 def clean_html(html: str, url) -> str:
-    if '<section id="content" class="limited_width col-md-8 clearfix">' not in html:
+    if CONTENT_SECTION not in html:
         debug.error(f"Invalid HTML for '{url}'")
 
-    section = html.index('<section id="content" class="limited_width col-md-8 clearfix">')
+    section = html.index(CONTENT_SECTION)
     end_section = html.index('</section>')
 
     html = html[section: end_section + len('</section>')]
@@ -45,10 +46,14 @@ def remove_junk(soup: Soup):
     if isinstance(tag, Tag): tag.decompose()
 
 def apply_tag_rules(soup: Soup):
-    tag: Soup
-    for tag in soup.descendants: # type: ignore
-        if tag.name in TAG_RULES:
-            TAG_RULES[tag.name](tag)
+    """Applies the rule of each outermost tag that has one, a rule replaces the tag's contents with text"""
+    # Walks next_element by hand: 'soup.descendants' reads the successor before yielding,
+    # so on newer bs4 versions it would stop at the contents a rule just removed
+    element = soup.contents[0] if soup.contents else None
+    while element is not None:
+        if isinstance(element, Tag) and element.name in TAG_RULES:
+            TAG_RULES[element.name](element) # type: ignore
+        element = element.next_element
 
 def remove_see_also(soup: Soup):
     """Finds the header labled 'See Also', removes it and it's next sibling"""
@@ -0,0 +1,117 @@
+"""`html_to_text` running directly on an lxml tree instead of a BeautifulSoup tree
+
+Elements are never modified: junk and 'See Also' sections are recorded in a set of removed
+elements, and the text rules are applied while rendering the outermost tag they match.
+"""
+from .html2text import clean_html
+from .html_tag_rules import TEXT_RULES, format_table_tag
+
+from kb_common.lxml_soup import (
+    Element, PRESERVE_WHITESPACE_TAGS, SKIPPED_TEXT_TAGS, collapse, has_class, tag_string
+)
+
+from lxml import etree
+
+REMOVED_DIV_IDS = {"content_disclaimer", "comments", "subscribe"}
+REMOVED_DIV_CLASSES = {"simple_section_nav", "table_of_contents"}
+
+
+def html_to_text(html: str, url: str) -> str:
+    html = clean_html(html, url)
+    root = etree.HTML(html)
+    if root is None:
+        return ""
+    removed = find_junk(root)
+    removed |= find_see_also(root, removed)
+    parts: list[str] = []
+    render(root, removed, parts, skipped=False, preserve=False)
+    return "".join(parts)
+
+def find_junk(root: Element) -> set[Element]:
+    removed = set()
+    first_h1 = None
+    for element in walk(root, removed):
+        if element.tag == "div" and (
+            element.get("id") in REMOVED_DIV_IDS or has_class(element, REMOVED_DIV_CLASSES)
+        ):
+            removed.add(element)
+        elif element.tag == "h2" and tag_string(element) == "Comments":
+            removed.add(element)
+        elif element.tag == "h1" and first_h1 is None:
+            first_h1 = element
+    #remove main header
+    if first_h1 is not None:
+        removed.add(first_h1)
+    return removed
+
+def find_see_also(root: Element, removed: set[Element]) -> set[Element]:
+    """Finds the first header labled 'See Also' of each level, returns it and it's next sibling"""
+    see_also = set()
+    for n in range(2, 7):
+        for element in walk(root, removed | see_also, into_rules=False):
+            if element.tag == f"h{n}" and element.get("id") == "see-also" and has_class(element, {"anchored_heading"}):
+                see_also.add(element)
+                for sibling in element.itersiblings():
+                    if isinstance(sibling.tag, str) and sibling not in removed and sibling not in see_also:
+                        see_also.add(sibling)
+                        break
+                break
+    return see_also
+
+def render(element: Element, removed: set[Element], parts: list[str], skipped: bool, preserve: bool):
+    skipped = skipped or element.tag in SKIPPED_TEXT_TAGS
+    preserve = preserve or element.tag in PRESERVE_WHITESPACE_TAGS
+    if element.text and not skipped:
+        parts.append(collapse(element.text, preserve))
+    for child in element:
+        if child in removed:
+            pass
+        elif not isinstance(child.tag, str):
+            pass # comments and processing instructions
+        elif child.tag in TEXT_RULES:
+            parts.append(TEXT_RULES[child.tag](text(child, removed, preserve)))
+        elif child.tag == "table":
+            parts.append(format_table_tag(create_table(child, removed, preserve)))
+        else:
+            render(child, removed, parts, skipped, preserve)
+        if child.tail and not skipped:
+            parts.append(collapse(child.tail, preserve))
+
+def text(element: Element, removed: set[Element], preserve: bool) -> str:
+    """Equivalent of BeautifulSoup's `Tag.text`, `preserve` is whether a parent keeps whitespace"""
+    parts: list[str] = []
+    _collect_text(element, removed, parts, skipped=False, preserve=preserve)
+    return "".join(parts)
+
+def _collect_text(element: Element, removed: set[Element], parts: list[str], skipped: bool, preserve: bool):
+    skipped = skipped or element.tag in SKIPPED_TEXT_TAGS
+    preserve = preserve or element.tag in PRESERVE_WHITESPACE_TAGS
+    if element.text and not skipped:
+        parts.append(collapse(element.text, preserve))
+    for child in element:
+        if child not in removed and isinstance(child.tag, str):
+            _collect_text(child, removed, parts, skipped, preserve)
+        if child.tail and not skipped:
+            parts.append(collapse(child.tail, preserve))
+
+def create_table(table: Element, removed: set[Element], preserve: bool) -> list:
+    """Creates a table, cells are every th of a row followed by every td"""
+    columns = []
+    for tr in walk(table, removed, tag="tr"):
+        ths = list(walk(tr, removed, tag="th")) + list(walk(tr, removed, tag="td"))
+        columns.append([text(th, removed, preserve) for th in ths])
+    return columns
+
+def walk(element: Element, removed: set[Element], tag: str | None = None, into_rules: bool = True):
+    """Yields the element and its descendants in document order, skipping removed subtrees"""
+    stack = [element]
+    while stack:
+        current = stack.pop()
+        if current in removed or not isinstance(current.tag, str):
+            continue
+        if tag is None or current.tag == tag:
+            yield current
+            if current in removed: # removed by the caller
+                continue
+        if into_rules or current is element or current.tag not in TEXT_RULES and current.tag != "table":
+            stack.extend(reversed(current))
@@ -0,0 +1,196 @@
+"""`html_to_text` converting the page in a single pass over lxml's parser events, without a tree
+
+Junk, the main header and 'See Also' sections are skipped from their start tag on. The text of
+the outermost tag with a rule is collected until its end tag, so every string is visited once.
+Only a 'Comments' header can't be told from its start tag, its text is dropped at its end tag.
+"""
+from .html2text import clean_html
+from .html2text_lxml import REMOVED_DIV_CLASSES, REMOVED_DIV_IDS
+from .html_tag_rules import TEXT_RULES, format_table_tag
+
+from kb_common.lxml_soup import PRESERVE_WHITESPACE_TAGS, SKIPPED_TEXT_TAGS, class_matches, collapse
+
+from dataclasses import dataclass
+from lxml import etree
+
+SEE_ALSO_HEADERS = {f"h{n}" for n in range(2, 7)}
+CELL_TAGS = {"th", "td"}
+
+
+def html_to_text(html: str, url: str) -> str:
+    parser = etree.HTMLParser(target=TextTarget())
+    parser.feed(clean_html(html, url))
+    return parser.close()
+
+@dataclass(slots=True)
+class Frame:
+    """An open element which is not skipped"""
+    tag: str
+    # Whether its strings are left out of the text, below script like tags
+    skipped: bool
+    # Whether whitespace only strings are kept as is
+    preserve: bool
+    # Number of children and the string of the last one, `Tag.string` is that of an only child
+    children: int = 0
+    string: str | None = None
+    # Length of the text collected up to an h2, which is dropped if it's a 'Comments' header
+    marks: list[tuple[list[str], int]] | None = None
+
+class TextTarget:
+    """lxml parser target, `close` returns the same text as the other backends"""
+
+    def __init__(self):
+        self.parts: list[str] = []
+        self.stack = [Frame("", skipped=False, preserve=False)]
+        self.pending: list[str] = []
+        # Depth inside a skipped subtree, 0 outside of one
+        self.skipping = 0
+        self.seen_h1 = False
+        self.see_also_headers: set[str] = set()
+        # Parent of a 'See Also' header, its next element is skipped as well
+        self.see_also_parent: Frame | None = None
+        # Outermost element with a rule, and its text
+        self.rule: Frame | None = None
+        self.rule_parts: list[str] = []
+        # Rows of the outermost table with their th and td cells, like `create_table`
+        self.rows: list[tuple[list[list[str]], list[list[str]]]] = []
+        self.open_rows: list[tuple[list[list[str]], list[list[str]]]] = []
+        self.open_cells: list[list[str]] = []
+        self.table_preserve = False
+
+    def start(self, tag: str, attrib: dict[str, str]):
+        self.flush()
+        parent = self.stack[-1]
+        parent.children += 1
+        if self.skipping:
+            self.skipping += 1
+            return
+        if self.is_removed(tag, attrib, parent):
+            self.skipping = 1
+            return
+
+        frame = Frame(tag, parent.skipped or tag in SKIPPED_TEXT_TAGS, parent.preserve or tag in PRESERVE_WHITESPACE_TAGS)
+        if tag == "h2":
+            frame.marks = [(collected, len(collected)) for collected in self.collecting()]
+        if self.rule is None:
+            if tag in TEXT_RULES or tag == "table":
+                # a rule's text includes strings below script like tags outside of it
+                frame.skipped = False
+                self.rule = frame
+                self.table_preserve = parent.preserve
+        elif self.rule.tag == "table":
+            if tag == "tr":
+                row = ([], [])
+                self.rows.append(row)
+                self.open_rows.append(row)
+            elif tag in CELL_TAGS:
+                cell = []
+                for row in self.open_rows:
+                    row[tag == "td"].append(cell)
+                self.open_cells.append(cell)
+                frame.skipped = False
+                frame.preserve = self.table_preserve or tag in PRESERVE_WHITESPACE_TAGS
+        self.stack.append(frame)
+
+    def is_removed(self, tag: str, attrib: dict[str, str], parent: Frame) -> bool:
+        """Whether the element is junk, the main header, or part of a 'See Also' section"""
+        if tag == "div" and (
+            attrib.get("id") in REMOVED_DIV_IDS or class_matches(attrib.get("class"), REMOVED_DIV_CLASSES)
+        ):
+            return True
+        if tag == "h1" and not self.seen_h1:
+            self.seen_h1 = True
+            return True
+        if parent is self.see_also_parent:
+            self.see_also_parent = None
+            return True
+        if (
+            tag in SEE_ALSO_HEADERS and self.rule is None and tag not in self.see_also_headers
+            and attrib.get("id") == "see-also" and class_matches(attrib.get("class"), {"anchored_heading"})
+        ):
+            # only the first header of each level is removed
+            self.see_also_headers.add(tag)
+            self.see_also_parent = parent
+            return True
+        return False
+
+    def end(self, tag: str):
+        self.flush()
+        if self.skipping:
+            self.skipping -= 1
+            return
+        frame = self.stack.pop()
+        string = frame.string if frame.children == 1 else None
+        self.stack[-1].string = string
+        if frame is self.see_also_parent:
+            self.see_also_parent = None
+        comments = frame.tag == "h2" and string == "Comments"
+        if comments:
+            for collected, length in frame.marks or []:
+                del collected[length:]
+
+        if frame is self.rule:
+            self.rule = None
+            text = self.rule_text(frame.tag)
+            if not comments:
+                self.parts.append(text)
+        elif self.rule is not None and self.rule.tag == "table":
+            if frame.tag == "tr":
+                self.open_rows.pop()
+            elif frame.tag in CELL_TAGS:
+                self.open_cells.pop()
+
+    def rule_text(self, tag: str) -> str:
+        if tag == "table":
+            table = [["".join(cell) for cell in ths + tds] for ths, tds in self.rows]
+            self.rows = []
+            return format_table_tag(table)
+        text = TEXT_RULES[tag]("".join(self.rule_parts))
+        self.rule_parts = []
+        return text
+
+    def data(self, data: str):
+        self.pending.append(data)
+
+    def comment(self, text: str):
+        self.flush()
+        self.add_child_string(text)
+
+    def pi(self, target: str, data: str | None = None):
+        self.flush()
+        self.add_child_string(data or "")
+
+    def add_child_string(self, string: str):
+        if self.skipping:
+            return
+        frame = self.stack[-1]
+        frame.children += 1
+        frame.string = string
+
+    def flush(self):
+        """Handles the text read since the last event, lxml may hand it over in several pieces"""
+        if not self.pending:
+            return
+        string = "".join(self.pending)
+        self.pending.clear()
+        if self.skipping:
+            return
+        frame = self.stack[-1]
+        self.add_child_string(string)
+        if frame.skipped:
+            return
+        text = collapse(string, frame.preserve)
+        for collected in self.collecting():
+            collected.append(text)
+
+    def collecting(self) -> list[list[str]]:
+        """Lists the text is currently added to, every open cell of a table"""
+        if self.rule is None:
+            return [self.parts]
+        if self.rule.tag == "table":
+            return self.open_cells
+        return [self.rule_parts]
+
+    def close(self) -> str:
+        self.flush()
+        return "".join(self.parts)
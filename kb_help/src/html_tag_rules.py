@@ -7,30 +7,42 @@ from . import debug
 
 #functions
 def paragraphTag(tag: Soup):
-    string = tag.text.strip().replace("\n", " ")
-    string = re.sub(" +", " ", string)
-    tag.string = string + "\n"
+    tag.string = format_paragraph(tag.text)
 
 def headerTag(tag: Soup):
     """Modifies headers to have extra space and decoration"""
-    length = len(tag.text)
-    tag.string = "\n" + tag.text + "\n" + "-" * length + "\n"
-    #tag.string = tag.string
+    tag.string = format_header(tag.text)
 
 def codeTag(tag: Soup):
     """Spaces code blocks to improve readability"""
-
-    tag.string = "\n\n" + tag.text.replace("\\n", "\\\\n") + "\n"
+    tag.string = format_code(tag.text)
 
 def listTag(tag: Soup):
     """Marks <li> items with a *"""
-    tag.string = "* " + tag.text
+    tag.string = format_list_item(tag.text)
 
 def tableTag(tag: Soup):
     """Turns html tables into text tables"""
     structured_table = create_table(tag)
-    text = format_table(structured_table)
-    tag.string = "\n" + text
+    tag.string = format_table_tag(structured_table)
+
+#text formatting, shared by every parser backend
+def format_paragraph(text: str) -> str:
+    string = text.strip().replace("\n", " ")
+    string = re.sub(" +", " ", string)
+    return string + "\n"
+
+def format_header(text: str) -> str:
+    return "\n" + text + "\n" + "-" * len(text) + "\n"
+
+def format_code(text: str) -> str:
+    return "\n\n" + text + "\n"
+
+def format_list_item(text: str) -> str:
+    return "* " + text
+
+def format_table_tag(table: list) -> str:
+    return "\n" + format_table(table)
 
 
 #table stuff
@@ -47,58 +59,68 @@ def create_table(table) -> list:
 
     return columns
 
-def equalise_table(table):
-    """makes sure there are no rows with less columns than other rows"""
-    max_row_length = 0
-    for row in table:
-        row_length = len(row)
-        max_row_length = max(max_row_length, row_length)
-
-    for row in table:
-        row_length = len(row)
-        if row_length < max_row_length:
-            row += [""] * (max_row_length - row_length)
-
-    return table
-
-def format_table(table):
-    """Formats a table from a list into raw text"""
-    output = ""
-
-    equalise_table(table)
-    column_widths = get_column_widths(table)
-    for row in table:
-        str_line = add_row_break(column_widths)
-        row_lines, num_lines = get_lines(row, column_widths)
-        for i in range(num_lines):
-            str_line += "|"
-            for index, line in enumerate(row_lines):
-                str_line += " "
-                if i < len(line):
-                    str_line += line[i] + " " * (column_widths[index] - len(line[i]))
-                else:
-                    str_line += " " * column_widths[index]
-                str_line += " |"
-            str_line += "\n"
-        output += str_line
-        #test
-        space_left = LINE_LIMIT-len(str_line.replace("\\'", "'").splitlines()[0])
-        if space_left < 0:
-            debug.warn("Table was formatted incorrectly")
-    output += add_row_break(column_widths)
-    return output
-
-def get_column_widths(table: list) -> list:
-    """Gets the required width for each column"""
-    row: list = table[0]
-    lengths: list = [len(column) for column in row]
-
-    sum_lengths: int = sum(lengths)
-    total_width: int = LINE_LIMIT - (3*len(lengths)) - 1
-    #total width times the ratio of length / the sum of lengths
-    column_widths = [int(total_width * (l / sum_lengths)) for l in lengths]
-
-    return column_widths
+def format_table(table: list) -> str:
+    """Formats a table from a list into raw text, every line fits within LINE_LIMIT when possible
+
+    Each cell is split into words once, the column widths are fitted to those and every cell
+    is wrapped in a single pass over its words.
+    """
+    if not table:
+        return ""
+    num_columns = max(len(row) for row in table)
+    rows = [[cell.split() for cell in row] + [[]] * (num_columns - len(row)) for row in table]
+    column_widths = get_column_widths(rows, num_columns)
+    row_break = add_row_break(column_widths)
+
+    output = []
+    for row in rows:
+        output.append(row_break)
+        cell_lines = [wrap_words(words, width) for words, width in zip(row, column_widths)]
+        for i in range(max((len(lines) for lines in cell_lines), default=0)):
+            output.append("|" + "".join(
+                " " + (lines[i] if i < len(lines) else "").ljust(width) + " |"
+                for lines, width in zip(cell_lines, column_widths)
+            ) + "\n")
+    output.append(row_break)
+    return "".join(output)
+
+def get_column_widths(rows: list[list[list[str]]], num_columns: int) -> list[int]:
+    """Gets the width of each column from the words of all its cells"""
+    # widest cell on a single line, and longest word, of each column
+    natural = [0] * num_columns
+    minimum = [0] * num_columns
+    for row in rows:
+        for index, words in enumerate(row):
+            if words:
+                natural[index] = max(natural[index], sum(map(len, words)) + len(words) - 1)
+                minimum[index] = max(minimum[index], max(map(len, words)))
+
+    total_width = LINE_LIMIT - (3 * num_columns) - 1
+    if sum(natural) <= total_width:
+        return natural
+    if sum(minimum) <= total_width:
+        # no word is split, the remaining width goes to the columns with the most wrapped text
+        return distribute_width(minimum, total_width, [n - m for n, m in zip(natural, minimum)])
+    if num_columns <= total_width:
+        # long words are split, every column gets a share of its content
+        return distribute_width([1] * num_columns, total_width, natural)
+    debug.warn(f"Table with {num_columns} columns can't fit in {LINE_LIMIT} characters")
+    return [1] * num_columns
+
+def distribute_width(widths: list[int], total_width: int, weights: list[int]) -> list[int]:
+    """Adds what is left of the total width to the widths, in proportion to the weights"""
+    extra = total_width - sum(widths)
+    total_weight = sum(weights)
+    if total_weight == 0:
+        return widths
+    shares = [extra * weight / total_weight for weight in weights]
+    widths = [width + int(share) for width, share in zip(widths, shares)]
+    # hands out the rounding leftovers to the largest remainders, in column order on ties
+    leftover = total_width - sum(widths)
+    by_remainder = sorted(range(len(widths)), key=lambda index: int(shares[index]) - shares[index])
+    for index in by_remainder[:leftover]:
+        widths[index] += 1
+    return widths
 
 def add_row_break(column_widths: list) -> str:
     """Breaks up rows with dashes and pluses"""
@@ -106,44 +128,33 @@ def add_row_break(column_widths: list) -> str:
     row_break = "+" + "".join(["-" * (width + 2) + "+" for width in column_widths])
     return row_break + "\n"
 
-def get_lines(row: list, column_widths: list) -> tuple[(list, int)]:
-    """returns the rows of lines and the number of lines for the column"""
-    rows = []
-    num_lines = 0
-    for index, width in enumerate(column_widths):
-        lines = sep_lines(row[index].strip(), width)
-        rows.append(lines)
-        num_lines = max(len(lines), num_lines)
-    
-    return rows, num_lines
-
-#seperate lines
-def sep_lines(line2: str, line_limit: int) -> list[str]:
-    """Seperates the lines based on the given length"""
+def wrap_words(words: list[str], width: int) -> list[str]:
+    """Wraps the words into lines of at most `width`, words longer than a line are split"""
     lines = []
-    while len(line2) > line_limit:
-        line1, line2 = seperate_line(line2, line_limit)
-        lines.append(line1)
-    lines.append(line2)
-
+    line: list[str] = []
+    length = 0
+    for word in words:
+        if line and length + 1 + len(word) > width:
+            lines.append(" ".join(line))
+            line, length = [], 0
+        while len(word) > width > 0:
+            if line:
+                lines.append(" ".join(line))
+                line, length = [], 0
+            lines.append(word[:width])
+            word = word[width:]
+        if word:
+            length += len(word) + (1 if line else 0)
+            line.append(word)
+    if line or not lines:
+        lines.append(" ".join(line))
     return lines
 
-def seperate_line(line: str, line_limit: int) -> tuple:
-    """returns two lines split based on the line limit"""
-    matches = list(re.finditer(" ", line))
-
-    for space in reversed(matches):
-        index = space.start()
-        #if the space is within the line limit
-        if (index < line_limit):
-            #split the line at that space's index
-            line1 = line[:index]
-            line2 = line[index + 1:]
-            break
-    #if no splits were made
-    else:
-        line1, line2 = line[:line_limit], line[line_limit+1:]
-    return line1, line2
+TEXT_RULES = {
+    "p": format_paragraph, "h1": format_header, "h2": format_header, "h3": format_header,
+    "h4": format_header, "h5": format_header, "h6": format_header, "code": format_code,
+    "pre": format_code, "li": format_list_item
+}
 
 TAG_RULES = {
     "p": paragraphTag, "h1": headerTag, "h2": headerTag, "h3": headerTag,
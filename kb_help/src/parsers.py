@@ -0,0 +1,12 @@
+"""Selectable html to text backends, all of them produce the same text"""
+from . import html2text, html2text_lxml, html2text_stream
+
+from typing import Callable
+
+DEFAULT_PARSER = "soup"
+
+TEXT_PARSERS: dict[str, Callable[[str, str], str]] = {
+    "soup": html2text.html_to_text,
+    "lxml": html2text_lxml.html_to_text,
+    "stream": html2text_stream.html_to_text,
+}
@@ -0,0 +1,100 @@
+"""Multi-row insert statements with MySQL string escaping, each kept under a packet size
+
+Sizes are counted in utf-8 bytes, the unit of the server's max_allowed_packet.
+"""
+from typing import Iterable
+
+# Default size limit of a statement. fill_help_tables.sql is loaded by mysqld --bootstrap, which
+# reads queries and lines of at most about 20000 bytes, so this stays at the former 15000 bytes
+# less their 400 bytes of headroom. Rows are on lines of their own, so no line is longer either.
+DEFAULT_PACKET_SIZE = 15000 - 400
+# Separates the rows of an insert, one row per line
+ROW_SEPARATOR = ",\n"
+
+_ESCAPES = str.maketrans({
+    "\\": "\\\\", "'": "\\'", "\n": "\\n", "\r": "\\r", "\0": "\\0", "\x1a": "\\Z",
+})
+
+Value = str | int
+Row = tuple[Value, ...]
+
+def escape_string(value: str) -> str:
+    """Escapes a string for use between single quotes, like mysql_real_escape_string"""
+    return value.translate(_ESCAPES)
+
+def sql_value(value: Value) -> str:
+    if isinstance(value, int):
+        return str(value)
+    return f"'{escape_string(value)}'"
+
+def sql_row(row: Row) -> str:
+    return "(" + ",".join(map(sql_value, row)) + ")"
+
+def byte_length(string: str) -> int:
+    return len(string.encode("utf-8"))
+
+def insert_statements(table: str, rows: Iterable[Row], packet_size: int) -> list[str]:
+    """Packs the rows into as few `insert into <table> values ...` statements as fit the packet size
+
+    `table` may list the columns after the table name, a single row larger than the packet
+    size is a ValueError.
+    """
+    return pack_statements(f"insert into {table} values ", map(sql_row, rows), ";", packet_size, ROW_SEPARATOR)
+
+def delete_statements(table: str, key_columns: str, keys: Iterable[Row], packet_size: int) -> list[str]:
+    """Deletes the rows whose primary key, of one or more columns, is in `keys`"""
+    if "," in key_columns:
+        prefix = f"delete from {table} where ({key_columns}) in ("
+        values = map(sql_row, keys)
+    else:
+        prefix = f"delete from {table} where {key_columns} in ("
+        values = (sql_value(key) for key, in keys)
+    return pack_statements(prefix, values, ");", packet_size, ",")
+
+def pack_statements(prefix: str, values: Iterable[str], suffix: str, packet_size: int, separator: str) -> list[str]:
+    """Joins the values into as few statements `<prefix><values><suffix>` as fit the packet size"""
+    statements = []
+    packed: list[str] = []
+    overhead = byte_length(prefix) + byte_length(suffix)
+    size = 0
+    for value in values:
+        length = byte_length(value)
+        if overhead + length > packet_size:
+            raise ValueError(f"Row of {length} bytes does not fit into a {packet_size} byte packet: {value[:100]}")
+        if packed and size + len(separator) + length > packet_size:
+            statements.append(prefix + separator.join(packed) + suffix)
+            packed = []
+        size = (size + len(separator) if packed else overhead) + length
+        packed.append(value)
+    if packed:
+        statements.append(prefix + separator.join(packed) + suffix)
+    return statements
+
+def split_escaped(string: str, max_length: int) -> list[str]:
+    """Splits the string into parts whose escaped form is at most `max_length` bytes
+
+    Parts end at line breaks where possible, only lines longer than a part are split within.
+    """
+    assert max_length > 0
+    parts = []
+    part: list[str] = []
+    length = 0
+    for line in string.splitlines(keepends=True):
+        line_length = byte_length(escape_string(line))
+        if part and length + line_length > max_length:
+            parts.append("".join(part))
+            part, length = [], 0
+        if line_length <= max_length:
+            part.append(line)
+            length += line_length
+            continue
+        for char in line:
+            char_length = byte_length(escape_string(char))
+            if part and length + char_length > max_length:
+                parts.append("".join(part))
+                part, length = [], 0
+            part.append(char)
+            length += char_length
+    if part or not parts:
+        parts.append("".join(part))
+    return parts
@@ -0,0 +1,50 @@
+"""Tab separated files of the help tables, in the default format of LOAD DATA INFILE
+
+Next to the files a loader script replaces the help tables with them. It uses LOAD DATA LOCAL
+INFILE with paths relative to the directory the mysql client is run from.
+"""
+from .sql_insert import Row, Value
+
+from pathlib import Path
+
+LOADER_FILENAME = "load_help_tables.sql"
+
+_ESCAPES = str.maketrans({
+    "\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0", "\x1a": "\\Z",
+})
+
+
+def escape_field(value: Value) -> str:
+    """Escapes a field with LOAD DATA's default `escaped by '\\\\'`"""
+    if isinstance(value, int):
+        return str(value)
+    return value.translate(_ESCAPES)
+
+def tsv_line(row: Row) -> str:
+    return "\t".join(map(escape_field, row)) + "\n"
+
+def write_tables(directory: Path, tables: dict[str, list[Row]], columns: dict[str, str], boilerplate: str) -> Path:
+    """Writes `<table>.tsv` for every table and the loader script, returns the path of the script"""
+    directory.mkdir(parents=True, exist_ok=True)
+    statements = []
+    for table, rows in tables.items():
+        filename = f"{table}.tsv"
+        # newline="\n" keeps the line terminator the loader expects on every platform
+        with open(directory / filename, "w", encoding="utf-8", newline="\n") as outfile:
+            outfile.writelines(map(tsv_line, rows))
+        statements.append(load_statement(table, columns[table], filename))
+
+    loader_path = directory / LOADER_FILENAME
+    loader_path.write_text(loader_sql(boilerplate, statements), encoding="utf-8", newline="\n")
+    return loader_path
+
+def load_statement(table: str, columns: str, filename: str) -> str:
+    return (
+        f"load data local infile '{filename}' into table {table} character set utf8\n"
+        "fields terminated by '\\t' escaped by '\\\\' lines terminated by '\\n'\n"
+        f"({columns});"
+    )
+
+def loader_sql(boilerplate: str, statements: list[str]) -> str:
+    usage = f"-- Run from this directory: mysql --local-infile=1 -u root -p mysql < {LOADER_FILENAME}\n\n"
+    return usage + boilerplate + "\n" + "\n".join(statements) + "\n"
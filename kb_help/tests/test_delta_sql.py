@@ -0,0 +1,30 @@
+from src.delta_sql import HelpManifest, create_manifest
+from src.generate_sql import HelpTables, generate_keyword_rows
+from src.kb_item import KbItem
+
+
+def kb_items(*keywords: tuple[str, ...]) -> list[KbItem]:
+    return [KbItem(f"https://mariadb.com/kb/en/{index}/", 1, words) for index, words in enumerate(keywords)]
+
+def test_keyword_ids_without_previous():
+    keywords, relations = generate_keyword_rows(kb_items(("SELECT", "JOIN"), ("INSERT",)))
+    assert keywords == [(1, "INSERT"), (2, "JOIN"), (3, "SELECT")]
+    assert relations == [(3, 3), (3, 2), (4, 1)]
+
+def test_new_keywords_keep_previous_ids():
+    previous_ids = {"INSERT": 1, "JOIN": 2, "SELECT": 3}
+    keywords, relations = generate_keyword_rows(kb_items(("SELECT", "ALTER"), ("INSERT", "JOIN")), previous_ids)
+    assert keywords == [(4, "ALTER"), (1, "INSERT"), (2, "JOIN"), (3, "SELECT")]
+    assert relations == [(3, 3), (3, 4), (4, 1), (4, 2)]
+
+def test_removed_keywords_leave_their_ids_unused():
+    keywords, _ = generate_keyword_rows(kb_items(("B",), ("D",)), {"A": 1, "B": 2, "C": 3})
+    assert keywords == [(2, "B"), (4, "D")]
+
+def test_manifest_keeps_keyword_ids(tmp_path):
+    help_keywords, help_relations = generate_keyword_rows(kb_items(("SELECT", "JOIN"), ("INSERT",)))
+    manifest = create_manifest(HelpTables([], [], help_keywords, help_relations))
+    manifest.save(tmp_path / "manifest.json")
+    loaded = HelpManifest.load(tmp_path / "manifest.json")
+    assert loaded == manifest
+    assert loaded.keyword_ids == {"INSERT": 1, "JOIN": 2, "SELECT": 3}
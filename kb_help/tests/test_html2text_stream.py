@@ -0,0 +1,49 @@
+from src.html2text import CONTENT_SECTION
+from src.html2text_stream import TextTarget
+from src.parsers import TEXT_PARSERS
+
+from lxml import etree
+import pytest
+
+PAGE = f"""<html><body><header>Site</header>{CONTENT_SECTION}
+<h1>CONCAT</h1>
+<div class="simple_section_nav">Navigation</div>
+<div id="content_disclaimer">Disclaimer</div>
+<h2>Syntax</h2>
+<pre>CONCAT(str1,  str2,...)
+  indented</pre>
+<h2>Description</h2>
+<p>Returns the <code>string</code> that results from <a href="/kb/en/x/">concatenating</a> the
+arguments.   Some   spaces.</p>
+<ul><li>First <strong>item</strong></li><li>Second <code>item</code><ul><li>Nested</li></ul></li></ul>
+<h3>Examples</h3>
+<table><tr><th>Name</th><th>Value</th></tr>
+<tr><td>a</td><td>A long value which is wrapped when the table is wider than the line limit of the text</td></tr>
+<tr><td><p>b</p></td><td><code>B</code></td></tr></table>
+<script>var skipped = 1;</script>
+<h2>Comments</h2>
+<div id="comments">A comment</div>
+<h2>See Also</h2>
+<ul><li><a href="/kb/en/concat_ws/">CONCAT_WS()</a></li></ul>
+<p>After the list</p>
+</section><footer>Footer</footer></body></html>"""
+
+
+@pytest.mark.parametrize("parser", ["lxml", "stream"])
+def test_synthetic_page(parser):
+    text = TEXT_PARSERS["soup"](PAGE, "https://mariadb.com/kb/en/concat/")
+    assert "Returns the" in text and "Nested" in text
+    assert TEXT_PARSERS[parser](PAGE, "https://mariadb.com/kb/en/concat/") == text
+
+@pytest.mark.parametrize("parser", ["lxml", "stream"])
+def test_benchmark_pages(benchmark_pages, parser):
+    for url, html in benchmark_pages.values():
+        assert TEXT_PARSERS[parser](html, url) == TEXT_PARSERS["soup"](html, url), url
+
+def test_target_fed_in_pieces():
+    """Strings split across feeds are joined like those of a single feed"""
+    html = PAGE[PAGE.index(CONTENT_SECTION):PAGE.index("</section>") + len("</section>")]
+    parser = etree.HTMLParser(target=TextTarget())
+    for start in range(0, len(html), 7):
+        parser.feed(html[start:start + 7])
+    assert parser.close() == TEXT_PARSERS["stream"](PAGE, "https://mariadb.com/kb/en/concat/")
@@ -0,0 +1,76 @@
+import src.html2text # imported first, html_tag_rules and html2text import each other
+from src.html2text import LINE_LIMIT, clean_html
+from src.html_tag_rules import create_table, distribute_width, format_table, wrap_words
+
+from bs4 import BeautifulSoup as Soup
+import pytest
+
+LONG = "A long value which is wrapped when the table is wider than the line limit of the text"
+TABLES = {
+    "fits": [["Name", "Value"], ["a", "1"]],
+    "wrapped": [["Name", "Description"], ["CONCAT", LONG], ["CONCAT_WS", LONG + " " + LONG]],
+    "split_words": [["x" * 60, "y" * 50], ["short", "z" * 40 + " words"]],
+    "ragged": [["One"], ["One", "Two", "Three"], [LONG, "", LONG]],
+    "empty_header": [["", ""], ["a", LONG]],
+    "many_columns": [[f"column{index}" for index in range(12)], [LONG] * 12],
+}
+
+
+def cell_texts(text: str) -> list[list[str]]:
+    """Text of every cell of a formatted table, the lines of a cell joined without spaces"""
+    lines = text.splitlines()
+    edges = [index for index, char in enumerate(lines[0]) if char == "+"]
+    rows = []
+    for line in lines:
+        if line.startswith("+"):
+            rows.append(["" for _ in edges[1:]])
+            continue
+        for index, (start, end) in enumerate(zip(edges, edges[1:])):
+            assert line[start] == "|"
+            rows[-1][index] += line[start + 1:end].replace(" ", "")
+    return rows[:-1]
+
+@pytest.mark.parametrize("name", TABLES)
+def test_format_table(name):
+    table = TABLES[name]
+    text = format_table(table)
+    assert all(len(line) <= LINE_LIMIT for line in text.splitlines())
+    assert len({len(line) for line in text.splitlines()}) == 1
+    num_columns = max(map(len, table))
+    expected = [["".join(cell.split()) for cell in row] + [""] * (num_columns - len(row)) for row in table]
+    assert cell_texts(text) == expected
+
+def test_format_table_keeps_natural_widths():
+    assert format_table(TABLES["fits"]) == (
+        "+------+-------+\n"
+        "| Name | Value |\n"
+        "+------+-------+\n"
+        "| a    | 1     |\n"
+        "+------+-------+\n"
+    )
+    assert format_table([]) == ""
+
+def test_wrap_words():
+    words = LONG.split()
+    for width in [1, 5, 12, 40, 200]:
+        lines = wrap_words(words, width)
+        assert all(len(line) <= width for line in lines)
+        assert "".join(lines).replace(" ", "") == "".join(words)
+    assert wrap_words(["abcdefgh", "ij"], 3) == ["abc", "def", "gh", "ij"]
+    assert wrap_words(["a", "bb", "c"], 4) == ["a bb", "c"]
+    assert wrap_words([], 10) == [""]
+
+def test_distribute_width():
+    assert distribute_width([1, 1, 1], 10, [1, 1, 1]) == [4, 3, 3]
+    assert distribute_width([5, 2], 20, [0, 3]) == [5, 15]
+    assert distribute_width([5, 2], 20, [0, 0]) == [5, 2]
+    for weights in ([3, 7, 11, 0], [1, 1, 1, 1], [100, 1, 1, 1]):
+        widths = distribute_width([2, 3, 4, 5], 50, weights)
+        assert sum(widths) == 50
+        assert all(width >= minimum for width, minimum in zip(widths, [2, 3, 4, 5]))
+
+def test_benchmark_tables(benchmark_pages):
+    for url, html in benchmark_pages.values():
+        for table in Soup(clean_html(html, url), features="lxml").find_all("table"):
+            text = format_table(create_table(table))
+            assert all(len(line) <= LINE_LIMIT for line in text.splitlines()), url
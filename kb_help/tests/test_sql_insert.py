@@ -0,0 +1,62 @@
+from src.generate_sql import generate_descriptions
+from src.sql_insert import DEFAULT_PACKET_SIZE, byte_length, escape_string, insert_statements, split_escaped, sql_value
+
+import pytest
+import re
+
+# A quoted value or an integer of a statement written by `insert_statements`
+VALUE_PATTERN = re.compile(r"'((?:[^'\\]|\\.)*)'|(-?\d+)")
+UNESCAPES = {"\\\\": "\\", "\\'": "'", "\\n": "\n", "\\r": "\r", "\\0": "\0", "\\Z": "\x1a"}
+
+def unescape(value: str) -> str:
+    return re.sub(r"\\.", lambda match: UNESCAPES[match[0]], value)
+
+def parse_rows(statement: str, columns: int) -> list[tuple]:
+    values = [
+        int(match[2]) if match[1] is None else unescape(match[1])
+        for match in VALUE_PATTERN.finditer(statement.split(" values ", 1)[1])
+    ]
+    return [tuple(values[index:index + columns]) for index in range(0, len(values), columns)]
+
+def test_escape_string():
+    assert escape_string("it's") == "it\\'s"
+    assert escape_string("C:\\path") == "C:\\\\path"
+    assert escape_string("a\nb\r\0\x1a") == "a\\nb\\r\\0\\Z"
+    assert escape_string('"ünï"') == '"ünï"'
+    assert sql_value("\\'") == "'\\\\\\''"
+    assert sql_value(12) == "12"
+
+@pytest.mark.parametrize("packet_size", [120, 300, 1000])
+def test_insert_statements_fit_packet_size(packet_size):
+    rows = [(index, f"naïve € row {index} 'quoted' \\ ünïcödé") for index in range(40)]
+    statements = insert_statements("help_keyword (help_keyword_id,name)", rows, packet_size)
+    assert all(byte_length(statement) <= packet_size for statement in statements)
+    assert [row for statement in statements for row in parse_rows(statement, 2)] == rows
+    if packet_size == 1000:
+        assert len(statements) < len(rows)
+
+def test_insert_statements_reject_oversized_row():
+    with pytest.raises(ValueError):
+        insert_statements("help_keyword", [(1, "x" * 100)], 50)
+
+@pytest.mark.parametrize("max_length", [1, 2, 7, 64])
+def test_split_escaped(max_length):
+    string = "first line 'quoted'\n" + "€ü\\" * 30 + "\n\n" + "x" * 100 + "\r\nlast\0\x1a"
+    parts = split_escaped(string, max_length)
+    assert "".join(parts) == string
+    assert all(byte_length(escape_string(part)) <= max(max_length, 3) for part in parts)
+    if max_length >= 3:
+        assert all(byte_length(escape_string(part)) <= max_length for part in parts)
+
+def test_split_escaped_keeps_short_strings_whole():
+    assert split_escaped("", 10) == [""]
+    assert split_escaped("short\nlines\n", 100) == ["short\nlines\n"]
+
+def test_default_packet_size_fits_bootstrap():
+    """mysqld --bootstrap reads at most about 20000 bytes per query and line"""
+    assert DEFAULT_PACKET_SIZE <= 15000
+    topics = [(index, 1, f"TOPIC {index}", "ü€ 'line'\n" * 4000 * index, "", f"https://mariadb.com/kb/en/{index}/") for index in range(3, 6)]
+    statements = generate_descriptions(topics, DEFAULT_PACKET_SIZE)
+    assert len(statements) > len(topics)
+    assert all(byte_length(statement) <= DEFAULT_PACKET_SIZE for statement in statements)
+    assert all(byte_length(line) <= DEFAULT_PACKET_SIZE for statement in statements for line in statement.splitlines())
@@ -0,0 +1,68 @@
+from src.generate_sql import HELP_TABLE_COLUMNS, table_columns
+from src.sql_insert import insert_statements
+from src.tsv_export import LOADER_FILENAME, escape_field, tsv_line, write_tables
+from test_sql_insert import parse_rows
+
+import re
+import sqlite3
+
+TRICKY = ["tab\there", "back\\slash\\", "quote ' and \"", "nul\0", "sub\x1a", "lines\nand\r\n", "ünïcödé €", "\\N", ""]
+TABLES = {
+    "help_category": [(1, "Data Types", 0, ""), (2, "Tab\tCategory", 1, "")],
+    "help_topic": [
+        (index, 1, f"TOPIC {index}", text, "", f"https://mariadb.com/kb/en/{index}/")
+        for index, text in enumerate(TRICKY, 1)
+    ],
+    "help_keyword": [(index, text) for index, text in enumerate(TRICKY, 1)],
+    "help_relation": [(1, 2), (2, 1)],
+}
+LOAD_PATTERN = re.compile(r"load data local infile '([^']+)' into table (\w+) .*\n.*\n\(([^)]*)\);")
+TSV_UNESCAPES = {"\\\\": "\\", "\\t": "\t", "\\n": "\n", "\\r": "\r", "\\0": "\0", "\\Z": "\x1a"}
+
+def create_database() -> sqlite3.Connection:
+    """Stand-in for the server, id columns are integers so loaded text is compared as numbers"""
+    database = sqlite3.connect(":memory:")
+    for table, columns in HELP_TABLE_COLUMNS.items():
+        definitions = [f"{column} {'INTEGER' if column.endswith('_id') else 'TEXT'}" for column in columns.split(",")]
+        database.execute(f"create table {table} ({', '.join(definitions)})")
+    return database
+
+def unescape_field(field: str) -> str:
+    return re.sub(r"\\.", lambda match: TSV_UNESCAPES[match[0]], field)
+
+def load_tsv(database: sqlite3.Connection, directory):
+    """Runs the loader's LOAD DATA statements, with the default field and line handling"""
+    loader = (directory / LOADER_FILENAME).read_text(encoding="utf-8")
+    for filename, table, columns in LOAD_PATTERN.findall(loader):
+        content = (directory / filename).read_bytes().decode("utf-8")
+        for line in content.split("\n")[:-1]:
+            fields = [unescape_field(field) for field in line.split("\t")]
+            database.execute(f"insert into {table} ({columns}) values ({','.join('?' * len(fields))})", fields)
+
+def load_sql(database: sqlite3.Connection):
+    for table, rows in TABLES.items():
+        columns = len(HELP_TABLE_COLUMNS[table].split(","))
+        for statement in insert_statements(table_columns(table), rows, 300):
+            for row in parse_rows(statement, columns):
+                database.execute(f"insert into {table} values ({','.join('?' * columns)})", row)
+
+def test_escape_field():
+    assert escape_field(12) == "12"
+    assert escape_field("a\tb") == "a\\tb"
+    assert escape_field("C:\\path") == "C:\\\\path"
+    assert escape_field("\0\x1a\n\r") == "\\0\\Z\\n\\r"
+    assert escape_field("it's") == "it's"
+    assert tsv_line((1, "a\tb")) == "1\ta\\tb\n"
+
+def test_tsv_matches_inserts(tmp_path):
+    loader_path = write_tables(tmp_path, TABLES, HELP_TABLE_COLUMNS, "delete from help_topic;")
+    assert loader_path == tmp_path / LOADER_FILENAME
+    assert len(LOAD_PATTERN.findall(loader_path.read_text(encoding="utf-8"))) == len(TABLES)
+    from_tsv = create_database()
+    load_tsv(from_tsv, tmp_path)
+    from_sql = create_database()
+    load_sql(from_sql)
+    for table in TABLES:
+        query = f"select * from {table} order by 1, 2"
+        assert from_tsv.execute(query).fetchall() == from_sql.execute(query).fetchall()
+        assert len(from_tsv.execute(query).fetchall()) == len(TABLES[table])
@@ -0,0 +1,60 @@
+"""Micro-benchmarks of the per-page hot paths, run against the checked in archive
+
+Usage: python benchmark.py [filters...] [--rounds N] [--save] [--baseline PATH]
+"""
+import bootstrap
+
+from kb_common.benchmark import BENCHMARK_PAGES, Case, run_benchmarks
+from setup.config import TocConfig, TocTypeConfig
+from setup.kb_urls import CsvItem, read_csv
+from setup.paths import read_source, url_locations
+from pdf.edit_html.contents import create_contents
+from pdf.edit_html.merge_html import absolute_links, internal_link_ids, replace_internal_links
+from pdf.edit_html.parsers import PAGE_PARSERS
+from pdf.generate_pdf import default_outline
+
+CSV_FILEPATH = "../kb_urls.csv"
+BASELINE_PATH = "benchmark_baseline.json"
+TOC_CONFIG = TocConfig(
+    chapter=TocTypeConfig(font_size="18px", padding_left="3em", margin="1em"),
+    main=TocTypeConfig(font_size="12px", padding_left="1em", margin="0.5em"),
+)
+
+
+def page_rows() -> dict[str, CsvItem]:
+    index = url_locations()
+    rows = {}
+    for name, url in BENCHMARK_PAGES.items():
+        location = index.get(url)
+        assert location is not None, url
+        rows[name] = CsvItem.from_archive(url, location, depth_str="1.2.3")
+    return rows
+
+def create_cases() -> list[Case]:
+    rows = page_rows()
+    htmls = {name: read_source(row.path).decode("utf-8") for name, row in rows.items()}
+    kburls = read_csv(CSV_FILEPATH, -1)
+    link_ids = internal_link_ids(kburls)
+    outline = default_outline(kburls)
+    for row, item in zip(kburls, outline):
+        item.header = f"{row.depth_str} {row.header}"
+
+    cases = []
+    for parser, process_html_page in PAGE_PARSERS.items():
+        for name, row in rows.items():
+            cases.append(Case(
+                f"process_html_page[{parser}:{name}]",
+                lambda process_html_page=process_html_page, html=htmls[name], row=row: process_html_page(html, row)
+            ))
+    for name, row in rows.items():
+        page = absolute_links(PAGE_PARSERS["soup"](htmls[name], row)[0])
+        cases.append(Case(
+            f"internalise_links[{name}]",
+            lambda page=page: replace_internal_links(page, link_ids)
+        ))
+    cases.append(Case("internal_link_ids[kb_urls.csv]", lambda: internal_link_ids(kburls)))
+    cases.append(Case("create_contents[kb_urls.csv]", lambda: create_contents(outline, TOC_CONFIG)))
+    return cases
+
+if __name__ == "__main__":
+    run_benchmarks(create_cases(), BASELINE_PATH)
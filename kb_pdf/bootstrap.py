@@ -0,0 +1,9 @@
+"""Puts the repository root on sys.path, so the tool's scripts and tests can import the shared
+'kb_common' package. Imported first by every entry point of the tool.
+"""
+from pathlib import Path
+import sys
+
+REPO_ROOT = str(Path(__file__).resolve().parent.parent)
+if REPO_ROOT not in sys.path:
+    sys.path.append(REPO_ROOT)
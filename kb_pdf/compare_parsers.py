@@ -0,0 +1,74 @@
+"""Runs every page parser over the whole archive and diffs their output against 'soup'
+
+Usage: python compare_parsers.py [--parsers lxml] [--limit N]
+Unified diffs are written to parser_diffs/<parser>/, one file per differing page.
+"""
+import argparse
+import difflib
+import time
+from pathlib import Path
+import bootstrap
+
+from setup.config import DEFAULT_PARSER, PARSERS
+from setup.kb_urls import CsvItem
+from setup.logger import log
+from setup.paths import archive_pages, read_source, url_locations
+from pdf.edit_html.parsers import PAGE_PARSERS
+
+DIFF_PATH = Path("parser_diffs")
+
+def read_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser()
+    others = [name for name in PARSERS if name != DEFAULT_PARSER]
+    parser.add_argument("--parsers", nargs="+", choices=others, default=others)
+    parser.add_argument("--limit", type=int, default=None)
+    return parser.parse_args()
+
+def archive_rows(limit: int | None) -> list[CsvItem]:
+    """A row for every page of the archive, using one of the urls pointing to it"""
+    rows = {}
+    for url, location in url_locations().items():
+        if location not in rows and archive_pages().state(location) is not None:
+            rows[location] = CsvItem.from_archive(url, location)
+    return list(rows.values())[:limit]
+
+def split_tags(html: str) -> list[str]:
+    """Puts every tag on its own line, pages are mostly written on a few long lines"""
+    return html.replace(">", ">\n").splitlines(keepends=True)
+
+def main():
+    args = read_args()
+    rows = archive_rows(args.limit)
+    timings = dict.fromkeys([DEFAULT_PARSER, *args.parsers], 0.0)
+    differing = dict.fromkeys(args.parsers, 0)
+    for parser in args.parsers:
+        (DIFF_PATH / parser).mkdir(parents=True, exist_ok=True)
+
+    for row in rows:
+        html = read_source(row.path).decode("utf-8")
+        outputs = {}
+        for parser in timings:
+            start = time.perf_counter()
+            outputs[parser] = PAGE_PARSERS[parser](html, row)
+            timings[parser] += time.perf_counter() - start
+        for parser in args.parsers:
+            if outputs[parser] == outputs[DEFAULT_PARSER]:
+                continue
+            differing[parser] += 1
+            (expected, expected_header), (actual, actual_header) = outputs[DEFAULT_PARSER], outputs[parser]
+            diff = difflib.unified_diff(
+                [expected_header + "\n", *split_tags(expected)], [actual_header + "\n", *split_tags(actual)],
+                fromfile=f"{DEFAULT_PARSER}:{row.url}", tofile=f"{parser}:{row.url}"
+            )
+            diff_file = DIFF_PATH / parser / (row.id_path.replace("/", "_") + ".diff")
+            diff_file.write_text("".join(diff), encoding="utf-8")
+
+    log.info(f"Compared {len(rows)} pages")
+    for parser, taken in timings.items():
+        summary = f"{parser}: {taken:.2f}s"
+        if parser in differing:
+            summary += f", {differing[parser]} differing pages, diffs in {DIFF_PATH / parser}"
+        log.info(summary)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import bootstrap
+from setup.kb_urls import CsvItem
+
+from pathlib import Path
+
+
+def make_row(
+    id_path: str = "en/page.html", url: str | None = None, slugs: tuple[str, ...] = (), include: int = 1,
+    depth: int = 1, depth_str: str = "", path: Path | None = None
+) -> CsvItem:
+    """A csv row for the tests, its url and path follow from `id_path` unless given"""
+    return CsvItem(
+        header="",
+        url=url if url is not None else f"https://mariadb.com/kb/{id_path.removesuffix('.html')}/",
+        path=path if path is not None else Path(id_path),
+        id_path=id_path,
+        slugs=slugs,
+        include=include,
+        depth=depth,
+        depth_str=depth_str,
+    )
@@ -1,24 +1,57 @@
-from setup.config import read_config
-from setup.kb_urls import read_csv
+import bootstrap
+
+from kb_common.profiling import profiled, profiler
+from setup.config import read_config, Config
+from setup.kb_urls import read_csv, CsvItem
 from setup.languages import read_languages
-from setup.logger import log
+from setup.logger import log, language_log
 
 from pdf.generate_pdf import generate_full_pdf
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 CSV_FILEPATH = "../kb_urls.csv"
 CONFIG_FILEPATH = "config.toml"
+LOG_FILENAME = "build.log"
 
 def main():
     log.info("Started")
     config = read_config(CONFIG_FILEPATH)
-    csv = read_csv(CSV_FILEPATH, config.num_rows)
-    language_csvs = read_languages(csv, config)
-    for lang, lang_csv in language_csvs.items():
-        log.info(f"Generating {lang}({len(lang_csv)})")
-        generate_full_pdf(lang_csv, Path(f"output_{lang}"), config)
-    Path(config.wkhtml_settings["dump-outline"]).unlink(missing_ok=True)
+    with profiled(config.profile_path, config.cprofile):
+        with profiler.stage("read_csv"):
+            csv = read_csv(CSV_FILEPATH, config.num_rows)
+        with profiler.stage("read_languages"):
+            language_csvs = read_languages(csv, config)
+        build_languages(language_csvs, config)
+    if config.profile_path is not None:
+        log.info(f"Wrote profile to {config.profile_path}")
     log.info("Finished")
 
+def build_languages(language_csvs: dict[str, list[CsvItem]], config: Config):
+    if config.lang_jobs <= 1:
+        # Built on the main thread, where --cprofile can see them
+        for lang, lang_csv in language_csvs.items():
+            generate_language(lang, lang_csv, config)
+        return
+    # Threads are enough, the heavy work happens in wkhtmltopdf and the --jobs process pool
+    with ThreadPoolExecutor(max_workers=config.lang_jobs) as executor:
+        builds = [
+            executor.submit(generate_language, lang, lang_csv, config)
+            for lang, lang_csv in language_csvs.items()
+        ]
+        for build in builds:
+            build.result()
+
+def generate_language(lang: str, lang_csv: list[CsvItem], config: Config):
+    dir_path = Path(f"output_{lang}")
+    dir_path.mkdir(exist_ok=True)
+    # Each language dumps its outline into its own directory, so concurrent builds don't collide
+    outline_path = dir_path / config.wkhtml_settings["dump-outline"]
+    config = config._replace(wkhtml_settings=config.wkhtml_settings | {"dump-outline": str(outline_path)})
+    with language_log(lang, dir_path / LOG_FILENAME), profiler.stage(f"build[{lang}]"):
+        log.info(f"Generating {lang}({len(lang_csv)})")
+        generate_full_pdf(lang_csv, dir_path, config)
+        outline_path.unlink(missing_ok=True)
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
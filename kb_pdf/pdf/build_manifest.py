@@ -0,0 +1,156 @@
+"""Manifest of the inputs and outputs of the last build in an output directory
+
+Every build compares its inputs with the manifest left by the previous one. Source pages whose
+size and modification time are unchanged keep their recorded digest instead of being read again,
+and a build whose inputs all match the manifest reuses the previous output as is. Processed pages
+themselves are reused through the page cache, so only pages whose source or row changed are processed.
+
+The preface is an input as written, with its `[generated_time]` placeholder. A reused output keeps
+the generated date of the build which wrote it, which the manifest records, instead of rebuilding
+whenever the date changes. Build with --nocache to get the current date.
+"""
+from setup.config import Config
+from setup.kb_urls import CsvItem
+from setup.paths import read_source, source_state
+from .edit_html.merge_html import PREFACE_PATH, generated_date
+from .edit_html.page_cache import code_version, source_digest
+from .edit_html.read_html import is_article
+
+from kb_common import lxml_soup
+
+from collections import Counter
+from pathlib import Path
+from typing import Any, NamedTuple
+import hashlib
+import json
+
+MANIFEST_FILENAME = "build_manifest.json"
+# Bump when the manifest layout changes
+MANIFEST_VERSION = 2
+
+class SourceState(NamedTuple):
+    size: int
+    mtime_ns: int
+    digest: str
+
+class BuildManifest(NamedTuple):
+    # Digest of every config table, the preface template and the code, by name
+    inputs: dict[str, str]
+    # Digest of every csv row besides its numbering, in order
+    rows: list[str]
+    # Source pages by path
+    sources: dict[str, SourceState]
+    # (size, mtime_ns) of the files written by the build, by path
+    outputs: dict[str, tuple[int, int]]
+    # Date written into the preface of the outputs
+    generated: str = ""
+
+    @classmethod
+    def load(cls, path: Path) -> "BuildManifest | None":
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if data.get("version") != MANIFEST_VERSION:
+            return None
+        return cls(
+            inputs=data["inputs"],
+            rows=data["rows"],
+            sources={source: SourceState(*state) for source, state in data["sources"].items()},
+            outputs={output: tuple(state) for output, state in data["outputs"].items()},
+            generated=data["generated"],
+        )
+
+    def save(self, path: Path):
+        data = {"version": MANIFEST_VERSION} | self._asdict()
+        path.write_text(json.dumps(data), encoding="utf-8")
+
+    def source_digests(self) -> dict[str, str]:
+        return {source: state.digest for source, state in self.sources.items()}
+
+    def with_outputs(self, paths: list[Path]) -> "BuildManifest":
+        return self._replace(outputs={str(path): file_state(path) for path in paths})
+
+def create_manifest(kburls: list[CsvItem], config: Config, previous: BuildManifest | None) -> BuildManifest:
+    return BuildManifest(
+        inputs=input_digests(config) | {"numbering": json_digest([row.depth_str for row in kburls])},
+        rows=[row_digest(row) for row in kburls],
+        sources=read_sources(kburls, {} if previous is None else previous.sources),
+        outputs={},
+        generated=generated_date(),
+    )
+
+def input_digests(config: Config) -> dict[str, str]:
+    code = hashlib.sha256(code_version(config.parser).encode())
+    for path in sorted(Path(__file__).parent.rglob("*.py")):
+        code.update(path.read_bytes())
+    code.update(Path(lxml_soup.__file__).read_bytes())
+    return {
+        "code": code.hexdigest(),
+        "preface": source_digest(Path(PREFACE_PATH).read_bytes()),
+        "toc": json_digest(config.toc_config),
+        "wkhtmltopdf": json_digest(config.wkhtml_settings),
+        "output": json_digest([config.pdf, config.repeat_outline, config.shard_jobs > 0]),
+    }
+
+def row_digest(row: CsvItem) -> str:
+    return json_digest([row.header, row.url, row.id_path, row.slugs, row.include, row.depth])
+
+def json_digest(value: Any) -> str:
+    return source_digest(json.dumps(value, sort_keys=True).encode("utf-8"))
+
+def read_sources(kburls: list[CsvItem], previous: dict[str, SourceState]) -> dict[str, SourceState]:
+    """Only sources whose size or modification time changed are read and hashed"""
+    sources = {}
+    for row in kburls:
+        source = str(row.path)
+        if not is_article(row) or source in sources:
+            continue
+        page_state = source_state(row.path)
+        if page_state is None:
+            continue
+        state = previous.get(source)
+        if state is None or (state.size, state.mtime_ns) != page_state:
+            state = SourceState(*page_state, source_digest(read_source(row.path)))
+        sources[source] = state
+    return sources
+
+def file_state(path: Path) -> tuple[int, int]:
+    stat = path.stat()
+    return stat.st_size, stat.st_mtime_ns
+
+def is_up_to_date(previous: BuildManifest | None, current: BuildManifest, output_paths: list[Path]) -> bool:
+    """Whether the previous build had the same inputs, and its output is still untouched"""
+    if previous is None:
+        return False
+    if previous.inputs != current.inputs or previous.rows != current.rows:
+        return False
+    if previous.source_digests() != current.source_digests():
+        return False
+    outputs = {str(path) for path in output_paths}
+    if set(previous.outputs) != outputs:
+        return False
+    return all(
+        path.is_file() and file_state(path) == tuple(previous.outputs[str(path)])
+        for path in output_paths
+    )
+
+def describe_changes(previous: BuildManifest | None, current: BuildManifest) -> str:
+    if previous is None:
+        return "No previous build manifest, building everything"
+    changed_inputs = [name for name, digest in current.inputs.items() if previous.inputs.get(name) != digest]
+    previous_rows = Counter(previous.rows)
+    current_rows = Counter(current.rows)
+    new_rows = sum((current_rows - previous_rows).values())
+    removed_rows = sum((previous_rows - current_rows).values())
+    changed_sources = sum(
+        1 for source, state in current.sources.items()
+        if source not in previous.sources or previous.sources[source].digest != state.digest
+    )
+    description = (
+        f"Since the last build: {new_rows} rows added or edited, {removed_rows} removed,"
+        f" {changed_sources} source pages changed"
+    )
+    if changed_inputs:
+        description += f", changed {', '.join(changed_inputs)}"
+    return description
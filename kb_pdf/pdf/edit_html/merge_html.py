@@ -1,48 +1,134 @@
+from kb_common.profiling import profiler
 from setup.kb_urls import CsvItem
 from setup.paths import BASE_KB
 from setup.config import Config
 from setup.logger import log
 from pathlib import Path
 from datetime import datetime
+from typing import Callable, Iterable, TextIO
 
 from .contents import create_contents, TocItem
+import io
 import re
 
 PREFACE_PATH = "preface.html"
 PAGE_BREAK = '<div style = "page-break-after:always;"></div>\n'
 
-def merge_html(pages: list[str], kburls: list[CsvItem], outline: list[TocItem], config: Config) -> str:
+def merge_html(pages: Iterable[str], kburls: list[CsvItem], outline: list[TocItem], config: Config) -> str:
+    outfile = io.StringIO()
+    write_html(outfile, pages, kburls, outline, config)
+    return outfile.getvalue()
+
+def write_html(
+    outfile: TextIO, pages: Iterable[str], kburls: list[CsvItem],
+    outline: list[TocItem], config: Config
+):
+    """Writes the merged document one page at a time, links are rewritten per page rather than on the whole document"""
     log.info("Merging HTML")
-    html = "\n".join(pages)
-    html = create_contents(outline, config.toc_config) + html
-    html = absolute_links(html)
-    html = internalise_links(html, kburls)
-    preface = read_preface()
-    html = START_BOILERPLATE + preface + html + PAGE_BREAK + END_BOILERPLATE
-    return html
+    with profiler.stage("merge_html"):
+        link_ids = internal_link_ids(kburls)
+        with profiler.stage("contents"):
+            contents = create_contents(outline, config.toc_config)
+        rewrite_links = lambda html: replace_internal_links(absolute_links(html), link_ids)
+        write_document(outfile, read_preface(), contents, pages, rewrite_links)
+
+def write_document(
+    outfile: TextIO, preface: str, contents: str, pages: Iterable[str],
+    rewrite_links: Callable[[str], str]
+):
+    """Writes the boilerplate around the preface, contents and pages, rewriting the links of all but the preface"""
+    outfile.write(START_BOILERPLATE + preface)
+    outfile.write(rewrite_links(contents))
+    for index, page in enumerate(pages):
+        if index > 0:
+            outfile.write("\n")
+        outfile.write(rewrite_links(page))
+    outfile.write(PAGE_BREAK + END_BOILERPLATE)
 
 def absolute_links(html: str) -> str:
     return html.replace('="/kb/', f'="{BASE_KB}')
 
+# Matches the start of a link, the url is read up to the next quote
+HREF_PATTERN = re.compile(r'href ?= ?"')
+# Duplicate hashes for previously external links carrying internal links
+DOUBLE_HASH_PATTERN = re.compile(r'(#[\w-]+)#([\w-]+)')
+
 def internalise_links(html: str, kburls: list[CsvItem]) -> str:
-    urls_completed = set()
+    return replace_internal_links(html, internal_link_ids(kburls))
 
+def replace_internal_links(html: str, link_ids: dict[str, tuple[int, str]]) -> str:
+    """Replaces links to included pages with links to their id, in a single pass over the html"""
+    chunks: list[str] = []
+    position = 0
+    for match in HREF_PATTERN.finditer(html):
+        start = match.end()
+        if start <= position:
+            continue
+        end = html.find('"', start)
+        if end == -1:
+            end = len(html)
+        link = html[start:end]
+        # urls are only replaced after an exact 'href="', but duplicate hashes are removed after any
+        if match.group() == 'href="':
+            new_link = internalise_link(link, end < len(html), link_ids)
+        else:
+            new_link = link
+        new_link = remove_double_hash(new_link)
+        if new_link == link:
+            continue
+        # only the start of the link is ever rewritten, so keep the suffix they share
+        shared = common_suffix_length(link, new_link)
+        chunks.append(html[position:start])
+        chunks.append(new_link[:len(new_link)-shared])
+        position = end - shared
+    chunks.append(html[position:])
+    return "".join(chunks)
+
+def internal_link_ids(kburls: list[CsvItem]) -> dict[str, tuple[int, str]]:
+    """Maps every url and slug of an included page to (priority, id_path), the first row for a url wins"""
+    link_ids: dict[str, tuple[int, str]] = {}
     for row in kburls:
         if row.include == 1:
-            for url in row.slugs + [row.url]:
-                urls_completed.add(url)
-                html = html.replace(f'href="{url}#', f'href="#{row.id_path}')
-                html = html.replace(f'href="{url}"', f'href="#{row.id_path}"')
+            for url in (*row.slugs, row.url):
+                link_ids.setdefault(url, (len(link_ids), row.id_path))
+    return link_ids
+
+def internalise_link(link: str, closed: bool, link_ids: dict[str, tuple[int, str]]) -> str:
+    # For a url, a link with an anchor ('url#') is replaced before an exact link ('url"')
+    best: tuple[int, str, int] | None = None
+    if closed and link in link_ids:
+        priority, id_path = link_ids[link]
+        best = (2*priority + 1, id_path, len(link))
+    hash_idx = link.find("#")
+    while hash_idx != -1:
+        found = link_ids.get(link[:hash_idx])
+        if found is not None and (best is None or 2*found[0] < best[0]):
+            best = (2*found[0], found[1], hash_idx + 1)
+        hash_idx = link.find("#", hash_idx + 1)
+    if best is None:
+        return link
+    _, id_path, replaced = best
+    return "#" + id_path + link[replaced:]
 
-    #remove duplicates hashes for previously external links carrying internal links
-    pattern = r'(href ?= ?")(#[\w-]+)#([\w-]+)'
-    html = re.sub(pattern, r"\1\2\3", html)
+def remove_double_hash(link: str) -> str:
+    match = DOUBLE_HASH_PATTERN.match(link)
+    if match is None:
+        return link
+    return match[1] + match[2] + link[match.end():]
 
-    return html
+def common_suffix_length(left: str, right: str) -> int:
+    length = 0
+    max_length = min(len(left), len(right))
+    while length < max_length and left[-1-length] == right[-1-length]:
+        length += 1
+    return length
 
 def read_preface() -> str:
-    formatted_date = datetime.today().date()
-    return Path(PREFACE_PATH).read_text(encoding="utf-8").replace("[generated_time]", str(formatted_date))
+    return Path(PREFACE_PATH).read_text(encoding="utf-8").replace("[generated_time]", generated_date())
+
+def generated_date() -> str:
+    """Date the preface says the document was generated on"""
+    return str(datetime.today().date())
 
 # region: -- Boilerplate
 END_BOILERPLATE = "\n\n</body>\n</html>"
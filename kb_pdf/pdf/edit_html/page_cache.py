@@ -0,0 +1,114 @@
+from setup.config import CacheConfig, DEFAULT_PARSER
+from setup.kb_urls import CsvItem
+from setup.logger import log
+
+from kb_common import lxml_soup
+
+from pathlib import Path
+import bs4
+import dataclasses
+import hashlib
+import json
+import lxml.etree
+import os
+import tempfile
+import time
+
+# Bump when the cache entry layout changes
+CACHE_VERSION = 2
+# Stands in for the row's depth_str in cached pages, so renumbering rows keeps their pages cached
+DEPTH_PLACEHOLDER = "\ue000"
+
+
+def code_version(parser: str = DEFAULT_PARSER) -> str:
+    """Hash of everything besides the page itself which can change the processed output"""
+    versions = f"{CACHE_VERSION} {parser} {bs4.__version__} {lxml.etree.__version__}"
+    digest = hashlib.sha256(versions.encode())
+    # the whole package, so modules the parsers share such as the selectors are covered too
+    for path in sorted(Path(__file__).parent.glob("*.py")):
+        digest.update(path.read_bytes())
+    digest.update(Path(lxml_soup.__file__).read_bytes())
+    return digest.hexdigest()
+
+def source_digest(source: bytes) -> str:
+    return hashlib.sha256(source).hexdigest()
+
+def unnumbered(row: CsvItem) -> CsvItem:
+    """Copy of the row whose processed page has a placeholder instead of its depth_str"""
+    return dataclasses.replace(row, depth_str=DEPTH_PLACEHOLDER)
+
+def numbered(page: tuple[str, str], row: CsvItem) -> tuple[str, str]:
+    """Puts the row's depth_str back into a page processed from `unnumbered(row)`"""
+    html, header = page
+    return html.replace(DEPTH_PLACEHOLDER, row.depth_str), header.replace(DEPTH_PLACEHOLDER, row.depth_str)
+
+class PageCache:
+    """On-disk cache of `process_html_page` output, keyed by the source page and the row fields it uses"""
+    path: Path
+    max_size: int
+    max_age: float
+    hits: int
+    misses: int
+
+    def __init__(self, config: CacheConfig, parser: str = DEFAULT_PARSER):
+        self.path = config.path
+        self.max_size = config.max_size
+        self.max_age = config.max_age
+        self.version = code_version(parser)
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, source: bytes, row: CsvItem) -> str:
+        return self.digest_key(source_digest(source), row)
+
+    def digest_key(self, source_digest: str, row: CsvItem) -> str:
+        """Key of a page by the digest of its source, the row's depth_str is left out, see `unnumbered`"""
+        digest = hashlib.sha256(self.version.encode())
+        for field in (row.id_path, row.url, source_digest):
+            digest.update(b"\0" + field.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> tuple[str, str] | None:
+        entry_path = self._entry_path(key)
+        try:
+            entry = json.loads(entry_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        entry_path.touch() # marks the entry as recently used
+        self.hits += 1
+        return entry["html"], entry["header"]
+
+    def put(self, key: str, page: tuple[str, str]):
+        html, header = page
+        entry_path = self._entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+        # a temporary file of its own, languages built on threads of one process may put the same page
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=entry_path.parent, prefix=entry_path.stem, suffix=".tmp", delete=False
+        ) as outfile:
+            outfile.write(json.dumps({"html": html, "header": header}))
+        os.replace(outfile.name, entry_path)
+
+    def prune(self):
+        """Removes entries older than `max_age`, then the least recently used until under `max_size`"""
+        entries = []
+        for entry_path in self.path.glob("*/*.json"):
+            stat = entry_path.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry_path))
+        entries.sort()
+
+        cutoff = time.time() - self.max_age
+        total_size = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, entry_path in entries:
+            if mtime >= cutoff and total_size <= self.max_size:
+                break
+            entry_path.unlink(missing_ok=True)
+            total_size -= size
+            removed += 1
+        if removed:
+            log.info(f"Evicted {removed} cached pages")
+
+    def _entry_path(self, key: str) -> Path:
+        return self.path / key[:2] / f"{key}.json"
@@ -0,0 +1,18 @@
+"""Selectable `process_html_page` backends
+
+"lxml" applies the same edits as "soup" and gives the same html for well formed pages. It differs
+on pages with markup libxml2 repairs differently than BeautifulSoup, such as unclosed <li> tags,
+valueless boolean attributes and duplicate attributes: 17 of the first 400 pages of the archive,
+mostly release notes. "soup" is the default for that reason. Run `python compare_parsers.py` to
+diff the backends over the archive.
+"""
+from setup.kb_urls import CsvItem
+from . import process_html_page, process_html_page_lxml
+
+from typing import Callable
+
+# Keys are the parser names accepted by `setup.config`
+PAGE_PARSERS: dict[str, Callable[[str, CsvItem], tuple[str, str]]] = {
+    "soup": process_html_page.process_html_page,
+    "lxml": process_html_page_lxml.process_html_page,
+}
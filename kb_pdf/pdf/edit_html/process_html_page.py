@@ -1,41 +1,55 @@
 from setup.logger import log
 from setup.kb_urls import CsvItem
+from .selectors import Selector, parse_selectors
 
 from bs4 import BeautifulSoup as Soup
-from bs4 import Tag
+from bs4 import NavigableString, Tag
+from dataclasses import dataclass
+from typing import Callable, NamedTuple
 
 PAGE_BREAK = '<div style = "page-break-after:always;"></div>\n'
-
+UNWANTED_SELECTORS = [
+    "div#content_disclaimer",
+    "div#comments",
+    "div#subscribe",
+    "div.simple_section_nav",
+    "div.node-breadcrumb",
+]
+BORDER_RADIUS_SELECTORS = [
+    "div.redbox",
+    "div.greenbox",
+    "div.graybox",
+    "div.yellowbox",
+    "div.bluebox",
+    ".btn"
+    "pre.fixed",
+    "div.table_of_contents"
+]
+# Returned by a rule's action when it removed the tag, no later rules are applied to it
+REMOVED = True
+
+
+@dataclass(slots=True)
+class PageState:
+    row: CsvItem
+    header: str | None = None
+    found_section: bool = False
+    # Numbering headers stops at the first header without text
+    number_headers: bool = True
+
+class Rule(NamedTuple):
+    selectors: list[Selector]
+    action: Callable[[Tag, PageState], bool | None]
 
 def process_html_page(html: str, row: CsvItem) -> tuple[str, str]:
     section = extract_section(html, row.url)
     if not section: return "No Section", ""
     soup = Soup(section, features="html.parser")
-    header = update_h1(soup, row)
-    remove_section_id(soup)
-    remove_unwanted(soup)
-    remove_button_overlay(soup)
-    flatten_subcontents(soup)
-    remove_border_radius(soup)
-    raise_from_mariadb(soup)
-    remove_numbered_headers(soup, row)
-    html = str(soup)
-    html = externalise_ids(html, row)
-    return (html, header)
-
-def update_h1(soup: Soup, row: CsvItem) -> str:
-    h1 = soup.select_one("h1")
-    if h1 is not None:
-        h1.attrs["id"] = "" # will be replaced by 'externalise_ids'
-        assert isinstance(h1.string, str)
-        h1.string = row.depth_str + ' ' + h1.string.strip()
-        return h1.string #type: ignore
-    return "Could not find h1"
-
-def remove_section_id(soup: Soup):
-    tag = soup.select_one("section")
-    assert tag is not None
-    tag.attrs.pop("id", None)
+    state = PageState(row)
+    visit_children(soup, state)
+    assert state.found_section
+    header = state.header if state.header is not None else "Could not find h1"
+    return (str(soup), header)
 
 def extract_section(html: str, url: str) -> str:
     start_idx = html.find("<section")
@@ -45,80 +59,91 @@ def extract_section(html: str, url: str) -> str:
         return ""
     return html[start_idx:end_idx]
 
-
-
-def remove_unwanted(soup: Soup):
-    selectors = [
-        "div#content_disclaimer",
-        "div#comments",
-        "div#subscribe",
-        "div.simple_section_nav",
-        "div.node-breadcrumb",
-    ]
-
-    for item in selectors:
-        for tag in soup.select(item):
-            tag.decompose()
-
-    for tag in soup.find_all("h2", text="Comments"):
-        assert isinstance(tag, Tag)
-        tag.decompose()
-    
-
-    for tag in soup.select("h2#see-also,h3#see-also"):
-        for sibling in tag.find_next_siblings():
-            assert isinstance(sibling, Tag)
-            sibling.decompose()
-        tag.decompose()
-
-
-    # Remove links to see-also
-    for tag in soup.find_all("a", attrs={"href": "#see-also"}):
-        assert isinstance(tag, Tag)
-        if isinstance(tag.parent, Tag) and tag.parent.name == "li":
-            tag.parent.decompose()
-
-def remove_button_overlay(soup: Soup):
-    for button in soup.select(".btn.disabled"):
-        assert isinstance(button["class"], list) # should contain "btn" and "disabled"
-        button["class"].remove("disabled") # type: ignore 
-
-def externalise_ids(html: str, row: CsvItem) -> str:
-    html = html.replace('id="', 'id="' + str(row.id_path))
-    html = html.replace('href="#', f'href="#{row.id_path}')
-    return html
-
-def flatten_subcontents(soup: Soup):
-    for tag in soup.select("div.table_of_contents"):
-        tag["class"] = [# type: ignore
-            "table_of_contents",
-            "standalone",
-            "well"
-        ]
-        add_style(tag, "padding-bottom:0;")
-
-def remove_border_radius(soup: Soup):
-    removals = [
-        "div.redbox",
-        "div.greenbox",
-        "div.graybox",
-        "div.yellowbox",
-        "div.bluebox",
-        ".btn"
-        "pre.fixed",
-        "div.table_of_contents"
+def visit_children(tag: Tag | Soup, state: PageState):
+    for child in list(tag.contents):
+        if child.parent is not tag:
+            continue # removed while visiting an earlier sibling
+        if isinstance(child, Tag):
+            visit(child, state)
+        elif isinstance(child, NavigableString):
+            externalise_string(child, state.row)
+
+def visit(tag: Tag, state: PageState):
+    """Applies every matching rule to the tag, then visits its children and applies the closing rules"""
+    for rule in RULES:
+        if matches(tag, rule.selectors) and rule.action(tag, state) is REMOVED:
+            return
+    externalise_attributes(tag, state.row)
+    visit_children(tag, state)
+    for rule in CLOSING_RULES:
+        if matches(tag, rule.selectors):
+            rule.action(tag, state)
+
+def matches(tag: Tag, selectors: list[Selector]) -> bool:
+    classes = tag.get("class") or []
+    if isinstance(classes, str):
+        classes = classes.split()
+    element_id = tag.get("id")
+    return any(selector.matches(tag.name, element_id, classes) for selector in selectors) # type: ignore
+
+def update_h1(h1: Tag, state: PageState):
+    if state.header is not None:
+        return # only the first h1
+    h1.attrs["id"] = "" # will be replaced by 'externalise_attributes'
+    assert isinstance(h1.string, str)
+    h1.string = state.row.depth_str + ' ' + h1.string.strip()
+    state.header = str(h1.string)
+
+def remove_section_id(section: Tag, state: PageState):
+    if not state.found_section:
+        state.found_section = True
+        section.attrs.pop("id", None)
+
+def remove(tag: Tag, state: PageState) -> bool:
+    if state.header is None:
+        # the first h1 gives the page's header, even when it is removed
+        h1 = tag if tag.name == "h1" else tag.find("h1")
+        if isinstance(h1, Tag):
+            update_h1(h1, state)
+    tag.decompose()
+    return REMOVED
+
+def remove_comments_header(tag: Tag, state: PageState) -> bool | None:
+    if tag.string == "Comments":
+        return remove(tag, state)
+
+def remove_see_also(tag: Tag, state: PageState) -> bool:
+    """Removes the 'See Also' header and everything after it"""
+    siblings = tag.find_next_siblings()
+    remove(tag, state)
+    for sibling in siblings:
+        assert isinstance(sibling, Tag)
+        remove(sibling, state)
+    return REMOVED
+
+def remove_see_also_link(li: Tag, state: PageState) -> bool | None:
+    for child in li.children:
+        if isinstance(child, Tag) and child.name == "a" and child.get("href") == "#see-also":
+            return remove(li, state)
+
+def remove_button_overlay(button: Tag, state: PageState):
+    assert isinstance(button["class"], list) # should contain "btn" and "disabled"
+    button["class"].remove("disabled") # type: ignore
+
+def flatten_subcontents(tag: Tag, state: PageState):
+    tag["class"] = [# type: ignore
+        "table_of_contents",
+        "standalone",
+        "well"
     ]
+    add_style(tag, "padding-bottom:0;")
 
-    for selector in removals:
-        for tag in soup.select(selector):
-            add_style(tag, "border-radius:0;")
-
+def remove_border_radius(tag: Tag, state: PageState):
+    add_style(tag, "border-radius:0;")
 
-def raise_from_mariadb(soup: Soup):
+def raise_from_mariadb(tag: Tag, state: PageState):
     """Increases padding for `mariadb starting with ...` to prevent text being sliced on page breaks"""
-    for tag in soup.select("div.mariadb"):
-        tag.attrs["style"] = "padding:1em;"
-
+    tag.attrs["style"] = "padding:1em;"
 
 def add_style(tag: Tag, style: str):
     if "style" not in tag.attrs:
@@ -128,10 +153,58 @@ def add_style(tag: Tag, style: str):
     else:
         tag["style"].append(style) # type: ignore
 
-
-def remove_numbered_headers(soup: Soup, row: CsvItem):
-    for header in soup.select("h2,h3,h4,h5,h6"):
-        if not header.text:
-            return
-        if header.text[0].isnumeric():
-            header.string = "- " + header.text
\ No newline at end of file
+def remove_numbered_headers(header: Tag, state: PageState):
+    if not state.number_headers:
+        return
+    if not header.text:
+        state.number_headers = False
+        return
+    if header.text[0].isnumeric():
+        header.string = "- " + header.text
+
+def externalise_attributes(tag: Tag, row: CsvItem):
+    """Prefixes ids and internal links with the page's id, as `id="` and `href="#` appear once written"""
+    for key, value in tag.attrs.items():
+        if value is None:
+            continue
+        text = " ".join(value) if isinstance(value, list) else value
+        if '"' in text and "'" not in text:
+            # written with single quotes, only the value itself can contain the patterns
+            new_text = externalise_text(text, row)
+        elif key.endswith("id"):
+            new_text = row.id_path + text
+        elif key.endswith("href") and text.startswith("#"):
+            new_text = "#" + row.id_path + text[1:]
+        else:
+            continue
+        if new_text != text:
+            tag.attrs[key] = new_text
+
+def externalise_string(string: NavigableString, row: CsvItem):
+    new_string = externalise_text(string, row)
+    if new_string != string:
+        string.replace_with(type(string)(new_string))
+
+def externalise_text(text: str, row: CsvItem) -> str:
+    text = text.replace('id="', 'id="' + row.id_path)
+    text = text.replace('href="#', f'href="#{row.id_path}')
+    return text
+
+# Applied in order to each tag before its children, an action returning `REMOVED` stops the rest
+RULES = [
+    Rule(parse_selectors("h1"), update_h1),
+    Rule(parse_selectors("section"), remove_section_id),
+    Rule(parse_selectors(",".join(UNWANTED_SELECTORS)), remove),
+    Rule(parse_selectors("h2"), remove_comments_header),
+    Rule(parse_selectors("h2#see-also,h3#see-also"), remove_see_also),
+    Rule(parse_selectors("li"), remove_see_also_link),
+    Rule(parse_selectors(".btn.disabled"), remove_button_overlay),
+    Rule(parse_selectors("div.table_of_contents"), flatten_subcontents),
+    # a rule per selector, a tag matching several of them gets the style once for each
+    *[Rule(parse_selectors(selector), remove_border_radius) for selector in BORDER_RADIUS_SELECTORS],
+    Rule(parse_selectors("div.mariadb"), raise_from_mariadb),
+]
+# Applied in order to each tag after its children, once their text is final
+CLOSING_RULES = [
+    Rule(parse_selectors("h2,h3,h4,h5,h6"), remove_numbered_headers),
+]
@@ -0,0 +1,127 @@
+"""`process_html_page` on an lxml tree, producing the same html as the BeautifulSoup version
+
+Every transform mirrors the rule of the same name in `process_html_page`, as a pass of its own.
+"""
+from setup.kb_urls import CsvItem
+from .process_html_page import BORDER_RADIUS_SELECTORS, UNWANTED_SELECTORS, extract_section
+from .selectors import parse_selectors
+
+from kb_common.lxml_soup import (
+    Element, collapse_source_whitespace, decode_contents, normalize_list_attributes,
+    set_string, tag_string, tag_text
+)
+
+from lxml import etree, html as lxml_html
+
+
+def process_html_page(html: str, row: CsvItem) -> tuple[str, str]:
+    section = extract_section(html, row.url)
+    if not section: return "No Section", ""
+    root = lxml_html.fragment_fromstring(collapse_source_whitespace(section), create_parent="div")
+    normalize_list_attributes(root)
+    header = update_h1(root, row)
+    remove_section_id(root)
+    remove_unwanted(root)
+    remove_button_overlay(root)
+    flatten_subcontents(root)
+    remove_border_radius(root)
+    raise_from_mariadb(root)
+    remove_numbered_headers(root, row)
+    html = decode_contents(root)
+    html = externalise_ids(html, row)
+    return (html, header)
+
+def update_h1(root: Element, row: CsvItem) -> str:
+    h1 = select_one(root, "h1")
+    if h1 is not None:
+        h1.set("id", "") # will be replaced by 'externalise_ids'
+        string = tag_string(h1)
+        assert isinstance(string, str)
+        set_string(h1, row.depth_str + ' ' + string.strip())
+        return h1.text # type: ignore
+    return "Could not find h1"
+
+def remove_section_id(root: Element):
+    tag = select_one(root, "section")
+    assert tag is not None
+    tag.attrib.pop("id", None)
+
+def remove_unwanted(root: Element):
+    for item in UNWANTED_SELECTORS:
+        for tag in select(root, item):
+            decompose(tag)
+
+    for tag in select(root, "h2"):
+        if tag_string(tag) == "Comments":
+            decompose(tag)
+
+    for tag in select(root, "h2#see-also,h3#see-also"):
+        for sibling in list(tag.itersiblings()):
+            if isinstance(sibling.tag, str):
+                decompose(sibling)
+        decompose(tag)
+
+    # Remove links to see-also
+    for tag in select(root, "a"):
+        parent = tag.getparent()
+        if tag.get("href") == "#see-also" and parent is not None and parent.tag == "li":
+            decompose(parent)
+
+def remove_button_overlay(root: Element):
+    for button in select(root, ".btn.disabled"):
+        classes = button.get("class", "").split()
+        classes.remove("disabled")
+        button.set("class", " ".join(classes))
+
+def flatten_subcontents(root: Element):
+    for tag in select(root, "div.table_of_contents"):
+        tag.set("class", "table_of_contents standalone well")
+        add_style(tag, "padding-bottom:0;")
+
+def remove_border_radius(root: Element):
+    for selector in BORDER_RADIUS_SELECTORS:
+        for tag in select(root, selector):
+            add_style(tag, "border-radius:0;")
+
+def raise_from_mariadb(root: Element):
+    """Increases padding for `mariadb starting with ...` to prevent text being sliced on page breaks"""
+    for tag in select(root, "div.mariadb"):
+        tag.set("style", "padding:1em;")
+
+def add_style(tag: Element, style: str):
+    if "style" not in tag.attrib:
+        tag.set("style", style)
+    else:
+        tag.set("style", tag.get("style", "") + " " + style)
+
+def remove_numbered_headers(root: Element, row: CsvItem):
+    for header in select(root, "h2,h3,h4,h5,h6"):
+        text = tag_text(header)
+        if not text:
+            return
+        if text[0].isnumeric():
+            set_string(header, "- " + text)
+
+def decompose(tag: Element):
+    """Removes the tag but keeps the text following it, tags inside an already removed tag are ignored"""
+    if tag.getparent() is not None:
+        tag.drop_tree()
+
+def externalise_ids(html: str, row: CsvItem) -> str:
+    html = html.replace('id="', 'id="' + str(row.id_path))
+    html = html.replace('href="#', f'href="#{row.id_path}')
+    return html
+
+def select(root: Element, selectors: str) -> list[Element]:
+    """Every element below `root` matching any of the comma separated selectors, in document order"""
+    parsed = parse_selectors(selectors)
+    return [
+        element for element in root.iterdescendants(tag=etree.Element)
+        if any(
+            selector.matches(element.tag, element.get("id"), (element.get("class") or "").split())
+            for selector in parsed
+        )
+    ]
+
+def select_one(root: Element, selector: str) -> Element | None:
+    return next(iter(select(root, selector)), None)
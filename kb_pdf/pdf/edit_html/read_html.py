@@ -1,27 +1,76 @@
-from setup.config import Config
+from kb_common.prefetch import DEFAULT_WINDOW, chunked_process_map, prefetch
+from kb_common.profiling import Progress, profiler
+from setup.config import Config, DEFAULT_PARSER
 from setup.kb_urls import CsvItem
 from setup.logger import log
+from setup.paths import read_source, source_state
 from .contents import TocItem
-from .process_html_page import process_html_page
+from .parsers import PAGE_PARSERS
 from .merge_html import merge_html
+from .page_cache import PageCache, numbered, source_digest, unnumbered
 
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Iterator
+import tempfile
+import time
 
-def read_html(kburls: list[CsvItem], outline: list[TocItem], config: Config) -> str:
-    pages = process_pages(kburls, outline, config)
+
+def read_html(
+    kburls: list[CsvItem], outline: list[TocItem], config: Config,
+    source_digests: dict[str, str] | None = None
+) -> str:
+    pages = process_pages(kburls, outline, config, source_digests)
     html = merge_html(pages, kburls, outline, config)
     return html
 
-def process_pages(kburls: list[CsvItem], outline: list[TocItem], config: Config) -> list[str]:
-    html_pages: list[str] = []
+class PageSpool:
+    """Append only list of pages stored in a temporary file, so streamed builds don't hold every page in memory"""
+    def __init__(self):
+        self._file = tempfile.TemporaryFile()
+        self._spans: list[tuple[int, int]] = []
+
+    def append(self, page: str):
+        data = page.encode("utf-8")
+        offset = self._file.seek(0, 2)
+        self._file.write(data)
+        self._spans.append((offset, len(data)))
+
+    def __len__(self) -> int:
+        return len(self._spans)
+
+    def __iter__(self) -> Iterator[str]:
+        for offset, length in self._spans:
+            self._file.seek(offset)
+            yield self._file.read(length).decode("utf-8")
+
+def process_pages(
+    kburls: list[CsvItem], outline: list[TocItem], config: Config,
+    source_digests: dict[str, str] | None = None
+) -> list[str] | PageSpool:
+    with profiler.stage("process_pages"):
+        return _process_pages(kburls, outline, config, source_digests)
+
+def _process_pages(
+    kburls: list[CsvItem], outline: list[TocItem], config: Config,
+    source_digests: dict[str, str] | None
+) -> list[str] | PageSpool:
+    html_pages: list[str] | PageSpool = PageSpool() if config.stream else []
     
     url_to_depth_str = {}
     for row in kburls:
         if row.include in [1, 2]:
             url_to_depth_str[row.url] = row.depth_str
+
+    cache = PageCache(config.cache_config, config.parser) if config.cache_config.enabled else None
+    articles = process_articles(
+        [row for row in kburls if is_article(row)], config.jobs, cache, config.parser, source_digests,
+        config.prefetch
+    )
     
-    length = len(kburls)
+    progress = Progress(len(kburls), lambda done, total: f"Progress: {done}/{total}")
     for index, (row, outline_row) in enumerate(zip(kburls, outline, strict=True)):
-        print(f"\rProgress: {index+1}/{length}", end="")
+        progress.update(index + 1)
         assert row.include != 0
 
         if row.include == 2:
@@ -32,19 +81,84 @@ def process_pages(kburls: list[CsvItem], outline: list[TocItem], config: Config)
             html_tag = f'<h2 class="col-md-8"><a href="{row.url}">{depth_str} {row.header}</a></h2>'
             outline_row.header = f"{row.depth_str} {row.header}"
         else:
-            html_tag, header = process_article(row)
+            html_tag, header = next(articles)
             outline_row.header = header
         html_pages.append(html_tag)
-    print(f"\rProgress: {length}/{length}")
+    progress.finish()
+    if cache is not None:
+        log.info(f"Page cache: {cache.hits} hits, {cache.misses} misses")
+        cache.prune()
     return html_pages
 
+def is_article(row: CsvItem) -> bool:
+    """Articles are rows whose page is read from the archive, rather than a generated header"""
+    return row.include not in [2, 3]
+
+def process_articles(
+    rows: list[CsvItem], jobs: int, cache: PageCache | None = None, parser: str = DEFAULT_PARSER,
+    source_digests: dict[str, str] | None = None, window: int = DEFAULT_WINDOW
+) -> Iterator[tuple[str, str]]:
+    """Yields the processed (html, header) for each row, in the same order as `rows`
 
-def process_article(row: CsvItem) -> tuple[str, str]:
-    if not row.path.exists():
+    `source_digests` maps source paths to the digest of their content when already known,
+    the other sources are read to compute their cache key. Up to `window` sources are read
+    ahead of the page being processed.
+    """
+    if cache is None:
+        yield from _process_articles(rows, jobs, parser, window)
+        return
+    keys = []
+    cached = []
+    read_digest = partial(article_digest, source_digests=source_digests or {})
+    for row, digest in prefetch(rows, read_digest, window):
+        keys.append(cache.digest_key(digest, row))
+        cached.append(cache.get(keys[-1]))
+
+    # Cached pages don't depend on the row numbering, which changes whenever a row is added or removed
+    missing = [unnumbered(row) for row, page in zip(rows, cached) if page is None]
+    processed = _process_articles(missing, jobs, parser, window)
+    for row, key, page in zip(rows, keys, cached):
+        if page is None:
+            page = next(processed)
+            cache.put(key, page)
+        yield numbered(page, row)
+
+def _process_articles(rows: list[CsvItem], jobs: int, parser: str, window: int) -> Iterator[tuple[str, str]]:
+    sources = prefetch(rows, read_article, window)
+    process = partial(_timed_process_source, parser=parser)
+    if jobs <= 1 or len(rows) <= 1:
+        yield from _record_pages(rows, map(process, sources))
+        return
+    log.info(f"Processing {len(rows)} pages with {jobs} jobs")
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        yield from _record_pages(rows, chunked_process_map(executor, process, sources, jobs))
+
+def _record_pages(rows: list[CsvItem], timed_pages: Iterator[tuple[tuple[str, str], float]]) -> Iterator[tuple[str, str]]:
+    """Pages are timed where they are processed, and recorded in the main process"""
+    for row, (page, seconds) in zip(rows, timed_pages):
+        profiler.record_page(row.url, seconds)
+        yield page
+
+def _timed_process_source(source: tuple[CsvItem, str], parser: str) -> tuple[tuple[str, str], float]:
+    """Times processing the already read html of a row, reading it is not part of the page's time"""
+    start = time.perf_counter()
+    row, html = source
+    page = PAGE_PARSERS[parser](html, row)
+    return page, time.perf_counter() - start
+
+def read_article(row: CsvItem) -> str:
+    check_article_path(row)
+    return read_source(row.path).decode("utf-8")
+
+def article_digest(row: CsvItem, source_digests: dict[str, str]) -> str:
+    """Digest of the row's source, read only when it isn't in `source_digests`"""
+    check_article_path(row)
+    digest = source_digests.get(str(row.path))
+    if digest is None:
+        digest = source_digest(read_source(row.path))
+    return digest
+
+def check_article_path(row: CsvItem):
+    if source_state(row.path) is None:
         log.error(f"Could not read path: {row.path} from url: {row.url}")
         exit(1)
-    if not row.path.is_file():
-        log.error(f"Path was not File: {row.path} from url: {row.url}")
-        exit(1)
-    html = row.path.read_text(encoding="utf-8")
-    return process_html_page(html, row)
\ No newline at end of file
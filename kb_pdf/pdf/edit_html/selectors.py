@@ -0,0 +1,37 @@
+"""Precompiled css selectors, supporting the tag, id and class selectors used on pages"""
+from typing import Iterable, NamedTuple
+import re
+
+SELECTOR_PATTERN = re.compile(r"(\w*)((?:[.#][\w-]+)*)")
+SELECTOR_PART_PATTERN = re.compile(r"([.#])([\w-]+)")
+
+
+class Selector(NamedTuple):
+    tag: str
+    element_id: str | None
+    classes: frozenset[str]
+
+    def matches(self, tag: str, element_id: str | None, classes: Iterable[str]) -> bool:
+        return (
+            (not self.tag or tag == self.tag)
+            and (self.element_id is None or element_id == self.element_id)
+            and self.classes.issubset(classes)
+        )
+
+def parse_selector(selector: str) -> Selector:
+    """Splits a selector like 'div#id.class' into its tag, id and classes"""
+    match = SELECTOR_PATTERN.fullmatch(selector)
+    assert match is not None, selector
+    tag, parts = match.groups()
+    element_id = None
+    classes = set()
+    for kind, name in SELECTOR_PART_PATTERN.findall(parts):
+        if kind == "#":
+            element_id = name
+        else:
+            classes.add(name)
+    return Selector(tag, element_id, frozenset(classes))
+
+def parse_selectors(selectors: str) -> list[Selector]:
+    """Parses a comma separated selector list like 'h2#see-also,h3#see-also'"""
+    return [parse_selector(selector.strip()) for selector in selectors.split(",")]
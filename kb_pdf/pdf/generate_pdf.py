@@ -1,47 +1,303 @@
+from kb_common.profiling import profiler
 from setup.config import Config
 from setup.kb_urls import CsvItem
 from setup.logger import log
-from .edit_html.read_html import read_html
-from .edit_html.contents import TocItem
+from .edit_html.read_html import read_html, process_pages, is_article, PageSpool
+from .edit_html.merge_html import (
+    END_BOILERPLATE, START_BOILERPLATE, absolute_links, internal_link_ids, merge_html, read_preface,
+    replace_internal_links, write_document, write_html
+)
+from .edit_html.contents import TocItem, create_contents
+from .build_manifest import MANIFEST_FILENAME, BuildManifest, create_manifest, describe_changes, is_up_to_date
+from .stitch_pdf import SHARD_LINK_SCHEME, page_count, redraw_pages, stitch_pdfs
 
+from concurrent.futures import ThreadPoolExecutor
+from itertools import accumulate, islice
 from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator
+import contextvars
 import pdfkit
 import re
+import tempfile
+
+# Links to an id in the same document, after the links were internalised
+LOCAL_LINK_PATTERN = re.compile(r'href="#([^"]*)"')
+# wkhtmltopdf settings which may show the page count
+PAGE_COUNT_SETTINGS = ["header-left", "header-center", "header-right", "footer-left", "footer-center", "footer-right"]
 
 def generate_full_pdf(kburls: list[CsvItem], dir_path: Path, config: Config):
     dir_path.mkdir(exist_ok=True)
+    if not config.cache_config.enabled:
+        build_pdf(kburls, dir_path, config)
+        return
+    manifest_path = dir_path / MANIFEST_FILENAME
+    previous = BuildManifest.load(manifest_path)
+    with profiler.stage("manifest"):
+        manifest = create_manifest(kburls, config, previous)
+    if previous is not None and is_up_to_date(previous, manifest, output_paths(dir_path, config)):
+        log.info(f"Nothing changed since the last build, keeping its output generated on {previous.generated}")
+        return
+    log.info(describe_changes(previous, manifest))
+    build_pdf(kburls, dir_path, config, manifest.source_digests())
+    manifest.with_outputs(output_paths(dir_path, config)).save(manifest_path)
+
+def output_paths(dir_path: Path, config: Config) -> list[Path]:
+    paths = [dir_path / config.html_path]
+    if config.pdf:
+        paths.append(dir_path / config.pdf_path)
+    return paths
+
+def build_pdf(
+    kburls: list[CsvItem], dir_path: Path, config: Config,
+    source_digests: dict[str, str] | None = None
+):
     outline = default_outline(kburls)
     if config.pdf:
         assert "dump-outline" in config.wkhtml_settings,\
             "the setting 'dump-outline' must be inside the 'wkhtmltopdf' config table'"
-        generate_sub_pdf(kburls, dir_path, config, outline)
+        pages = process_pages(kburls, outline, config, source_digests)
+        if config.shard_jobs > 0:
+            generate_sharded_pdf(pages, kburls, dir_path, config, outline)
+            return
+        generate_sub_pdf(pages, kburls, dir_path, config, outline)
         if config.repeat_outline:
-            outline = read_outline(kburls, Path(config.wkhtml_settings["dump-outline"]))
-            generate_sub_pdf(kburls, dir_path, config, outline)
+            # Only the page numbers change, so the processed pages are reused
+            headers = [row.header for row in outline]
+            with profiler.stage("read_outline"):
+                outline = read_outline(kburls, Path(config.wkhtml_settings["dump-outline"]))
+            for row, header in zip(outline, headers, strict=True):
+                row.header = header
+            if config.single_pass and redraw_contents(kburls, dir_path, config, outline):
+                write_html_file(pages, kburls, dir_path / config.html_path, outline, config)
+                log.info(f"Wrote PDF to {dir_path / config.pdf_path}")
+                return
+            generate_sub_pdf(pages, kburls, dir_path, config, outline)
+    elif config.stream:
+        pages = process_pages(kburls, outline, config, source_digests)
+        stream_html(pages, kburls, dir_path / config.html_path, outline, config)
     else:
-        html = read_html(kburls, outline, config)
-        (dir_path / config.html_path).write_text(html, encoding="utf-8")
+        html = read_html(kburls, outline, config, source_digests)
+        with profiler.stage("write_html"):
+            (dir_path / config.html_path).write_text(html, encoding="utf-8")
 
 def generate_sub_pdf(
-    kburls: list[CsvItem],
+    pages: list[str] | PageSpool, kburls: list[CsvItem],
     dir_path: Path, config: Config,
     outline: list[TocItem]
 ):
-    html = read_html(kburls, outline, config)
-    (dir_path / config.html_path).write_text(html, encoding="utf-8")
-    wkhtmltopdf(html, dir_path / config.pdf_path, config)
+    if config.stream:
+        # wkhtmltopdf reads the written file, so the document is never held in memory
+        stream_html(pages, kburls, dir_path / config.html_path, outline, config)
+        with profiler.stage("wkhtmltopdf"):
+            wkhtmltopdf_file(dir_path / config.html_path, dir_path / config.pdf_path, config)
+    else:
+        html = merge_html(pages, kburls, outline, config)
+        with profiler.stage("write_html"):
+            (dir_path / config.html_path).write_text(html, encoding="utf-8")
+        with profiler.stage("wkhtmltopdf"):
+            wkhtmltopdf(html, dir_path / config.pdf_path, config)
+    log.info(f"Wrote PDF to {dir_path / config.pdf_path}")
+
+def redraw_contents(kburls: list[CsvItem], dir_path: Path, config: Config, outline: list[TocItem]) -> bool:
+    """Renders the preface and contents on their own with the page numbers of `outline`, and draws them
+    over the pages of the rendered PDF which showed zeros
+
+    The body starts on a new page after the contents, so its pages are the same as in a second full
+    render. The contents pages take the links of the new render, whose entries may wrap differently,
+    with links into the body rendered as `SHARD_LINK_SCHEME` urls and pointed at the page of their
+    row. Returns False when the contents no longer fit the same number of pages, in which case the
+    whole document has to be rendered again.
+    """
+    pdf_path = dir_path / config.pdf_path
+    contents_pages = min(row.page_num for row in outline) - 1
+    settings = page_count_settings(config.wkhtml_settings, page_count(pdf_path))
+    settings.pop("dump-outline", None)
+    # the body is not part of this render, so every link into it is resolved once drawn
+    body_ids = {row.link_id: 1 for row in outline}
+    rewrite_links = shard_link_rewriter(0, internal_link_ids(kburls), body_ids)
+    contents = create_contents(outline, config.toc_config)
+    html = START_BOILERPLATE + read_preface() + rewrite_links(contents) + END_BOILERPLATE
+    id_pages: dict[str, int] = {}
+    for row in outline:
+        id_pages.setdefault(row.link_id, row.page_num - 1)
+    link_page = lambda fragment: id_pages.get(fragment_id_path(fragment))
+    with tempfile.TemporaryDirectory(dir=dir_path) as tmp_dir:
+        contents_path = Path(tmp_dir) / "contents.pdf"
+        with profiler.stage("wkhtmltopdf_contents"):
+            wkhtmltopdf(html, contents_path, config._replace(wkhtml_settings=settings))
+        if page_count(contents_path) != contents_pages:
+            log.info("The contents changed their page count, rendering the whole document again")
+            return False
+        with profiler.stage("redraw_contents"):
+            _, unresolved = redraw_pages(pdf_path, contents_path, link_page)
+        if unresolved:
+            log.warning(f"Could not resolve {unresolved} links of the contents")
+    return True
+
+def write_html_file(
+    pages: list[str] | PageSpool, kburls: list[CsvItem],
+    html_path: Path, outline: list[TocItem], config: Config
+):
+    if config.stream:
+        stream_html(pages, kburls, html_path, outline, config)
+        return
+    html = merge_html(pages, kburls, outline, config)
+    with profiler.stage("write_html"):
+        html_path.write_text(html, encoding="utf-8")
+
+def generate_sharded_pdf(
+    pages: list[str] | PageSpool, kburls: list[CsvItem],
+    dir_path: Path, config: Config,
+    outline: list[TocItem]
+):
+    """Renders the contents and each top-level chapter with their own wkhtmltopdf, `config.shard_jobs` at a time
+
+    A first pass gives the page count and outline of every shard, from which the second pass gets
+    the page numbers of its footers and of the contents. Chapters start on a new page, which they
+    don't in a single render. Pages are read one chapter at a time, so with `config.stream` they
+    are never all held in memory.
+    """
+    chapters = chapter_ranges(kburls)
+    link_ids = internal_link_ids(kburls)
+    id_shards: dict[str, int] = {}
+    for shard, chapter in enumerate(chapters, 1):
+        for index in chapter:
+            if is_article(kburls[index]):
+                id_shards.setdefault(kburls[index].id_path, shard)
+    log.info(f"Rendering {len(chapters)} chapters with {config.shard_jobs} jobs")
+
+    with tempfile.TemporaryDirectory(dir=dir_path) as tmp_dir:
+        shard_dir = Path(tmp_dir)
+        html_paths = [shard_dir / f"shard_{shard}.html" for shard in range(len(chapters) + 1)]
+        pdf_paths = [path.with_suffix(".pdf") for path in html_paths]
+        outline_paths = [path.with_suffix(".outline") for path in html_paths]
+        for shard, pages_of_chapter in enumerate(chapter_pages(pages, chapters), 1):
+            write_shard(html_paths[shard], "", "", pages_of_chapter, shard_link_rewriter(shard, link_ids, id_shards))
+        write_contents = lambda outline: write_shard(
+            html_paths[0], read_preface(), create_contents(outline, config.toc_config), [],
+            shard_link_rewriter(0, link_ids, id_shards)
+        )
+        write_contents(outline)
+
+        # first pass, for the page count and outline of every shard
+        settings = [config.wkhtml_settings | {"dump-outline": str(path)} for path in outline_paths]
+        with profiler.stage("wkhtmltopdf_shards"):
+            render_shards(html_paths, pdf_paths, settings, config)
+        page_counts = [page_count(path) for path in pdf_paths]
+        offsets = [0, *accumulate(page_counts)]
+        outline_rows = [
+            (title, page + offset)
+            for path, offset in zip(outline_paths[1:], offsets[1:])
+            for title, page in read_outline_rows(path)
+        ]
+        if config.repeat_outline:
+            headers = [row.header for row in outline]
+            outline = [create_toc_item(*row, csv_item) for row, csv_item in zip(outline_rows, kburls, strict=True)]
+            for row, header in zip(outline, headers, strict=True):
+                row.header = header
+            write_contents(outline)
+
+        # second pass, numbering pages as they are numbered in the stitched document
+        settings = [
+            page_count_settings(config.wkhtml_settings, offsets[-1]) | {"page-offset": offset}
+            for offset in offsets[:-1]
+        ]
+        for shard_settings in settings:
+            shard_settings.pop("dump-outline", None)
+        with profiler.stage("wkhtmltopdf_shards"):
+            render_shards(html_paths, pdf_paths, settings, config)
+        if page_count(pdf_paths[0]) != page_counts[0]:
+            log.warning("The page count of the contents changed, page numbers after it are off")
+
+        id_pages: dict[str, int] = {}
+        for csv_item, (_, page) in zip(kburls, outline_rows, strict=True):
+            if is_article(csv_item):
+                id_pages.setdefault(csv_item.id_path, page - 1)
+        link_page = lambda fragment: id_pages.get(fragment_id_path(fragment))
+        with profiler.stage("stitch_pdf"):
+            resolved, unresolved = stitch_pdfs(pdf_paths, dir_path / config.pdf_path, link_page)
+        log.info(f"Stitched {len(pdf_paths)} shards, resolved {resolved} links between them")
+        if unresolved:
+            log.warning(f"Could not resolve {unresolved} links between shards")
+
+    write_html_file(pages, kburls, dir_path / config.html_path, outline, config)
     log.info(f"Wrote PDF to {dir_path / config.pdf_path}")
 
+def chapter_ranges(kburls: list[CsvItem]) -> list[range]:
+    """Ranges of rows, each starting at a top-level row, rows before the first one join the first chapter"""
+    starts = [index for index, row in enumerate(kburls) if row.depth == 1 and index > 0]
+    bounds = [0, *starts, len(kburls)]
+    return [range(start, end) for start, end in zip(bounds, bounds[1:])]
+
+def chapter_pages(pages: Iterable[str], chapters: list[range]) -> Iterator[Iterable[str]]:
+    """The pages of each chapter in turn, a chapter's pages have to be read before the next chapter's"""
+    pages = iter(pages)
+    for chapter in chapters:
+        yield islice(pages, len(chapter))
+
+def write_shard(
+    html_path: Path, preface: str, contents: str, pages: Iterable[str],
+    rewrite_links: Callable[[str], str]
+):
+    with open(html_path, "w", encoding="utf-8") as outfile:
+        write_document(outfile, preface, contents, pages, rewrite_links)
+
+def shard_link_rewriter(shard: int, link_ids: dict[str, tuple[int, str]], id_shards: dict[str, int]) -> Callable[[str], str]:
+    """Internalises links like `write_html`, links to another shard are marked to be resolved once stitched"""
+    def replace_link(match: re.Match) -> str:
+        fragment = match[1]
+        if id_shards.get(fragment_id_path(fragment), shard) == shard:
+            return match[0]
+        return f'href="{SHARD_LINK_SCHEME}{fragment}"'
+    return lambda html: LOCAL_LINK_PATTERN.sub(replace_link, replace_internal_links(absolute_links(html), link_ids))
+
+def fragment_id_path(fragment: str) -> str:
+    """Ids inside a page are prefixed with the page's id_path, which ends with its '.html'"""
+    end = fragment.find(".html")
+    return fragment if end == -1 else fragment[:end + len(".html")]
+
+def page_count_settings(settings: dict[str, Any], total_pages: int) -> dict[str, Any]:
+    """Each shard only knows its own page count, so the total is written out instead"""
+    return settings | {
+        key: str(settings[key]).replace("[topage]", str(total_pages))
+        for key in PAGE_COUNT_SETTINGS if key in settings
+    }
+
+def render_shards(html_paths: list[Path], pdf_paths: list[Path], settings: list[dict[str, Any]], config: Config):
+    # Threads are enough, each render is its own wkhtmltopdf process. They run in a copy of this
+    # thread's context, so their log records keep the language being built
+    with ThreadPoolExecutor(max_workers=config.shard_jobs) as executor:
+        renders = [
+            executor.submit(
+                contextvars.copy_context().run,
+                wkhtmltopdf_file, html_path, pdf_path, config._replace(wkhtml_settings=shard_settings)
+            )
+            for html_path, pdf_path, shard_settings in zip(html_paths, pdf_paths, settings, strict=True)
+        ]
+        for render in renders:
+            render.result()
+
+def stream_html(
+    pages: list[str] | PageSpool, kburls: list[CsvItem],
+    html_path: Path, outline: list[TocItem], config: Config
+):
+    with open(html_path, "w", encoding="utf-8") as outfile:
+        write_html(outfile, pages, kburls, outline, config)
+
 def default_outline(kburls: list[CsvItem]) -> list[TocItem]:
     return [TocItem(header = row.header, page_num=0, link_id=row.id_path) for row in kburls]
 
 def read_outline(kburls: list[CsvItem], outline_path: Path) -> list[TocItem]:
+    outline_rows = read_outline_rows(outline_path)
+    return [create_toc_item(*row, csv_item) for row, csv_item in zip(outline_rows, kburls, strict=True)] 
+
+def read_outline_rows(outline_path: Path) -> list[tuple[str, int]]:
+    """(title, page) of every numbered header in a dumped outline"""
     outline = outline_path.read_text(encoding="utf-8")
     outline_rows = map(str.strip, outline.splitlines())
     outline_rows = filter(lambda row: row.startswith('<item title="'), outline_rows)
     outline_rows = map(get_title_page, outline_rows)
-    outline_rows = filter(lambda row: row[0][0].isnumeric(), outline_rows)
-    return [create_toc_item(*row, csv_item) for row, csv_item in zip(outline_rows, kburls, strict=True)] 
+    return [row for row in outline_rows if row[0][0].isnumeric()]
 
 def create_toc_item(header: str, page_num: int, csv_item: CsvItem) -> TocItem:
     return TocItem(header=header, page_num=page_num, link_id=csv_item.id_path)
@@ -62,3 +318,13 @@ def wkhtmltopdf(html: str, pdf_path: Path, config: Config):
         options=config.wkhtml_settings,
         # toc={"xsl-style-sheet": "toc.xsl"},
     )
+
+def wkhtmltopdf_file(html_path: Path, pdf_path: Path, config: Config):
+    log.info("Starting wk")
+    wk_config = pdfkit.configuration(wkhtmltopdf="")
+    pdfkit.from_file(
+        str(html_path),
+        pdf_path,
+        configuration=wk_config,
+        options=config.wkhtml_settings,
+    )
@@ -0,0 +1,117 @@
+"""Stitches separately rendered PDFs into one, keeping their bookmarks and internal links
+
+wkhtmltopdf can only resolve links within the document it renders, so links to another shard are
+rendered as links to `SHARD_LINK_SCHEME` urls. Once the shards are merged, these are replaced by
+links to the page of their target. `redraw_pages` swaps what some pages of a document show,
+together with their links, the same way.
+"""
+from pathlib import Path
+from typing import Callable
+from urllib.parse import unquote
+
+try:
+    import pypdf
+    from pypdf.generic import ArrayObject, DictionaryObject, NameObject, NumberObject
+except ImportError: # only needed by --shards, which checks for it in setup.config
+    pypdf = None
+
+SHARD_LINK_SCHEME = "kbpdf:"
+
+def page_count(pdf_path: Path) -> int:
+    return len(pypdf.PdfReader(pdf_path).pages)
+
+def stitch_pdfs(shard_paths: list[Path], pdf_path: Path, link_page: Callable[[str], int | None]) -> tuple[int, int]:
+    """Merges the shards in order, `link_page` gives the 0-based page of a link target between shards
+
+    Returns the number of links between shards which were resolved, and of those which were not.
+    """
+    writer = pypdf.PdfWriter()
+    for shard_path in shard_paths:
+        writer.append(shard_path)
+    links = resolve_shard_links(writer, link_page)
+    with open(pdf_path, "wb") as outfile:
+        writer.write(outfile)
+    return links
+
+def resolve_shard_links(writer: "pypdf.PdfWriter", link_page: Callable[[str], int | None]) -> tuple[int, int]:
+    resolved = 0
+    unresolved = 0
+    for page in writer.pages:
+        for annotation in page.get("/Annots", []):
+            annotation = annotation.get_object()
+            action = annotation.get("/A")
+            uri = None if action is None else action.get_object().get("/URI")
+            if uri is None or not str(uri).startswith(SHARD_LINK_SCHEME):
+                continue
+            target = link_page(unquote(str(uri).removeprefix(SHARD_LINK_SCHEME)))
+            if target is None:
+                unresolved += 1
+                continue
+            annotation[NameObject("/A")] = DictionaryObject({
+                NameObject("/S"): NameObject("/GoTo"),
+                NameObject("/D"): ArrayObject([writer.pages[target].indirect_reference, NameObject("/Fit")]),
+            })
+            resolved += 1
+    return resolved, unresolved
+
+def redraw_pages(pdf_path: Path, drawn_path: Path, link_page: Callable[[str], int | None]) -> tuple[int, int]:
+    """Draws the pages of `drawn_path` over the first pages of `pdf_path`, with their links
+
+    Every bookmark or link to the pages is kept. Their contents, the resources those use and their
+    links are replaced by those of the drawn pages, whose layout may differ. Links between drawn
+    pages point to the same pages of `pdf_path`, and links to `SHARD_LINK_SCHEME` urls to the
+    0-based page `link_page` gives. Returns the number of those which were resolved, and not.
+    """
+    writer = pypdf.PdfWriter(clone_from=pdf_path)
+    reader = pypdf.PdfReader(drawn_path)
+    for page, drawn in zip(writer.pages, reader.pages):
+        clone = drawn.clone(writer, ignore_fields=("/Annots", "/Parent"))
+        for field in ("/Contents", "/Resources"):
+            if field in clone:
+                page[NameObject(field)] = clone[field]
+        if "/Annots" in page:
+            del page[NameObject("/Annots")]
+        for annotation in drawn.get("/Annots", []):
+            link = copy_link(writer, reader, annotation.get_object())
+            if link is not None:
+                writer.add_annotation(page, link)
+    links = resolve_shard_links(writer, link_page)
+    tmp_path = pdf_path.with_suffix(".tmp.pdf")
+    with open(tmp_path, "wb") as outfile:
+        writer.write(outfile)
+    tmp_path.replace(pdf_path)
+    return links
+
+def copy_link(writer: "pypdf.PdfWriter", reader: "pypdf.PdfReader", annotation: "DictionaryObject") -> "DictionaryObject | None":
+    """A link annotation of `reader` for `writer`, its destination moved to the page of `writer` with the same index"""
+    if annotation.get("/Subtype") != "/Link":
+        return None
+    link = DictionaryObject({
+        NameObject("/Type"): NameObject("/Annot"),
+        NameObject("/Subtype"): NameObject("/Link"),
+        NameObject("/Rect"): annotation["/Rect"].get_object().clone(writer),
+        NameObject("/Border"): ArrayObject([NumberObject(0), NumberObject(0), NumberObject(0)]),
+    })
+    action = annotation.get("/A")
+    action = None if action is None else action.get_object()
+    if action is not None and "/URI" in action:
+        link[NameObject("/A")] = DictionaryObject({
+            NameObject("/S"): NameObject("/URI"), NameObject("/URI"): action["/URI"].clone(writer),
+        })
+        return link
+    destination = annotation.get("/Dest") if action is None else action.get("/D")
+    if destination is None:
+        return None
+    destination = destination.get_object()
+    if not isinstance(destination, ArrayObject):
+        named = reader.named_destinations.get(str(destination))
+        if named is None:
+            return None
+        destination = ArrayObject([named.page, NameObject("/Fit")])
+    target = reader.get_page_number(destination[0].get_object())
+    if target is None or target >= len(writer.pages):
+        return None
+    link[NameObject("/Dest")] = ArrayObject([
+        writer.pages[target].indirect_reference, *(value.clone(writer) for value in destination[1:])
+    ])
+    return link
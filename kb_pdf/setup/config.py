@@ -4,12 +4,23 @@ from dataclasses import dataclass
 from typing import Any, NamedTuple
 from pathlib import Path
 
+import importlib.util
 import toml
 import argparse
 
 DEFAULT_HTML_PATH = "output.html"
 DEFAULT_PDF_PATH = "MariaDBServerKnowledgeBase.pdf"
 DEFAULT_VERBOSITY = 1
+DEFAULT_JOBS = 1
+DEFAULT_LANG_JOBS = 1
+DEFAULT_SHARD_JOBS = 0
+DEFAULT_PREFETCH = 16
+DEFAULT_CACHE_PATH = ".page_cache"
+DEFAULT_CACHE_SIZE_MB = 512
+DEFAULT_CACHE_AGE_DAYS = 30
+DEFAULT_PARSER = "soup"
+DEFAULT_PROFILE_PATH = "profile.json"
+PARSERS = ["soup", "lxml"]
 
 class TocTypeConfig(NamedTuple):
     font_size: str
@@ -20,16 +31,35 @@ class TocConfig(NamedTuple):
     chapter: TocTypeConfig
     main: TocTypeConfig
 
+class CacheConfig(NamedTuple):
+    enabled: bool
+    path: Path
+    max_size: int
+    max_age: float
+
 # Public
 class Config(NamedTuple):
     pdf: bool
     repeat_outline: bool
+    stream: bool
     languages: list[str]
     num_rows: int
+    jobs: int
+    lang_jobs: int
+    # Number of pages read ahead of the one being processed, 0 reads each page when it is processed
+    prefetch: int
+    # 0 renders the whole document at once, otherwise the number of chapters rendered at the same time
+    shard_jobs: int
+    # Only the contents are rendered again for repeat_outline, rather than the whole document
+    single_pass: bool
+    parser: str
     pdf_path: Path
     html_path: Path
     wkhtml_settings: dict[str, Any]
     toc_config: TocConfig
+    cache_config: CacheConfig
+    profile_path: Path | None
+    cprofile: bool
 
 def read_config(filepath: str) -> Config:
     """Returns a simplified data structure containing the config settings"""
@@ -46,10 +76,20 @@ def read_config(filepath: str) -> Config:
 class _ArgConfig:
     nopdf: bool
     norepeat: bool
+    nocache: bool
+    stream: bool
     htmlpath: str
     pdfpath: str
     langs: list[str]
     numrows: int
+    jobs: int
+    langjobs: int
+    prefetch: int
+    shards: int
+    singlepass: bool
+    parser: str
+    profile: str | None
+    cprofile: bool
     quiet: bool
     verbose: bool
 
@@ -57,14 +97,23 @@ def generate_config(arg_config: _ArgConfig, dict_config: dict[str, Any]) -> Conf
     return Config(
         pdf=not arg_config.nopdf,
         repeat_outline=not arg_config.norepeat,
+        stream=arg_config.stream,
         languages=["en"] if not arg_config.langs else arg_config.langs,
         num_rows=-1 if arg_config.numrows is None else arg_config.numrows,
+        jobs=DEFAULT_JOBS if arg_config.jobs is None else max(1, arg_config.jobs),
+        lang_jobs=DEFAULT_LANG_JOBS if arg_config.langjobs is None else max(1, arg_config.langjobs),
+        prefetch=DEFAULT_PREFETCH if arg_config.prefetch is None else max(0, arg_config.prefetch),
+        shard_jobs=read_shard_jobs(arg_config.shards),
+        single_pass=arg_config.singlepass and require_pypdf("--singlepass"),
+        parser=read_parser(arg_config.parser, dict_config.get("html", {})),
         html_path=Path(DEFAULT_HTML_PATH if arg_config.htmlpath is None else arg_config.htmlpath),
         pdf_path=Path(DEFAULT_PDF_PATH if arg_config.pdfpath is None else arg_config.pdfpath),
 
         toc_config=read_toc_config(dict_config["TOC"]),
+        cache_config=read_cache_config(dict_config.get("cache", {}), not arg_config.nocache),
         wkhtml_settings=dict_config["wkhtmltopdf"],
-
+        profile_path=None if arg_config.profile is None else Path(arg_config.profile),
+        cprofile=arg_config.cprofile,
     )
 
 def _read_args() -> _ArgConfig:
@@ -78,8 +127,18 @@ def _read_args() -> _ArgConfig:
     
     parser.add_argument("-l", "--langs", type=str, nargs="+", help="Optional Languages eg: (en, it)")
     parser.add_argument("-n", "--numrows", "--num_rows", type=int, help="Maximum Number of csv urls to use.")
+    parser.add_argument("-j", "--jobs", type=int, help="Number of worker processes used to process pages.")
+    parser.add_argument("--langjobs", "--lang_jobs", type=int, help="Number of languages built at the same time")
+    parser.add_argument("--prefetch", type=int, help=f"Number of pages read ahead of processing, 0 turns it off. Default {DEFAULT_PREFETCH}")
+    parser.add_argument("--shards", type=int, help="Renders top-level chapters as separate PDFs, this many at the same time, then stitches them together. Requires pypdf")
+    parser.add_argument("--singlepass", action="store_true", help="Renders the document once, then only the contents again with their page numbers. Requires pypdf")
+    parser.add_argument("--parser", choices=PARSERS, help="HTML parser used to process pages, overrides config.toml")
     parser.add_argument("--norepeat", action="store_true", help="Turns off repeat generation")
+    parser.add_argument("--nocache", action="store_true", help="Turns off the processed page cache and the build manifest, so everything is rebuilt with the current date")
     parser.add_argument("--nopdf", action="store_true", help="Turns off pdf generation")
+    parser.add_argument("--stream", action="store_true", help="Streams the merged HTML to disk, keeping processed pages out of memory")
+    parser.add_argument("--profile", type=str, nargs="?", const=DEFAULT_PROFILE_PATH, help="Writes stage timings, memory and the slowest pages to a JSON report")
+    parser.add_argument("--cprofile", action="store_true", help="With --profile, also dumps cProfile stats of the main thread next to the report")
     parser.add_argument("-o", "--pdfpath", type=str, help="Path to write Final PDF")
     parser.add_argument("--htmlpath", "--html_path", type=str, help="Path to write HTML Output")
 
@@ -96,4 +155,31 @@ def read_toc_config(config: dict[str, Any]) -> TocConfig:
         padding_left=config["chapter_indent"],
         margin=config["chapter_margin"]
     )
-    return TocConfig(main=main, chapter=chapter)
\ No newline at end of file
+    return TocConfig(main=main, chapter=chapter)
+
+def read_cache_config(config: dict[str, Any], enabled: bool) -> CacheConfig:
+    return CacheConfig(
+        enabled=enabled and config.get("enabled", True),
+        path=Path(config.get("path", DEFAULT_CACHE_PATH)),
+        max_size=int(config.get("max_size_mb", DEFAULT_CACHE_SIZE_MB) * 1024 * 1024),
+        max_age=config.get("max_age_days", DEFAULT_CACHE_AGE_DAYS) * 24 * 60 * 60,
+    )
+
+def read_parser(arg_parser: str | None, config: dict[str, Any]) -> str:
+    parser = arg_parser if arg_parser is not None else config.get("parser", DEFAULT_PARSER)
+    if parser not in PARSERS:
+        log.error(f"Unknown html parser: {parser}, expected one of {PARSERS}")
+        exit(1)
+    return parser
+
+def read_shard_jobs(arg_shards: int | None) -> int:
+    if arg_shards is None or arg_shards <= 0:
+        return DEFAULT_SHARD_JOBS
+    require_pypdf("--shards")
+    return arg_shards
+
+def require_pypdf(option: str) -> bool:
+    if importlib.util.find_spec("pypdf") is None:
+        log.error(f"{option} requires pypdf to combine the rendered PDFs")
+        exit(1)
+    return True
@@ -1,79 +1,65 @@
-from .paths import url_to_path, DIR_PATH
+from .paths import url_to_path, DIR_PATH, ARCHIVE_HTML_STR
 from .logger import log
 
-from typing import Iterable
+from kb_common.kb_urls import PDF_COLUMNS, KbUrlRow, KbUrlsError, load_kb_urls
+
 from pathlib import Path
 from dataclasses import dataclass
-import csv
 
 
-@dataclass
+@dataclass(slots=True)
 class CsvItem:
     header: str
     url: str
     path: Path
     id_path: str
-    slugs: list[str]
+    slugs: tuple[str, ...]
     include: int
     depth: int
     depth_str: str = ""
 
     @classmethod
-    def from_dict(cls, row: dict[str, str]):
-        url: str = row["URL"]
-        path: Path = url_to_path(url)
-        id_path = "/".join(path.parts).removeprefix("../kb_archive/html/")
-        slugs: list[str]
-        include: int
-        depth: int
-        header: str = row["Header"]
-        
-        try:
-            if row["Include"] != "":
-                include = int(row["Include"])
-            else:
-                include = 0
-        except ValueError as s:
-            log.error(f"Could not convert 'Include' field to integer for {url}: {s}")
-            exit(1)
-
-
-        if row["Depth"] == "":
-            depth = 0
-        elif row["Depth"].isnumeric():
-            depth = int(row["Depth"])
-        else:
-            log.error(f"Invalid Depth Argument: {row['Depth']}")
-            exit(1)
-
-        slugs = [f"https://mariadb.com/kb/en/{slug}/" for slug in row["Duplicate slugs"].split(";") if slug.strip()]
+    def from_row(cls, row: KbUrlRow):
+        path: Path = url_to_path(row.url)
+        return cls(
+            url=row.url,
+            path=path,
+            id_path="/".join(path.parts).removeprefix("../kb_archive/html/"),
+            slugs=tuple(f"https://mariadb.com/kb/en/{slug}/" for slug in row.slugs),
+            include=row.include,
+            depth=row.depth,
+            header=row.header,
+        )
 
+    @classmethod
+    def from_archive(cls, url: str, location: str, depth_str: str = "1"):
+        """A row for an archived page which is not necessarily in the csv, used by the tooling scripts"""
         return cls(
+            header="",
             url=url,
-            path=path,
-            id_path=id_path,
-            slugs=slugs,
-            include=include,
-            depth=depth,
-            header=header,
+            path=Path(ARCHIVE_HTML_STR + location),
+            id_path=location,
+            slugs=(),
+            include=1,
+            depth=depth_str.count(".") + 1,
+            depth_str=depth_str,
         )
 
 def read_csv(filepath: Path|str, num_rows: int) -> list[CsvItem]:
     if not Path(filepath).exists():
         log.error(f"Could not read: {filepath}")
         exit(1)
-    with open(filepath, 'r', encoding="utf-8") as infile:
-        content = csv.DictReader(infile)
-        kb_urls = _parse_csv(content, num_rows)
+    try:
+        rows = load_kb_urls(filepath, columns=PDF_COLUMNS)
+    except KbUrlsError as error:
+        log.error(str(error))
+        exit(1)
+    included = [row for row in rows if row.include != 0]
+    included = included[:num_rows] if num_rows > 0 else included
+    kb_urls = [CsvItem.from_row(row) for row in included]
     apply_depth(kb_urls)
     return kb_urls
 
-
-def _parse_csv(content: Iterable[dict], num_rows) -> list[CsvItem]:
-    rows = [row for row in content if row["Include"] not in ["", "0"]]
-    rows = rows[:num_rows] if num_rows > 0 else rows
-    return [CsvItem.from_dict(row) for row in rows if row["Include"] not in ["", "0"]]
-
 def apply_depth(kb_urls: list[CsvItem]):
     depths = []
     for row in kb_urls:
@@ -1,9 +1,8 @@
 from setup.kb_urls import CsvItem, apply_depth
 from setup.config import Config
-from setup.paths import format_url, url_to_path, DIR_PATH, DIR_PATH_STR
+from setup.paths import format_url, url_to_path, page_index, path_to_location
 
 from copy import copy
-from bs4 import BeautifulSoup, Tag
 
 def read_languages(en_csv: list[CsvItem], config: Config) -> dict[str, list[CsvItem]]:
     language_csvs = {
@@ -16,44 +15,32 @@ def read_languages(en_csv: list[CsvItem], config: Config) -> dict[str, list[CsvI
     if config.languages == ["en"]:
         return language_csvs
 
+    index = page_index()
+    index.refresh(path_to_location(row.path) for row in en_csv)
+    seen_rows = { lang: {_row_key(row) for row in rows} for lang, rows in language_csvs.items() }
     for row in en_csv:
-        found_languages = _find_languages(row)
+        found_languages = index.localized_versions(path_to_location(row.path))
         for lang, lang_val in found_languages.items():
+            assert lang_val.startswith(f"/kb/{lang}")
             if lang in config.languages:
                 new_url = format_url(lang_val)
                 assert new_url is not None
                 new_row = _create_lang_row(row, new_url)
-                if new_row not in language_csvs[lang]:
+                if _row_key(new_row) not in seen_rows[lang]:
+                    seen_rows[lang].add(_row_key(new_row))
                     language_csvs[lang].append(new_row)
     for csv in language_csvs.values():
         apply_depth(csv)
     return language_csvs
 
 
-def _find_languages(row: CsvItem) -> dict[str, str]:
-    html = row.path.read_text(encoding="utf-8")
-    soup = BeautifulSoup(html, features="html.parser")
-    header = soup.find(["h3","h4","h5","h6"], text="Localized Versions")
-    if header is None:
-        return {}
-    assert isinstance(header, Tag)
-    versions_div = header.parent.find_next_sibling() # type: ignore
-    if versions_div is None:
-        return {}
-    assert isinstance(versions_div, Tag)
-    languages = {}
-    for li in versions_div.select("li"):
-        if isinstance(li.a, Tag) and "href" in li.a.attrs:
-            lang_url = li.a.attrs["href"]
-            li.a.decompose()
-            lang = li.text.strip().removeprefix("[").removesuffix("]")
-            languages[lang] = lang_url
-            assert lang_url.startswith(f"/kb/{lang}")
-    return languages
+def _row_key(row: CsvItem) -> tuple:
+    """Hashable equivalent of comparing two rows"""
+    return (row.header, row.url, row.path, row.id_path, tuple(row.slugs), row.include, row.depth, row.depth_str)
 
 def _create_lang_row(row: CsvItem, url: str) -> CsvItem:
     new_row = copy(row)
     new_row.url = url
     new_row.path = url_to_path(url)
-    row.id_path = "/".join(new_row.path.parts).removeprefix(DIR_PATH_STR)
+    new_row.id_path = path_to_location(new_row.path)
     return new_row
\ No newline at end of file
@@ -1,8 +1,47 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterator
 import logging
+
+# Language currently being built, set per thread so concurrent builds log separately
+BUILD_LANG: ContextVar[str] = ContextVar("build_lang", default="")
+
+class _LangFilter(logging.Filter):
+    """Adds the language being built to each record, optionally only passing that language's records"""
+    def __init__(self, only: str | None = None):
+        super().__init__()
+        self.only = only
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        lang = BUILD_LANG.get()
+        record.lang = f"[{lang}] " if lang else ""
+        return self.only is None or self.only == lang
+
+LOG_FORMAT = "[%(levelname)s] %(asctime)s %(lang)s%(message)s"
+LOG_DATE_FORMAT = "%H:%M:%S"
+
 logging.basicConfig(
-    format="[%(levelname)s] %(asctime)s %(message)s",
-    datefmt="%H:%M:%S",
+    format=LOG_FORMAT,
+    datefmt=LOG_DATE_FORMAT,
     level=logging.INFO,
 )
 log = logging.getLogger()
 log.setLevel(logging.INFO)
+for _handler in log.handlers:
+    _handler.addFilter(_LangFilter())
+
+@contextmanager
+def language_log(lang: str, log_path: Path) -> Iterator[None]:
+    """Tags records with `lang` and also writes them to `log_path` while building that language"""
+    token = BUILD_LANG.set(lang)
+    handler = logging.FileHandler(log_path, mode="w", encoding="utf-8")
+    handler.setFormatter(logging.Formatter(LOG_FORMAT, LOG_DATE_FORMAT))
+    handler.addFilter(_LangFilter(only=lang))
+    log.addHandler(handler)
+    try:
+        yield
+    finally:
+        log.removeHandler(handler)
+        handler.close()
+        BUILD_LANG.reset(token)
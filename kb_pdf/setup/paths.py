@@ -1,21 +1,47 @@
+from kb_common.archive_index import ArchiveIndex
+from kb_common.packed_archive import ArchivePages, PageState
+from kb_common.page_index import PageIndex
+
+from functools import cache
 from pathlib import Path
 
 DIR_PATH_STR ="../kb_archive/HTML" 
 DIR_PATH = Path(DIR_PATH_STR)
+ARCHIVE_HTML_STR = "../kb_archive/html/"
 BASE_KB = "https://mariadb.com/kb/"
 URL_LOCATIONS_PATH = Path("../url_locations.txt")
+PAGE_INDEX_PATH = Path("../kb_archive/page_index.sqlite")
+
+
+@cache
+def url_locations() -> ArchiveIndex:
+    """Loaded on first use, rebuilding the index if 'url_locations.txt' has changed"""
+    return ArchiveIndex.load(URL_LOCATIONS_PATH)
+
+@cache
+def page_index() -> PageIndex:
+    return PageIndex(ARCHIVE_HTML_STR, PAGE_INDEX_PATH)
 
+@cache
+def archive_pages() -> ArchivePages:
+    """Reads from 'kb_archive/html.kbpack' when it exists, so page paths need not be files"""
+    return ArchivePages(ARCHIVE_HTML_STR)
 
-def load_url_locations() -> dict[str, Path]:
-    lines = URL_LOCATIONS_PATH.read_text(encoding="utf-8").splitlines()
-    lines = [line.split(' ', maxsplit=1) for line in lines]
-    return { left: Path(right.replace("../html/", "../kb_archive/html/")) for left, right in lines }
+def read_source(path: Path) -> bytes:
+    return archive_pages().read_bytes(path_to_location(path))
+
+def source_state(path: Path) -> PageState | None:
+    """Size and modification time of the page at `path`, None when it isn't in the archive"""
+    return archive_pages().state(path_to_location(path))
+
+def path_to_location(path: Path) -> str:
+    """Location of a page within the archive, as used by the page index"""
+    return "/".join(path.parts).removeprefix(ARCHIVE_HTML_STR)
 
 def url_to_path(url: str) -> Path:
-    url = url.strip().removesuffix('/')
-    path = URL_LOCATIONS.get(url)
-    assert path is not None, f"{url}"
-    return path 
+    location = url_locations().get(url)
+    assert location is not None, f"{url}"
+    return Path(ARCHIVE_HTML_STR + location)
 
 def format_url(suffix: str) -> str:
     for symbol in ('#', '?'):
@@ -31,5 +57,3 @@ def format_url(suffix: str) -> str:
         .strip()
 
     return BASE_KB + url
-
-URL_LOCATIONS = load_url_locations()
\ No newline at end of file
@@ -0,0 +1,28 @@
+from kb_common.archive_index import ArchiveIndex
+
+import os
+
+LOCATIONS = """https://mariadb.com/kb/en/select ../html/en/select.html
+https://mariadb.com/kb/it/select ../html/it/select.html
+https://mariadb.com/kb/en ../html/en.html
+"""
+
+def test_lookup(tmp_path):
+    source = tmp_path / "url_locations.txt"
+    source.write_text(LOCATIONS, encoding="utf-8")
+    index = ArchiveIndex.load(source)
+    assert len(index) == 3
+    assert index.get("https://mariadb.com/kb/en/select/") == "en/select.html"
+    assert index.get(" https://mariadb.com/kb/en ") == "en.html"
+    assert index.get("https://mariadb.com/kb/en/missing") is None
+    assert dict(index.items())["https://mariadb.com/kb/it/select"] == "it/select.html"
+
+def test_rebuilt_when_source_changes(tmp_path):
+    source = tmp_path / "url_locations.txt"
+    source.write_text(LOCATIONS, encoding="utf-8")
+    assert "https://mariadb.com/kb/en/insert" not in ArchiveIndex.load(source)
+
+    source.write_text(LOCATIONS + "https://mariadb.com/kb/en/insert ../html/en/insert.html\n", encoding="utf-8")
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert ArchiveIndex.load(source).get("https://mariadb.com/kb/en/insert") == "en/insert.html"
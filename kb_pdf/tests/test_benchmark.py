@@ -0,0 +1,19 @@
+from kb_common.benchmark import Case, Result, run_case, read_baseline, save_baseline, format_result
+
+def test_run_case_measures_time_and_memory():
+    result = run_case(Case("join", lambda: "-".join(["x"] * 10000)), rounds=1)
+    assert result.name == "join"
+    assert result.calls >= 1
+    assert result.seconds_per_call > 0
+    assert result.peak_bytes >= 10000
+
+def test_baseline_round_trip_keeps_other_cases(tmp_path):
+    path = tmp_path / "baseline.json"
+    save_baseline(path, [Result("old", 1, 1.0, 10, 0)], {})
+    save_baseline(path, [Result("new", 1, 2.0, 20, 0)], read_baseline(path))
+    assert set(read_baseline(path)) == {"old", "new"}
+
+def test_format_result_flags_regressions():
+    previous = Result("case", 1, 1.0, 100, 0).to_json()
+    assert "REGRESSION" in format_result(Result("case", 1, 2.0, 100, 0), previous)
+    assert "REGRESSION" not in format_result(Result("case", 1, 1.0, 100, 0), previous)
@@ -0,0 +1,41 @@
+from conftest import make_row
+from pdf.build_manifest import BuildManifest, SourceState, describe_changes, is_up_to_date, read_sources
+
+import os
+
+def make_manifest(rows: list[str], sources: dict[str, SourceState]) -> BuildManifest:
+    return BuildManifest(inputs={"code": "1"}, rows=rows, sources=sources, outputs={})
+
+def test_unchanged_sources_keep_their_digest(tmp_path):
+    path = tmp_path / "page.html"
+    path.write_text("<section>page</section>", encoding="utf-8")
+    sources = read_sources([make_row("page", path=path)], {})
+    # a stale digest is kept while the size and modification time match
+    stale = {source: state._replace(digest="stale") for source, state in sources.items()}
+    assert read_sources([make_row("page", path=path)], stale)[str(path)].digest == "stale"
+    os.utime(path, ns=(0, 0))
+    assert read_sources([make_row("page", path=path)], stale)[str(path)].digest == sources[str(path)].digest
+
+def test_up_to_date_requires_untouched_output(tmp_path):
+    output = tmp_path / "output.html"
+    output.write_text("html", encoding="utf-8")
+    previous = make_manifest(["a"], {}).with_outputs([output])
+    assert is_up_to_date(previous, make_manifest(["a"], {}), [output])
+    assert not is_up_to_date(previous, make_manifest(["b"], {}), [output])
+    output.write_text("edited", encoding="utf-8")
+    assert not is_up_to_date(previous, make_manifest(["a"], {}), [output])
+
+def test_up_to_date_keeps_generated_date(tmp_path):
+    output = tmp_path / "output.html"
+    output.write_text("html", encoding="utf-8")
+    previous = make_manifest(["a"], {})._replace(generated="2026-01-01").with_outputs([output])
+    previous.save(tmp_path / "manifest.json")
+    loaded = BuildManifest.load(tmp_path / "manifest.json")
+    assert loaded == previous and loaded.generated == "2026-01-01"
+    # the date alone doesn't rebuild, the kept output keeps the recorded one
+    assert is_up_to_date(loaded, make_manifest(["a"], {})._replace(generated="2026-02-01"), [output])
+
+def test_describe_changes_counts_rows():
+    previous = make_manifest(["a", "b", "c"], {})
+    current = make_manifest(["a", "c", "d", "e"], {})
+    assert describe_changes(previous, current).startswith("Since the last build: 2 rows added or edited, 1 removed")
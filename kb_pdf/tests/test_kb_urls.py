@@ -0,0 +1,60 @@
+from kb_common.kb_urls import HELP_COLUMNS, PDF_COLUMNS, KbUrlRow, KbUrlsError, load_kb_urls, parse_kb_urls
+
+import os
+import pytest
+
+CSV = """URL,HELP Include,HELP Cat,HELP Keywords,Include,Header,Depth,Notes,Duplicate slugs
+https://mariadb.com/kb/en/select/,1,Data Manipulation,SELECT;FROM,1,Select,2,,select-syntax;
+,,,,,,,,
+https://mariadb.com/kb/en/insert/,106,Data Manipulation,INSERT,,,,note,
+"""
+
+def test_rows(tmp_path):
+    source = tmp_path / "kb_urls.csv"
+    source.write_text(CSV, encoding="utf-8")
+    rows = load_kb_urls(source)
+    assert rows[0] == KbUrlRow(
+        url="https://mariadb.com/kb/en/select/", help_include="1", help_category="Data Manipulation",
+        help_keywords=("SELECT", "FROM"), include=1, header="Select", depth=2, slugs=("select-syntax",),
+    )
+    assert rows[1].url == "" and rows[1].include == 0
+    assert (rows[2].include, rows[2].depth, rows[2].help_include) == (0, 0, "106")
+    # later loads come from the cache, with the same rows
+    assert (tmp_path / "kb_urls.csv.cache.json").is_file()
+    assert load_kb_urls(source) == rows
+
+def test_cache_follows_source(tmp_path):
+    source = tmp_path / "kb_urls.csv"
+    source.write_text(CSV, encoding="utf-8")
+    load_kb_urls(source)
+
+    source.write_text(CSV.replace("Select", "SELECT"), encoding="utf-8")
+    stat = source.stat()
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert load_kb_urls(source)[0].header == "SELECT"
+
+def test_invalid_row(tmp_path):
+    source = tmp_path / "kb_urls.csv"
+    source.write_text(CSV.replace(",Select,2,", ",Select,two,"), encoding="utf-8")
+    with pytest.raises(KbUrlsError, match="line 2.*Depth"):
+        load_kb_urls(source, columns=PDF_COLUMNS)
+    # the help tables don't read the depth, for them it is empty
+    assert load_kb_urls(source, columns=HELP_COLUMNS)[0].depth == 0
+    # the invalid value is kept in the cache, so it is reported again from it
+    assert (tmp_path / "kb_urls.csv.cache.json").is_file()
+    with pytest.raises(KbUrlsError, match="line 2.*Depth"):
+        load_kb_urls(source, columns=PDF_COLUMNS)
+
+def test_columns_of_each_tool():
+    text = CSV.replace("INSERT,,,,note", "INSERT,yes,,,note").replace(",106,", ",10.6,")
+    with pytest.raises(KbUrlsError, match="line 4.*'HELP Include'"):
+        parse_kb_urls(text)
+    with pytest.raises(KbUrlsError, match="line 4.*'Include'"):
+        parse_kb_urls(text, PDF_COLUMNS)
+    with pytest.raises(KbUrlsError, match="line 4.*'HELP Include'"):
+        parse_kb_urls(text, HELP_COLUMNS)
+
+    without_keywords = "URL,Include,Header,Depth,Duplicate slugs\nhttps://mariadb.com/kb/en/select/,1,Select,1,\n"
+    assert parse_kb_urls(without_keywords, PDF_COLUMNS)[0].help_keywords == ()
+    with pytest.raises(KbUrlsError, match="missing the column HELP Include"):
+        parse_kb_urls(without_keywords, HELP_COLUMNS)
@@ -0,0 +1,23 @@
+from kb_common.prefetch import prefetch
+from setup.logger import language_log, log
+
+from concurrent.futures import ThreadPoolExecutor
+
+def build(lang: str, log_path):
+    def read(item):
+        log.info(f"read {lang} {item}")
+        return item
+    with language_log(lang, log_path):
+        log.info(f"start {lang}")
+        list(prefetch(range(8), read, window=4))
+
+def test_reader_threads_log_to_their_language(tmp_path):
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        builds = [executor.submit(build, lang, tmp_path / f"{lang}.log") for lang in ("en", "fr")]
+        for future in builds:
+            future.result()
+    for lang, other in (("en", "fr"), ("fr", "en")):
+        text = (tmp_path / f"{lang}.log").read_text(encoding="utf-8")
+        assert f"start {lang}" in text
+        assert all(f"read {lang} {item}" in text for item in range(8))
+        assert other not in text
@@ -0,0 +1,39 @@
+from conftest import make_row
+from setup.kb_urls import CsvItem
+from pdf.edit_html.merge_html import internalise_links
+
+import re
+
+def replace_each_url(html: str, kburls: list[CsvItem]) -> str:
+    """The previous implementation, one pass over the html for each url"""
+    for row in kburls:
+        if row.include == 1:
+            for url in (*row.slugs, row.url):
+                html = html.replace(f'href="{url}#', f'href="#{row.id_path}')
+                html = html.replace(f'href="{url}"', f'href="#{row.id_path}"')
+    pattern = r'(href ?= ?")(#[\w-]+)#([\w-]+)'
+    return re.sub(pattern, r"\1\2\3", html)
+
+KBURLS = [
+    make_row("en/select.html", slugs=("https://mariadb.com/kb/en/select-alias/",)),
+    make_row("en/insert.html"),
+    make_row("update", url="https://mariadb.com/kb/en/update/"),
+    make_row("en/skipped.html", include=2),
+    make_row("en/duplicate.html", url="https://mariadb.com/kb/en/select/"),
+]
+
+def test_internalise_links_matches_previous():
+    html = "\n".join([
+        '<a href="https://mariadb.com/kb/en/select/">select</a>',
+        '<a href="https://mariadb.com/kb/en/select/#syntax">syntax</a>',
+        '<a href="https://mariadb.com/kb/en/select-alias/">alias</a>',
+        '<a href="https://mariadb.com/kb/en/update/#set">update</a>',
+        '<a href = "#update#set">spaced</a>',
+        '<a href="#local#anchor">local</a>',
+        '<a href="#en/select.html#anchor">path</a>',
+        '<a href="https://mariadb.com/kb/en/skipped/">skipped</a>',
+        '<a href="https://mariadb.com/kb/en/insert/?x=1">query</a>',
+        '<a data-href="https://mariadb.com/kb/en/insert/">data</a>',
+        '<a href="https://mariadb.com/kb/en/insert/',
+    ])
+    assert internalise_links(html, KBURLS) == replace_each_url(html, KBURLS)
@@ -0,0 +1,74 @@
+from kb_common.packed_archive import ArchivePages, PackedArchive, PageState, pack_archive, packed_path
+
+import os
+import pytest
+
+PAGES = {
+    "en/select.html": "<html><title>SELECT</title></html>",
+    "en/alter-user/+source.html": "<p>" + "ALTER USER " * 200 + "</p>",
+    "fr/sélection.html": "é",
+}
+
+def write_archive(tmp_path):
+    html_root = tmp_path / "html"
+    for location, html in PAGES.items():
+        path = html_root / location
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(html, encoding="utf-8")
+    return html_root
+
+@pytest.mark.parametrize("codec", ["none", "zlib", "bz2", "lzma"])
+def test_pack_roundtrip(tmp_path, codec):
+    html_root = write_archive(tmp_path)
+    pack_archive(html_root, packed_path(html_root), codec)
+    packed = PackedArchive.open(tmp_path / "html.kbpack")
+    assert len(packed) == len(PAGES)
+    assert sorted(packed.locations()) == sorted(PAGES)
+    for location, html in PAGES.items():
+        stat = (html_root / location).stat()
+        assert packed.read(location).decode("utf-8") == html
+        assert packed.state(location) == PageState(stat.st_size, stat.st_mtime_ns)
+    assert "en/missing.html" not in packed
+    with pytest.raises(FileNotFoundError):
+        packed.read("en/missing.html")
+
+def test_pages_prefer_pack(tmp_path):
+    html_root = write_archive(tmp_path)
+    loose = ArchivePages(html_root)
+    assert loose.packed is None and loose.read_text("en/select.html") == PAGES["en/select.html"]
+    expected_state = loose.state("en/select.html")
+
+    pack_archive(html_root, packed_path(html_root))
+    (html_root / "en/select.html").unlink()
+    pages = ArchivePages(html_root)
+    assert pages.read_text("en/select.html") == PAGES["en/select.html"]
+    assert pages.state("en/select.html") == expected_state
+    assert pages.state("en/missing.html") is None
+    # pages added after packing are read from their file
+    (html_root / "en/insert.html").write_text("INSERT", encoding="utf-8")
+    assert pages.read_text("en/insert.html") == "INSERT"
+
+def test_pages_changed_after_packing(tmp_path):
+    html_root = write_archive(tmp_path)
+    pack_archive(html_root, packed_path(html_root))
+    path = html_root / "en/select.html"
+    path.write_text("<html><title>SELECT re-scraped</title></html>", encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+
+    pages = ArchivePages(html_root)
+    assert pages.read_text("en/select.html") == "<html><title>SELECT re-scraped</title></html>"
+    assert pages.state("en/select.html") == PageState(path.stat().st_size, path.stat().st_mtime_ns)
+
+def test_pages_checked_once(tmp_path, monkeypatch):
+    html_root = write_archive(tmp_path)
+    pack_archive(html_root, packed_path(html_root))
+    pages = ArchivePages(html_root)
+    assert pages.stale == set()
+
+    def no_stat(*args, **kwargs):
+        raise AssertionError("packed pages are read without touching the loose files")
+    monkeypatch.setattr(os, "stat", no_stat)
+    for location, html in PAGES.items():
+        assert pages.read_text(location) == html
+        assert pages.state(location) is not None
@@ -0,0 +1,63 @@
+from setup.config import CacheConfig
+from setup.kb_urls import read_csv
+from pdf.edit_html import selectors
+from pdf.edit_html.page_cache import PageCache, code_version
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import os
+
+CSV_FILEPATH = "../kb_urls.csv"
+
+def make_cache(tmp_path, max_size=1024 * 1024, max_age=60.0) -> PageCache:
+    return PageCache(CacheConfig(enabled=True, path=tmp_path, max_size=max_size, max_age=max_age))
+
+def test_cache_round_trip(tmp_path):
+    cache = make_cache(tmp_path)
+    row = read_csv(CSV_FILEPATH, 1)[0]
+    key = cache.key(b"<section></section>", row)
+    assert cache.get(key) is None
+    cache.put(key, ("<section></section>", "1 Header"))
+    assert cache.get(key) == ("<section></section>", "1 Header")
+
+def test_concurrent_puts_of_one_page(tmp_path):
+    cache = make_cache(tmp_path)
+    key = cache.key(b"<section></section>", read_csv(CSV_FILEPATH, 1)[0])
+    pages = [(f"<section>{index}</section>" * 1000, f"{index} Header") for index in range(32)]
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda page: cache.put(key, page), pages))
+    assert cache.get(key) in pages
+    assert not list(tmp_path.glob("*/*.tmp"))
+
+def test_cache_key_depends_on_row(tmp_path):
+    cache = make_cache(tmp_path)
+    row = read_csv(CSV_FILEPATH, 1)[0]
+    key = cache.key(b"page", row)
+    row.id_path = row.id_path + "/other"
+    assert cache.key(b"page", row) != key
+
+def test_cache_key_ignores_numbering(tmp_path):
+    cache = make_cache(tmp_path)
+    row = read_csv(CSV_FILEPATH, 1)[0]
+    key = cache.key(b"page", row)
+    row.depth_str = row.depth_str + ".1"
+    assert cache.key(b"page", row) == key
+
+def test_prune_by_age_and_size(tmp_path):
+    cache = make_cache(tmp_path, max_size=150)
+    for index in range(4):
+        cache.put(f"{index:02}key", ("x" * 50, ""))
+    old_entry = tmp_path / "00" / "00key.json"
+    os.utime(old_entry, (0, 0))
+    cache.prune()
+    remaining = sorted(path.name for path in tmp_path.glob("*/*.json"))
+    assert "00key.json" not in remaining
+    assert sum((tmp_path / name[:2] / name).stat().st_size for name in remaining) <= 150
+
+def test_code_version_covers_selectors(monkeypatch):
+    version = code_version()
+    read_bytes = Path.read_bytes
+    selectors_path = Path(selectors.__file__)
+    monkeypatch.setattr(Path, "read_bytes", lambda path: read_bytes(path) + (b"#" if path == selectors_path else b""))
+    assert code_version() != version
@@ -0,0 +1,40 @@
+from kb_common.page_index import PageIndex
+
+import os
+
+PAGE = """<html><head><title>SELECT &amp; More - MariaDB Knowledge Base</title></head><body>
+<section id="content"><h1 id="select">SELECT</h1><h2 id="syntax">Syntax</h2>
+<div><h4>Localized Versions</h4></div>
+<ul><li><a href="/kb/it/select/">SELECT</a> [it]</li><li><a href="/kb/es/select/">SELECT</a> [es]</li></ul>
+</section></body></html>"""
+
+def test_page_info(tmp_path):
+    (tmp_path / "en").mkdir()
+    (tmp_path / "en/select.html").write_text(PAGE, encoding="utf-8")
+    index = PageIndex(tmp_path, tmp_path / "index.sqlite")
+    assert index.refresh(["en/select.html"]) == 1
+
+    info = index.page("en/select.html")
+    assert info is not None
+    assert info.title == "SELECT & More"
+    assert info.h1 == "SELECT"
+    assert info.anchors == ["select", "syntax"]
+    assert info.localized_versions == {"it": "/kb/it/select/", "es": "/kb/es/select/"}
+    assert PAGE.encode()[info.section_start:].startswith(b"<section")
+    assert index.page("en/missing.html") is None
+
+def test_refresh_is_incremental(tmp_path):
+    page_path = tmp_path / "page.html"
+    page_path.write_text(PAGE, encoding="utf-8")
+    index = PageIndex(tmp_path, tmp_path / "index.sqlite")
+    assert index.refresh(["page.html"]) == 1
+    assert index.refresh(["page.html"]) == 0
+
+    # touched but unchanged pages are not parsed again
+    stat = page_path.stat()
+    os.utime(page_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    assert index.refresh(["page.html"]) == 0
+
+    page_path.write_text(PAGE.replace("[es]", "[fr]"), encoding="utf-8")
+    assert index.refresh(["page.html"]) == 1
+    assert "fr" in index.localized_versions("page.html")
@@ -0,0 +1,35 @@
+from conftest import make_row
+from setup.kb_urls import read_csv
+from pdf.edit_html.parsers import PAGE_PARSERS
+from pdf.edit_html.read_html import is_article
+
+
+CSV_FILEPATH = "../kb_urls.csv"
+PAGE = """<html><body><section id="content" class="limited_width  col-md-8">
+<h1><a href="#top">  Title </a></h1>
+<div id="comments">comments</div>
+<div class="table_of_contents"><ol class="toc">
+    <li><a href="#one">One</a></li>
+    <li><a href="#see-also">See Also</a> </ol>
+</li>
+</div>
+<h2 id="one">1. One</h2>
+<p>a &amp; b &lt; c <span class="btn disabled" title='say "hi"'>x</span><br></p>
+<pre class="fixed">  keep   this &lt;a id="quoted" href="#quoted"&gt;
+</pre>
+<div class="mariadb" data-node-id="7" title='an id="x" link'><a href="#one">back</a></div>
+<h2 id="see-also">See Also</h2>
+<ul><li>removed</li></ul>
+</section></body></html>"""
+
+def test_parsers_match_on_page():
+    outputs = [parse(PAGE, make_row(depth=0, depth_str="1.2")) for parse in PAGE_PARSERS.values()]
+    assert outputs[0][1] == "1.2 Title"
+    assert all(output == outputs[0] for output in outputs)
+
+def test_parsers_match_on_articles():
+    rows = [row for row in read_csv(CSV_FILEPATH, 40) if is_article(row)]
+    for row in rows:
+        html = row.path.read_text(encoding="utf-8")
+        outputs = [parse(html, row) for parse in PAGE_PARSERS.values()]
+        assert all(output == outputs[0] for output in outputs), row.url
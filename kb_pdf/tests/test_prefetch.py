@@ -0,0 +1,50 @@
+from kb_common.prefetch import PAGES_PER_CHUNK, chunked, chunked_process_map, prefetch
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import contextvars
+import operator
+import pytest
+
+def test_prefetch_order():
+    items = list(range(50))
+    assert list(prefetch(items, lambda item: item * 2, window=4)) == [(item, item * 2) for item in items]
+    assert list(prefetch(iter(items), str, window=0)) == [(item, str(item)) for item in items]
+
+def test_prefetch_error():
+    def read(item):
+        if item == 3:
+            raise OSError(item)
+        return item
+    results = prefetch(range(10), read, window=4)
+    assert [next(results) for _ in range(3)] == [(0, 0), (1, 1), (2, 2)]
+    with pytest.raises(OSError):
+        next(results)
+
+def test_chunked():
+    assert list(chunked(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+
+def test_chunked_process_map():
+    items = range(PAGES_PER_CHUNK * 5 + 3)
+    consumed = []
+    def sources():
+        for item in items:
+            consumed.append(item)
+            yield item
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = chunked_process_map(executor, operator.neg, sources(), jobs=1)
+        assert next(results) == 0
+        # one job holds at most CHUNKS_PER_JOB chunks ahead of the one being yielded
+        assert len(consumed) < len(items)
+        assert [0, *results] == [-item for item in items]
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        assert list(chunked_process_map(executor, operator.neg, iter(items), jobs=2)) == [-item for item in items]
+
+def test_prefetch_reads_in_callers_context():
+    lang = contextvars.ContextVar("lang", default="")
+    def read_in(value):
+        token = lang.set(value)
+        try:
+            return list(prefetch(range(20), lambda item: lang.get(), window=4))
+        finally:
+            lang.reset(token)
+    assert read_in("fr") == [(item, "fr") for item in range(20)]
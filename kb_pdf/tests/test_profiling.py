@@ -0,0 +1,22 @@
+from kb_common.profiling import Profiler, Progress
+
+import json
+
+def test_stages_are_nested_and_pages_ranked(tmp_path):
+    profiler = Profiler()
+    with profiler.stage("build"):
+        with profiler.stage("pages"):
+            profiler.record_page("fast", 0.1)
+            profiler.record_page("slow", 2.0)
+    path = tmp_path / "profile.json"
+    profiler.write_report(path, slowest=1)
+    report = json.loads(path.read_text(encoding="utf-8"))
+    assert [stage["name"] for stage in report["stages"]] == ["build/pages", "build"]
+    assert report["pages"]["count"] == 2
+    assert report["slowest_pages"] == [{"stage": "build/pages", "name": "slow", "seconds": 2.0}]
+
+def test_progress_is_throttled(capsys):
+    progress = Progress(3, lambda done, total: f"{done}/{total}", interval=60)
+    for done in range(1, 4):
+        progress.update(done)
+    assert capsys.readouterr().out == "\r1/3\r3/3"
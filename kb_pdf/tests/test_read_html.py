@@ -0,0 +1,20 @@
+from setup.kb_urls import read_csv
+from pdf.edit_html.read_html import process_articles, is_article, PageSpool
+
+CSV_FILEPATH = "../kb_urls.csv"
+
+def test_process_articles_parallel_matches_serial():
+    rows = [row for row in read_csv(CSV_FILEPATH, 40) if is_article(row)]
+    serial = list(process_articles(rows, jobs=1))
+    parallel = list(process_articles(rows, jobs=3))
+    assert serial == parallel
+
+def test_page_spool_round_trip():
+    pages = ["<section>first</section>", "", "<h2>sécond</h2>"]
+    spool = PageSpool()
+    for page in pages:
+        spool.append(page)
+    assert len(spool) == len(pages)
+    assert list(spool) == pages
+    spool.append("last")
+    assert list(spool) == pages + ["last"]
@@ -0,0 +1,86 @@
+from conftest import make_row
+from pdf.edit_html.read_html import PageSpool
+from pdf.generate_pdf import chapter_pages, chapter_ranges, page_count_settings, shard_link_rewriter
+from pdf.stitch_pdf import SHARD_LINK_SCHEME, redraw_pages, stitch_pdfs
+
+import pytest
+
+def test_chapter_ranges_start_at_top_level_rows():
+    rows = [make_row(f"en/{index}.html", depth=depth) for index, depth in enumerate([2, 1, 2, 3, 1, 1])]
+    assert chapter_ranges(rows) == [range(0, 1), range(1, 4), range(4, 5), range(5, 6)]
+
+def test_chapter_pages_reads_one_chapter_at_a_time():
+    spool = PageSpool()
+    for index in range(6):
+        spool.append(f"<p>{index}</p>")
+    chapters = [range(0, 1), range(1, 4), range(4, 6)]
+    assert [list(pages) for pages in chapter_pages(spool, chapters)] == [
+        ["<p>0</p>"], ["<p>1</p>", "<p>2</p>", "<p>3</p>"], ["<p>4</p>", "<p>5</p>"]
+    ]
+    # the spool is read again for the merged html
+    assert len(list(spool)) == 6
+
+def test_shard_link_rewriter_marks_links_to_other_shards():
+    rows = [make_row("en/select.html", depth=1), make_row("en/insert.html", depth=1)]
+    rewrite = shard_link_rewriter(1, {rows[1].url: (0, rows[1].id_path)}, {"en/select.html": 1, "en/insert.html": 2})
+    html = '<a href="#en/select.htmlsyntax">a</a><a href="https://mariadb.com/kb/en/insert/#values">b</a>'
+    assert rewrite(html) == f'<a href="#en/select.htmlsyntax">a</a><a href="{SHARD_LINK_SCHEME}en/insert.htmlvalues">b</a>'
+
+def test_page_count_settings_write_out_the_total():
+    settings = {"footer-right": "[page]/[topage]", "dpi": 120}
+    assert page_count_settings(settings, 42) == {"footer-right": "[page]/42", "dpi": 120}
+
+def test_stitch_resolves_links_between_shards(tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    from pypdf.annotations import Link
+    first = pypdf.PdfWriter()
+    first.add_blank_page(100, 100)
+    first.add_annotation(0, Link(rect=(0, 0, 10, 10), url=f"{SHARD_LINK_SCHEME}en/insert.htmlvalues"))
+    first.add_annotation(0, Link(rect=(0, 0, 10, 10), url=f"{SHARD_LINK_SCHEME}en/missing.html"))
+    second = pypdf.PdfWriter()
+    for _ in range(2):
+        second.add_blank_page(100, 100)
+    shard_paths = [tmp_path / "first.pdf", tmp_path / "second.pdf"]
+    first.write(shard_paths[0])
+    second.write(shard_paths[1])
+
+    link_page = {"en/insert.htmlvalues": 2}.get
+    assert stitch_pdfs(shard_paths, tmp_path / "out.pdf", link_page) == (1, 1)
+    reader = pypdf.PdfReader(tmp_path / "out.pdf")
+    assert len(reader.pages) == 3
+    action = reader.pages[0]["/Annots"][0].get_object()["/A"]
+    assert action["/S"] == "/GoTo"
+    assert reader.get_page_number(action["/D"][0].get_object()) == 2
+
+def test_redraw_pages_replaces_links(tmp_path):
+    pypdf = pytest.importorskip("pypdf")
+    from pypdf.annotations import Link
+    from pypdf.generic import DecodedStreamObject
+    document = pypdf.PdfWriter()
+    for _ in range(3):
+        document.add_blank_page(100, 100)
+    # a link of the first render, and one from the body to the redrawn page
+    document.add_annotation(0, Link(rect=(0, 0, 10, 10), target_page_index=1))
+    document.add_annotation(2, Link(rect=(0, 0, 10, 10), target_page_index=0))
+    document.write(tmp_path / "document.pdf")
+    drawn = pypdf.PdfWriter()
+    page = drawn.add_blank_page(100, 100)
+    contents = DecodedStreamObject()
+    contents.set_data(b"0 0 10 10 re f")
+    page.replace_contents(contents)
+    drawn.add_annotation(0, Link(rect=(0, 20, 10, 30), url=f"{SHARD_LINK_SCHEME}en/insert.html"))
+    drawn.add_annotation(0, Link(rect=(0, 40, 10, 50), target_page_index=0))
+    drawn.add_annotation(0, Link(rect=(0, 60, 10, 70), url=f"{SHARD_LINK_SCHEME}en/missing.html"))
+    drawn.write(tmp_path / "drawn.pdf")
+
+    assert redraw_pages(tmp_path / "document.pdf", tmp_path / "drawn.pdf", {"en/insert.html": 2}.get) == (1, 1)
+    reader = pypdf.PdfReader(tmp_path / "document.pdf")
+    assert len(reader.pages) == 3
+    assert reader.pages[0].get_contents().get_data() == b"0 0 10 10 re f"
+    links = [annotation.get_object() for annotation in reader.pages[0]["/Annots"]]
+    assert [list(map(float, link["/Rect"])) for link in links] == [[0, 20, 10, 30], [0, 40, 10, 50], [0, 60, 10, 70]]
+    assert reader.get_page_number(links[0]["/A"]["/D"][0].get_object()) == 2
+    assert reader.get_page_number(links[1]["/Dest"][0].get_object()) == 0
+    # links to the redrawn page are kept
+    body_link = reader.pages[2]["/Annots"][0].get_object()
+    assert reader.get_page_number(body_link["/Dest"][0].get_object()) == 0